@@ -0,0 +1,74 @@
+# Asset fingerprinting: content-hashed copies of static files, plus the mapping pages use to point at them
+
+import json
+import os
+import re
+
+from file_manip import copy_file
+from manifest import hash_file
+
+ASSET_MANIFEST = "asset-manifest.json"
+
+# src="..." and href="..." attributes, and url(...) in inline styles
+URL_PATTERN = re.compile(r"""((?:src|href)\s*=\s*["'])([^"']+)(["'])|(url\(\s*["']?)([^"')]+)(["']?\s*\))""")
+
+def asset_url(path, dest_dir): # public/images/a.png -> /images/a.png
+    return "/" + os.path.relpath(path, dest_dir).replace(os.sep, "/")
+
+def fingerprinted_path(path, content_hash): # public/index.css -> public/index.3f9a1c2b7d.css
+    root, extension = os.path.splitext(path)
+    return f"{root}.{content_hash[:10]}{extension}"
+
+def load_asset_manifest(dest_dir):
+    path = os.path.join(dest_dir, ASSET_MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    manifest_file = open(path)
+    try:
+        return json.load(manifest_file)
+    except ValueError:
+        return {}
+    finally:
+        manifest_file.close()
+
+def fingerprint_assets(assets, changed_assets, dest_dir): # Adds a content-hashed copy next to every asset and returns the url mapping
+    previous = load_asset_manifest(dest_dir)
+    changed = set(dest for source, dest in changed_assets)
+    mapping = {}
+    for source, dest in assets:
+        url = asset_url(dest, dest_dir)
+        fingerprinted = os.path.join(dest_dir, *previous[url].lstrip("/").split("/")) if url in previous else None
+        if dest in changed or fingerprinted is None or not os.path.exists(fingerprinted):
+            # Named after what ended up in public/, so a stylesheet minified after copying gets a name of its own
+            fingerprinted = fingerprinted_path(dest, hash_file(dest))
+        if not os.path.exists(fingerprinted):
+            # Both names live in public/, so a hardlink costs nothing and can't leak back into static/
+            copy_file(dest, fingerprinted, hardlink=True)
+        mapping[url] = asset_url(fingerprinted, dest_dir)
+    stale = set(previous.values()) - set(mapping.values())
+    for url in stale:
+        path = os.path.join(dest_dir, *url.lstrip("/").split("/"))
+        if os.path.exists(path):
+            os.remove(path)
+    # Written through a rename, like everything else in dest_dir, so a hardlinked copy from an earlier build is never changed
+    temp_path = os.path.join(dest_dir, f"{ASSET_MANIFEST}.tmp")
+    manifest_file = open(temp_path, "w")
+    json.dump(mapping, manifest_file, indent=2, sort_keys=True)
+    manifest_file.close()
+    os.replace(temp_path, os.path.join(dest_dir, ASSET_MANIFEST))
+    return mapping
+
+def remove_fingerprints(dest_dir): # Cleans up after a fingerprinted build once fingerprinting is turned off
+    for url in load_asset_manifest(dest_dir).values():
+        path = os.path.join(dest_dir, *url.lstrip("/").split("/"))
+        if os.path.exists(path):
+            os.remove(path)
+    if os.path.exists(os.path.join(dest_dir, ASSET_MANIFEST)):
+        os.remove(os.path.join(dest_dir, ASSET_MANIFEST))
+
+def rewrite_asset_urls(text, mapping): # Points src, href and url() references in a piece of HTML at the fingerprinted files
+    def replace(match):
+        if match.group(2) is not None:
+            return f"{match.group(1)}{mapping.get(match.group(2), match.group(2))}{match.group(3)}"
+        return f"{match.group(4)}{mapping.get(match.group(5), match.group(5))}{match.group(6)}"
+    return URL_PATTERN.sub(replace, text)
@@ -0,0 +1,180 @@
+# Benchmarks for the conversion pipeline. Run with: python3 src/bench.py (or ./bench.sh)
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from textnode import TextType, TextNode
+from conversions import *
+from flatdoc import markdown_to_flat_document
+from corpus import add_corpus_arguments, generate_corpus, generate_markdown, page_settings
+
+def chained_text_to_textnode(text): # The five-pass inline parser we used before the single-pass one
+    node_list = [TextNode(text, TextType.NORMAL_TEXT)]
+    node_list = split_nodes_image(node_list)
+    node_list = split_nodes_link(node_list)
+    node_list = split_nodes_delimiter(node_list, "**", TextType.BOLD_TEXT)
+    node_list = split_nodes_delimiter(node_list, "_", TextType.ITALIC_TEXT)
+    node_list = split_nodes_delimiter(node_list, "`", TextType.CODE_TEXT)
+    return node_list
+
+def large_paragraph(sentences): # A paragraph with a bit of every kind of inline markup in it
+    sentence = "Here is **bold** text, some _italic_ words, a `code span`, a [link](https://boot.dev) and an ![image](/images/tolkien.png). "
+    return sentence * sentences
+
+def best_time(function, argument, size=None, repeat=5): # Seconds per call, best of a few runs. Bigger inputs (by length, or size) get fewer calls per run
+    if size is None:
+        size = len(argument)
+    number = max(1, 20000 // max(1, size // 100))
+    timings = timeit.repeat(lambda: function(argument), number=number, repeat=repeat)
+    return min(timings) / number
+
+def bench_inline(args):
+    metrics = {}
+    print(f"{'sentences':>10} {'chained':>12} {'single pass':>12} {'speedup':>8}")
+    for size in args.sizes or (1, 10, 100, 1000):
+        text = large_paragraph(size)
+        chained = best_time(chained_text_to_textnode, text)
+        single = best_time(text_to_textnode, text)
+        metrics[f"inline.single_pass.{size}"] = single
+        print(f"{size:>10} {chained * 1e6:>10.1f}us {single * 1e6:>10.1f}us {chained / single:>7.2f}x")
+    return metrics
+
+def long_page(blocks): # A page made of many paragraphs and lists, the shape that allocates the most nodes
+    parts = ["# A long page"]
+    for i in range(blocks):
+        parts.append(large_paragraph(5))
+        parts.append("- a **bold** item\n- an _italic_ item\n- a [link](/somewhere)")
+    return "\n\n".join(parts)
+
+def measure_memory(function, argument): # Bytes still held by the result, and the peak while building it
+    tracemalloc.start()
+    result = function(argument)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current, peak
+
+def bench_memory(args):
+    metrics = {}
+    print(f"{'blocks':>10} {'page size':>10} {'tree kept':>10} {'tree peak':>10} {'flat kept':>10} {'flat peak':>10}")
+    for size in args.sizes or (100, 1000):
+        page = long_page(size)
+        tree_current, tree_peak = measure_memory(markdown_to_html_node, page)
+        flat_current, flat_peak = measure_memory(markdown_to_flat_document, page)
+        metrics[f"memory.tree_peak_bytes.{size}"] = tree_peak
+        metrics[f"memory.flat_peak_bytes.{size}"] = flat_peak
+        print(f"{size:>10} {len(page) / 1024:>8.0f}KB {tree_current / 1024:>8.0f}KB {tree_peak / 1024:>8.0f}KB {flat_current / 1024:>8.0f}KB {flat_peak / 1024:>8.0f}KB")
+    return metrics
+
+def bench_micro(args): # One synthetic page through each pipeline function on its own
+    page = generate_markdown(random.Random(args.seed), **page_settings(args))
+    blocks = markdown_to_blocks(page)
+    paragraphs = [block for block in blocks if block_to_block_type(block) == BlockType.PARAGRAPH]
+    node = markdown_to_html_node(page)
+    timings = {
+        "micro.markdown_to_blocks": best_time(markdown_to_blocks, page),
+        "micro.block_to_block_type": best_time(lambda blocks: [block_to_block_type(block) for block in blocks], blocks, len(page)) / len(blocks),
+        "micro.text_to_textnode": best_time(lambda blocks: [text_to_textnode(block) for block in blocks], paragraphs, len(page)) / max(1, len(paragraphs)),
+        "micro.to_html": best_time(lambda node: node.to_html(), node, len(page)),
+    }
+    print(f"{'function':<28} {'us per call':>12}")
+    for name, seconds in timings.items():
+        print(f"{name[len('micro.'):]:<28} {seconds * 1e6:>12.2f}")
+    return timings
+
+BENCH_TEMPLATE = "<!doctype html><html><head><title>{{ Title }}</title></head><body><article>{{ Content }}</article></body></html>"
+
+def bench_build(args): # A full clean build of a synthetic corpus
+    from build import build
+    root = tempfile.mkdtemp(prefix="bench-")
+    try:
+        content_dir = os.path.join(root, "content")
+        paths = generate_corpus(content_dir, args.pages, args.seed, **page_settings(args))
+        source_bytes = sum(os.path.getsize(path) for path in paths)
+        os.makedirs(os.path.join(root, "static"))
+        template_path = os.path.join(root, "template.html")
+        template_file = open(template_path, "w")
+        template_file.write(BENCH_TEMPLATE)
+        template_file.close()
+        best = None
+        for _ in range(3):
+            started = time.perf_counter()
+            build(content_dir, os.path.join(root, "static"), template_path, os.path.join(root, "public"), workers=args.workers, clean=True, cache_dir=os.path.join(root, ".cache"), io_threads=args.io_threads)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        shutil.rmtree(root)
+    metrics = {"build.pages_per_sec": args.pages / best, "build.mb_per_sec": source_bytes / best / 1e6}
+    print(f"{args.pages} pages, {source_bytes / 1e6:.1f}MB in {best:.2f}s: {metrics['build.pages_per_sec']:.0f} pages/s, {metrics['build.mb_per_sec']:.2f} MB/s")
+    return metrics
+
+BENCHMARKS = {
+    "inline": bench_inline,
+    "memory": bench_memory,
+    "micro": bench_micro,
+    "build": bench_build,
+}
+
+def higher_is_better(name):
+    return name.endswith("_per_sec")
+
+def compare(metrics, baseline, tolerance): # Returns the metrics that got worse than the baseline by more than tolerance
+    regressions = []
+    print(f"{'metric':<36} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, value in sorted(metrics.items()):
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        change = (value - old) / old if old else 0
+        worse = -change if higher_is_better(name) else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{name:<36} {old:>12.4g} {value:>12.4g} {change * 100:>+7.1f}%{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the conversion pipeline")
+    parser.add_argument("benchmarks", nargs="*", help=f"which benchmarks to run: {', '.join(BENCHMARKS)} (all of them by default)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=None, help="input sizes: sentences per paragraph for inline, blocks per page for memory")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="page rendering processes for the build benchmark")
+    parser.add_argument("--io-threads", type=int, default=0, help="reader and writer threads per worker for the build benchmark")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the results to a JSON file to compare against later")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results with a saved baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="how much worse than the baseline still counts as a pass (default 0.1, 10%%)")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark: {name}")
+
+    metrics = {}
+    for name in args.benchmarks or BENCHMARKS:
+        print(f"== {name} ==")
+        metrics.update(BENCHMARKS[name](args))
+
+    if args.save_baseline:
+        baseline_file = open(args.save_baseline, "w")
+        json.dump(metrics, baseline_file, indent=2, sort_keys=True)
+        baseline_file.close()
+        print(f"Saved baseline to {args.save_baseline}")
+    if args.compare:
+        baseline_file = open(args.compare)
+        baseline = json.load(baseline_file)
+        baseline_file.close()
+        print("== compared with baseline ==")
+        regressions = compare(metrics, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions beyond {args.tolerance * 100:.0f}%")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
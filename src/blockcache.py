@@ -0,0 +1,81 @@
+# Content-addressed cache from a markdown block to the HTML it renders to, for blocks that repeat across pages
+
+import hashlib
+import os
+from collections import OrderedDict
+
+# Bump this whenever block rendering changes, so cached fragments from older code stop matching
+CACHE_VERSION = b"2"
+
+def block_key(block, salt=b""):
+    return hashlib.blake2b(block.encode(), digest_size=16, person=CACHE_VERSION, salt=salt).hexdigest()
+
+class BlockCache:
+    def __init__(self, max_entries=4096, path=None, salt=b""):
+        self.max_entries = max_entries
+        self.salt = salt # Anything else the rendered HTML depends on, like the asset url mapping
+        self.entries = OrderedDict() # Oldest first, so eviction pops from the front
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.pending = [] # Rows not written to disk yet
+        self.db = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Several build processes can share the file, the timeout makes them wait for each other's writes
+            import sqlite3 # Only the persistent cache needs it
+            self.db = sqlite3.connect(path, timeout=30)
+            self.db.execute("CREATE TABLE IF NOT EXISTS blocks (key TEXT PRIMARY KEY, html TEXT NOT NULL)")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def remember(self, key, html):
+        self.entries[key] = html
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def key(self, block):
+        return block_key(block, self.salt)
+
+    def get(self, key): # The cached HTML, or None on a miss
+        html = self.entries.get(key)
+        if html is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return html
+        if self.db is not None:
+            row = self.db.execute("SELECT html FROM blocks WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.remember(key, row[0])
+                self.hits += 1
+                return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, key, html):
+        self.remember(key, html)
+        if self.db is not None:
+            self.pending.append((key, html))
+
+    def flush(self): # Writes new entries to disk in one transaction
+        if self.db is None or not self.pending:
+            return
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO blocks (key, html) VALUES (?, ?)", self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def take_stats(self): # Hit and miss counts since the last call, so worker processes can report them per page
+        stats = {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        return stats
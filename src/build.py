@@ -0,0 +1,195 @@
+# Ties the build steps together and only redoes the work whose inputs changed
+
+import json
+import logging
+import os
+import shutil
+import time
+
+from file_manip import copy_files, find_assets, find_pages, generate_pages, sum_block_cache_stats
+from manifest import BuildManifest
+from template import load_template
+import profiling
+
+log = logging.getLogger(__name__)
+
+def remove_outputs(paths, dest_dir): # Deletes stale outputs and any directories they leave empty
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+            log.debug(f"Removed stale file: {path}")
+        parent = os.path.dirname(path)
+        while parent and os.path.abspath(parent) != os.path.abspath(dest_dir) and os.path.isdir(parent) and not os.listdir(parent):
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+
+def build(content_dir="content", static_dir="static", template_path="template.html", dest_dir="public", workers=None, clean=False, cache_dir=".cache", hardlink=False, block_cache_size=0, persist_block_cache=False, profile_path=None, show_stats=False, fingerprint=False, precompress_output=False, process_images=False, minify=False, search=False, site_index=False, site_url=None, io_threads=0, keep_builds=0, memory_budget=None, shard=None):
+    started = time.perf_counter()
+    # A shard builds only its share of the pages, and keeps their titles and links so the merge can put the site index together
+    site_index = site_index or shard is not None
+    build_profiler = profiling.Profiler() if profile_path or show_stats else None
+
+    with profiling.stage(build_profiler, "scan"):
+        manifest = BuildManifest(os.path.join(cache_dir, "manifest.json"))
+        live_dir = dest_dir
+        if keep_builds:
+            import publish
+            # The manifest only describes the build it made. After a rollback the live site is a different one, so start over
+            if manifest.settings.get("published_build") != publish.live_build(live_dir):
+                clean = True
+            dest_dir = publish.prepare_staging(live_dir, clean)
+        if clean:
+            manifest.clear()
+            if os.path.exists(dest_dir):
+                shutil.rmtree(dest_dir)
+            for path in (os.path.join(cache_dir, "search.json"), os.path.join(cache_dir, "site.json"), os.path.join(cache_dir, "blocks.sqlite")):
+                if os.path.exists(path):
+                    os.remove(path)
+        os.makedirs(dest_dir, exist_ok=True)
+        assets = find_assets(static_dir, dest_dir)
+        remove_outputs(manifest.removed("assets", assets), dest_dir)
+        # Minified and plain stylesheets differ, so switching minify on or off recopies the assets
+        minify_changed = manifest.setting_changed("minify", minify)
+        changed_assets = manifest.changed("assets", assets, force=minify_changed)
+
+    with profiling.stage(build_profiler, "assets", sum(os.path.getsize(source) for source, dest in changed_assets) if build_profiler else 0):
+        copy_files(changed_assets, hardlink=hardlink)
+        if minify:
+            from minify import minify_css_file
+            for source, dest in changed_assets:
+                if dest.endswith(".css"):
+                    minify_css_file(dest)
+    log.info(f"Synced {len(changed_assets)} of {len(assets)} assets")
+    asset_urls = {}
+    # Each stage's module is only imported by the branch that uses it, so a plain build doesn't load them all
+    if fingerprint:
+        from assets import fingerprint_assets
+        with profiling.stage(build_profiler, "fingerprint"):
+            asset_urls = fingerprint_assets(assets, changed_assets, dest_dir)
+    else:
+        from assets import remove_fingerprints
+        remove_fingerprints(dest_dir)
+    image_info = {}
+    if process_images:
+        import images
+        with profiling.stage(build_profiler, "images"):
+            image_info = images.process_images(assets, manifest, dest_dir, os.path.join(cache_dir, "images"), asset_urls)
+    else:
+        import images
+        images.remove_stale_derivatives(dest_dir, [])
+    # Site-wide data every page can depend on. When it changes, so might any page
+    site_data = json.dumps({"asset_urls": asset_urls, "image_info": image_info, "minify": minify}, sort_keys=True) if asset_urls or image_info or minify else ""
+
+    with profiling.stage(build_profiler, "scan"):
+        # A new template touches every page, so it invalidates all of them at once
+        # So does new site data, since any page might reference the asset or image that changed
+        template_changed = manifest.template_changed(load_template(template_path).dependencies, site_data)
+        pages = find_pages(content_dir, dest_dir)
+        if shard is not None:
+            from shard import content_key, shard_pages
+            tree_key = content_key(pages, content_dir)
+            pages = shard_pages(pages, content_dir, *shard)
+        removed_pages = manifest.removed("pages", pages)
+        remove_outputs(removed_pages, dest_dir)
+        search_index_path = os.path.join(cache_dir, "search.json")
+        search_index = None
+        if search:
+            from search import SearchIndex
+            search_index = SearchIndex(search_index_path, dest_dir)
+        site_index_path = os.path.join(cache_dir, "site.json")
+        site = None
+        if site_index:
+            from siteindex import SiteIndex
+            site = SiteIndex(site_index_path)
+        # Without the words or links from last time, every page has to be read again to get them back
+        rebuild_all = template_changed or (search_index is not None and not search_index.loaded) or (site is not None and not site.loaded)
+        changed_pages = manifest.changed("pages", pages, force=rebuild_all)
+        # Pages whose own source didn't change still need redoing if a fragment they include did
+        if not rebuild_all:
+            already = set(changed_pages)
+            changed_pages += [page for page in manifest.changed_includes(pages) if page not in already]
+
+    options = {"block_cache_size": block_cache_size, "profile": build_profiler is not None, "asset_urls": asset_urls, "image_info": image_info, "site_data": site_data, "minify": minify, "search": search, "site_index": site_index, "io_threads": io_threads, "memory_budget": memory_budget}
+    if persist_block_cache:
+        options["block_cache_path"] = os.path.join(cache_dir, "blocks.sqlite")
+    with profiling.stage(build_profiler, "pages"):
+        results = generate_pages(changed_pages, template_path, workers, options)
+    log.info(f"Built {len(changed_pages)} of {len(pages)} pages")
+    for result in results:
+        manifest.set_includes(result["source"], result["includes"])
+    if memory_budget and results:
+        for result in results:
+            log.debug(f"Peak memory {(result.get('peak_rss') or 0) / (1 << 20):.1f}MB: {result['source']}")
+        heaviest = max(results, key=lambda result: result.get("peak_rss") or 0)
+        log.info(f"Heaviest page: {heaviest['source']} peaked at {(heaviest.get('peak_rss') or 0) / (1 << 20):.1f}MB")
+    manifest.prune_fragments()
+    if block_cache_size:
+        stats = sum_block_cache_stats(results)
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups * 100 if lookups else 0
+        log.info(f"Block cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.1f}% hit rate), {stats['evictions']} evictions")
+
+    if search_index is not None:
+        from search import page_url
+        with profiling.stage(build_profiler, "search"):
+            for dest in removed_pages:
+                search_index.remove(page_url(dest, dest_dir))
+            for result in results:
+                search_index.update(page_url(result["dest"], dest_dir), result["title"], result["terms"])
+            shards = search_index.save()
+        log.info(f"Search index: {len(search_index.ids)} pages, rewrote {shards} shards")
+    else:
+        from search import remove_search_index
+        remove_search_index(dest_dir, search_index_path)
+
+    if site is not None:
+        from search import page_url
+        with profiling.stage(build_profiler, "site index"):
+            for dest in removed_pages:
+                site.remove(page_url(dest, dest_dir))
+            for result in results:
+                site.update(page_url(result["dest"], dest_dir), result["title"], result["front_matter"], result["links"], os.path.getmtime(result["source"]))
+            if site.changed or not site.loaded:
+                site.save()
+            if shard is None:
+                broken = site.write_outputs(dest_dir, site_url)
+            else:
+                # Links into other shards only resolve once they're merged, so checking them waits until then
+                from shard import write_shard_file
+                write_shard_file(dest_dir, shard, tree_key, site, search_index)
+                broken = []
+        for url, target in broken:
+            log.warning(f"Broken link on {url}: {target}")
+        log.info(f"Site index: {len(site.pages)} pages, {len(broken)} broken links")
+    else:
+        from siteindex import remove_site_files
+        remove_site_files(dest_dir, site_index_path)
+
+    # Compression goes last, once nothing else is going to write to dest_dir
+    precompress_changed = manifest.setting_changed("precompress", precompress_output)
+    if precompress_output:
+        from compress import precompress
+        with profiling.stage(build_profiler, "precompress"):
+            compressed = precompress(dest_dir, workers)
+        log.info(f"Compressed {len(compressed)} files")
+    elif precompress_changed:
+        # Siblings left from the last build would go on serving the old pages, so they all go. Nothing writes them until it's turned back on
+        from compress import remove_orphans
+        remove_orphans(dest_dir, everything=True)
+
+    # Publishing goes before saving the manifest: if it fails, the next build starts from the old live site and must not think it's up to date
+    if keep_builds:
+        import publish
+        with profiling.stage(build_profiler, "publish"):
+            manifest.settings["published_build"] = publish.publish(live_dir, keep_builds)
+
+    with profiling.stage(build_profiler, "manifest"):
+        manifest.save()
+
+    if build_profiler is not None:
+        report = profiling.build_report(build_profiler, results, time.perf_counter() - started)
+        if profile_path:
+            profiling.write_report(report, profile_path)
+        if show_stats:
+            print(profiling.format_report(report))
+    return changed_pages
@@ -0,0 +1,78 @@
+# Precompressed siblings (.gz, and .br when the brotli module is installed) for the text files in the output
+
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from file_manip import walk_files
+
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".mjs", ".json", ".xml", ".svg", ".txt", ".map", ".rss"}
+COMPRESSED_EXTENSIONS = (".gz", ".br")
+MIN_SIZE = 256 # Smaller files don't shrink enough to be worth a second request-time lookup
+
+def siblings(path):
+    names = [f"{path}.gz"]
+    if brotli is not None:
+        names.append(f"{path}.br")
+    return names
+
+def needs_compression(path): # Siblings carry their source's mtime, so a mismatch means the source changed
+    mtime = os.stat(path).st_mtime_ns
+    for sibling in siblings(path):
+        if not os.path.exists(sibling) or os.stat(sibling).st_mtime_ns != mtime:
+            return True
+    return False
+
+def write_sibling(path, data, mtime_ns):
+    temp_path = f"{path}.tmp"
+    sibling_file = open(temp_path, "wb")
+    sibling_file.write(data)
+    sibling_file.close()
+    os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+    os.replace(temp_path, path)
+
+def compress_file(path):
+    source_file = open(path, "rb")
+    data = source_file.read()
+    source_file.close()
+    mtime = os.stat(path).st_mtime_ns
+    # mtime=0 keeps the gzip bytes identical between builds of the same content
+    write_sibling(f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0), mtime)
+    if brotli is not None:
+        write_sibling(f"{path}.br", brotli.compress(data, quality=11), mtime)
+    elif os.path.exists(f"{path}.br"):
+        os.remove(f"{path}.br") # Left by a build that had brotli, and now older than the page
+    return path
+
+def find_compressible(dest_dir):
+    files = []
+    for path in walk_files(dest_dir):
+        if os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS and os.path.getsize(path) >= MIN_SIZE:
+            files.append(path)
+    return files
+
+def remove_orphans(dest_dir, everything=False): # Deletes siblings whose source is gone or no longer worth compressing, or all of them once precompression is turned off
+    for path in list(walk_files(dest_dir)):
+        source = path[:-3]
+        # Only ones we could have written, so a static archive.tar.gz is left alone
+        if path.endswith(COMPRESSED_EXTENSIONS) and os.path.splitext(source)[1] in COMPRESSIBLE_EXTENSIONS:
+            if everything or not os.path.exists(source) or os.path.getsize(source) < MIN_SIZE:
+                os.remove(path)
+
+def precompress(dest_dir, workers=None): # Compresses every text file that changed since its siblings were written. Returns the ones it did
+    remove_orphans(dest_dir)
+    changed = [path for path in find_compressible(dest_dir) if needs_compression(path)]
+    if not changed:
+        return []
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(changed)))
+    if workers == 1:
+        return [compress_file(path) for path in changed]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(compress_file, changed, chunksize=max(1, len(changed) // (workers * 4))))
@@ -1,8 +1,21 @@
 import re
+import time
 from enum import Enum
 
+import profiling
+
 from textnode import TextType, TextNode
-from htmlnode import HTMLNode, LeafNode, ParentNode, ImageNode, LinkNode
+from htmlnode import HTMLNode, LeafNode, ParentNode, ImageNode, LinkNode, RawNode
+from highlight import highlight
+import includes
+# Set to a BlockCache to reuse the rendered HTML of blocks we've seen before. None turns caching off
+block_cache = None
+
+# Set to a {"/index.css": "/index.3f9a1c2b7d.css"} mapping to point images and links at fingerprinted assets
+asset_urls = None
+
+# Set to {image url: {"attributes": ..., "sources": ...}} from the image stage to give images sizes, srcsets and lazy loading
+image_info = None
 
 class BlockType(Enum):
     PARAGRAPH = "paragraph"
@@ -23,9 +36,13 @@ def text_node_to_html_node(text_node): # Converts TextNode objects into HTMLNode
         case TextType.CODE_TEXT:
             return LeafNode("code", text_node.text)
         case TextType.LINK_TEXT:
-            return LinkNode(text_node.url, text_node.text)
+            return LinkNode(asset_urls.get(text_node.url, text_node.url) if asset_urls else text_node.url, text_node.text)
         case TextType.IMAGE_TEXT:
-            return ImageNode(text_node.url, text_node.text)
+            src = asset_urls.get(text_node.url, text_node.url) if asset_urls else text_node.url
+            info = image_info.get(text_node.url) if image_info else None
+            if info is None:
+                return ImageNode(src, text_node.text)
+            return ImageNode(src, text_node.text, info["attributes"], info["sources"])
         case _:
             raise Exception("invalid text type")
 
@@ -89,23 +106,50 @@ def split_nodes_link(old_nodes): # Same as the above function but for links
             new_nodes.append(TextNode(text_copy[position:], TextType.NORMAL_TEXT))
     return new_nodes
 
+# Compiled once at import rather than looked up in re's cache on every call
+IMAGE_PATTERN = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)")
+LINK_PATTERN = re.compile(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)")
+ORDERED_ITEM_PATTERN = re.compile(r'^\s*\d+\.\s+(.*)')
+LANGUAGE_PATTERN = re.compile(r"[\w+#.-]*") # The language after a code fence, stopping at anything that can't go in a class name
+
 def extract_markdown_images(text): # Extracts elements needed to build an image node from a markdown text string. Uses the re module
-    extracted_images = re.findall(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)", text)
+    extracted_images = IMAGE_PATTERN.findall(text)
     return extracted_images
 
 def extract_markdown_links(text): # Like the function above but with links instead of images
-    extracted_links = re.findall(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)", text)
+    extracted_links = LINK_PATTERN.findall(text)
     return extracted_links
 
-def text_to_textnode(text): # Uses every function in this file to turn markdown text into usable TextNode objects
-    base_node = TextNode(text, TextType.NORMAL_TEXT)
-    node_list = [base_node]
-    # COMMENCE THE PROCESSING HERE
-    node_list = split_nodes_image(node_list)
-    node_list = split_nodes_link(node_list)
-    node_list = split_nodes_delimiter(node_list, "**", TextType.BOLD_TEXT)
-    node_list = split_nodes_delimiter(node_list, "_", TextType.ITALIC_TEXT)
-    node_list = split_nodes_delimiter(node_list, "`", TextType.CODE_TEXT)
+# One regex that finds images and links in a single scan. Images win at a "!", links refuse to start right after one
+INLINE_LINK_PATTERN = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)|(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)")
+
+def split_delimiters(text, node_list): # Does the bold, italic and code splits of one plain stretch of text in one go
+    for i, bold_slice in enumerate(text.split("**")):
+        if i % 2 == 1:
+            node_list.append(TextNode(bold_slice, TextType.BOLD_TEXT))
+            continue
+        for j, italic_slice in enumerate(bold_slice.split("_")):
+            if j % 2 == 1:
+                node_list.append(TextNode(italic_slice, TextType.ITALIC_TEXT))
+                continue
+            for k, code_slice in enumerate(italic_slice.split("`")):
+                node_list.append(TextNode(code_slice, TextType.CODE_TEXT if k % 2 == 1 else TextType.NORMAL_TEXT))
+
+def text_to_textnode(text): # Turns markdown text into TextNode objects in one scan, giving the same nodes as chaining the split_nodes_* functions
+    node_list = []
+    position = 0
+    for match in INLINE_LINK_PATTERN.finditer(text):
+        start_index = match.start()
+        # The split functions drop empty stretches between images and links, so we do too
+        if start_index > position:
+            split_delimiters(text[position:start_index], node_list)
+        if match.group(1) is not None:
+            node_list.append(TextNode(match.group(1), TextType.IMAGE_TEXT, match.group(2)))
+        else:
+            node_list.append(TextNode(match.group(3), TextType.LINK_TEXT, match.group(4)))
+        position = match.end()
+    if position == 0 or position < len(text):
+        split_delimiters(text[position:], node_list)
     return node_list
 
 def markdown_to_blocks(markdown): # Turns raw markdown into blocks that can be converted to TextNodes
@@ -117,22 +161,54 @@ def markdown_to_blocks(markdown): # Turns raw markdown into blocks that can be c
             stripped_lines.pop()
     return stripped_lines
 
+def iter_markdown_blocks(lines): # Streaming markdown_to_blocks: takes any iterable of lines, like an open file, and yields the same blocks
+    block_lines = []
+    for line in lines:
+        if line.endswith("\n"):
+            line = line[:-1]
+        if line != "":
+            block_lines.append(line)
+            continue
+        # An empty line is where markdown_to_blocks would find a "\n\n"
+        if block_lines:
+            block = "\n".join(block_lines).strip()
+            block_lines = []
+            if block != "":
+                yield block
+    if block_lines:
+        block = "\n".join(block_lines).strip()
+        if block != "":
+            yield block
+
 def block_to_block_type(block): # Checks what kind of markdown block is the input
     if block.startswith("```") and block.endswith("```"):
         return BlockType.CODE
     if block.startswith(("# ", "## ", "### ", "#### ", "##### ", "###### ")):
         return BlockType.HEADING
-    
-    lines = block.split("\n")
 
-    if all(line.startswith(">") for line in lines):
+    # One walk over the lines checks the quote and both list kinds at the same time
+    could_be_quote = True
+    could_be_unordered = True
+    could_be_ordered = True
+    expected_number = 1
+    for line in block.split("\n"):
+        if could_be_quote and not line.startswith(">"):
+            could_be_quote = False
+        if could_be_unordered and not line.startswith("- "):
+            could_be_unordered = False
+        if could_be_ordered:
+            if line.startswith(f"{expected_number}. "):
+                expected_number += 1
+            else:
+                could_be_ordered = False
+        if not (could_be_quote or could_be_unordered or could_be_ordered):
+            return BlockType.PARAGRAPH
+
+    if could_be_quote:
         return BlockType.QUOTE
-    if all(line.startswith("- ") for line in lines):
+    if could_be_unordered:
         return BlockType.UNORDERED_LIST
-    if is_ordered_list(block):
-        return BlockType.ORDERED_LIST
-    
-    return BlockType.PARAGRAPH
+    return BlockType.ORDERED_LIST
 
 def is_ordered_list(block): # Helper function used for the above
     lines = block.split("\n")
@@ -143,73 +219,132 @@ def is_ordered_list(block): # Helper function used for the above
         expected_number += 1
     return True
 
+def block_to_html_node(block): # Turns a single markdown block into the HTMLNode tree for it
+    type = block_to_block_type(block)
+    match type:
+        case BlockType.PARAGRAPH:
+            p_node = ParentNode("p", [])
+            text_nodes = text_to_textnode(block)
+            html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
+            p_node.children = html_nodes
+            return p_node
+        case BlockType.HEADING:
+            head_amount = block.count("#", 0, 6)
+            h_node = ParentNode(f"h{head_amount}", [])
+            heading_content = block.lstrip("#").lstrip()
+            text_nodes = text_to_textnode(heading_content)
+            html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
+            h_node.children = html_nodes
+            return h_node
+        case BlockType.CODE:
+            pre_node = ParentNode("pre", [])
+            lines = block.strip().split("\n")
+            code_content = block
+            language = ""
+            if lines[0].startswith("```") and lines[-1].startswith("```"):
+                code_lines = lines[1:-1]
+                code_content = "\n".join(code_lines)
+                language = LANGUAGE_PATTERN.match(lines[0][3:].strip().lower()).group()
+            if language:
+                # Highlighted at build time, so the page needs no highlighter script
+                class_attribute = HTMLNode(props={"class": f"language-{language}"}).props_to_html()
+                return RawNode(None, f"<pre><code{class_attribute}>{highlight(code_content, language)}</code></pre>")
+            c_text_node = TextNode(code_content, TextType.CODE_TEXT)
+            c_node = text_node_to_html_node(c_text_node)
+            pre_node.children = [c_node]
+            return pre_node
+        case BlockType.QUOTE:
+            q_node = ParentNode("blockquote", [])
+            text_nodes = text_to_textnode(block)
+            for node in text_nodes:
+                node.text = node.text.replace("> ", "")
+            html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
+            q_node.children = html_nodes
+            return q_node
+        case BlockType.UNORDERED_LIST:
+            ul_node = ParentNode("ul", [])
+            list_items = [item.strip()[2:] for item in block.split("\n") if item.strip().startswith("- ")]
+            for item in list_items:
+                li_node = ParentNode("li", [])
+                text_nodes = text_to_textnode(item)
+                html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
+                li_node.children = html_nodes
+                ul_node.children.append(li_node)
+            return ul_node
+        case BlockType.ORDERED_LIST:
+            ol_node = ParentNode("ol", [])
+            list_items = []
+            for item in block.split("\n"):
+                match = ORDERED_ITEM_PATTERN.match(item)
+                if match:
+                    list_items.append(match.group(1))
+            for item in list_items:
+                li_node = ParentNode("li", [])
+                text_nodes = text_to_textnode(item)
+                html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
+                li_node.children = html_nodes
+                ol_node.children.append(li_node)
+            return ol_node
+
+def cached_block_to_html_node(block): # block_to_html_node, going through block_cache when there is one. Include blocks become the fragment's HTML
+    if block.startswith("{%"):
+        html = includes.include_block(block)
+        if html is not None:
+            return RawNode(None, html)
+    if block_cache is None:
+        return block_to_html_node(block)
+    key = block_cache.key(block)
+    html = block_cache.get(key)
+    if html is None:
+        html = block_to_html_node(block).to_html()
+        block_cache.put(key, html)
+    return RawNode(None, html)
+
 def markdown_to_html_node(markdown):
     blocks = markdown_to_blocks(markdown)
     parent = ParentNode("div", [])
     for block in blocks:
-        type = block_to_block_type(block)
-        match type:
-            case BlockType.PARAGRAPH:
-                p_node = ParentNode("p", [])
-                text_nodes = text_to_textnode(block)
-                html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
-                p_node.children = html_nodes
-                parent.children.append(p_node)
-            case BlockType.HEADING:
-                head_amount = block.count("#", 0, 6)
-                h_node = ParentNode(f"h{head_amount}", [])
-                heading_content = block.lstrip("#").lstrip()
-                text_nodes = text_to_textnode(heading_content)
-                html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
-                h_node.children = html_nodes
-                parent.children.append(h_node)
-            case BlockType.CODE:
-                pre_node = ParentNode("pre", [])
-                lines = block.strip().split("\n")
-                code_content = block
-                if lines[0].startswith("```") and lines[-1].startswith("```"):
-                    code_lines = lines[1:-1]
-                    code_content = "\n".join(code_lines)
-                c_text_node = TextNode(code_content, TextType.CODE_TEXT)
-                c_node = text_node_to_html_node(c_text_node)
-                pre_node.children = [c_node]
-                parent.children.append(pre_node)
-            case BlockType.QUOTE:
-                q_node = ParentNode("blockquote", [])
-                text_nodes = text_to_textnode(block)
-                for node in text_nodes:
-                    node.text = node.text.replace("> ", "")
-                html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
-                q_node.children = html_nodes
-                parent.children.append(q_node)
-            case BlockType.UNORDERED_LIST:
-                ul_node = ParentNode("ul", [])
-                list_items = [item.strip()[2:] for item in block.split("\n") if item.strip().startswith("- ")]
-                for item in list_items:
-                    li_node = ParentNode("li", [])
-                    text_nodes = text_to_textnode(item)
-                    html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
-                    li_node.children = html_nodes
-                    ul_node.children.append(li_node)
-                parent.children.append(ul_node)
-            case BlockType.ORDERED_LIST:
-                ol_node = ParentNode("ol", [])
-                list_items = []
-                for item in block.split("\n"):
-                    match = re.match(r'^\s*\d+\.\s+(.*)', item)
-                    if match:
-                        list_items.append(match.group(1))
-                for item in list_items:
-                    li_node = ParentNode("li", [])
-                    text_nodes = text_to_textnode(item)
-                    html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
-                    li_node.children = html_nodes
-                    ol_node.children.append(li_node)
-                parent.children.append(ol_node)
+        parent.children.append(cached_block_to_html_node(block))
     return parent
 
+def write_markdown_html(blocks, write): # Writes the same HTML as markdown_to_html_node, building one block's nodes at a time
+    write("<div>")
+    if profiling.profiler is None:
+        for block in blocks:
+            cached_block_to_html_node(block).write_html(write)
+    else:
+        for block in blocks:
+            started = time.perf_counter()
+            node = cached_block_to_html_node(block)
+            parsed = time.perf_counter()
+            # Time inside a TimedWriter is the "write" stage's, so it comes off serializing
+            written = getattr(write, "seconds", 0.0)
+            node.write_html(write)
+            profiling.profiler.add("parse", parsed - started, 1, len(block))
+            profiling.profiler.add("serialize", time.perf_counter() - parsed - (getattr(write, "seconds", 0.0) - written))
+    write("</div>")
+
+def parse_front_matter(lines): # Reads "key: value" lines fenced by --- at the very top of a file. Returns the variables and how many lines they used
+    iterator = iter(lines)
+    first_line = next(iterator, None)
+    if first_line is None or first_line.rstrip("\n") != "---":
+        return {}, 0
+    variables = {}
+    line_count = 1
+    for line in iterator:
+        line_count += 1
+        line = line.rstrip("\n")
+        if line == "---":
+            return variables, line_count
+        key, separator, value = line.partition(":")
+        if separator:
+            variables[key.strip()] = value.strip()
+    return {}, 0 # Never closed, so it was just a horizontal rule
+
 def extract_title(markdown):
-    lines = markdown.split("\n")
+    return extract_title_from_lines(markdown.split("\n"))
+
+def extract_title_from_lines(lines): # Stops at the first title, so it only reads as much of a file as it has to
     for line in lines:
         if line.startswith("# "):
-            return line.strip("#").strip()
+            return line.rstrip("\n").strip("#").strip()
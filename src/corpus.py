@@ -0,0 +1,81 @@
+# Synthetic markdown for benchmarks. The same seed always gives the same corpus
+
+import argparse
+import os
+import random
+
+WORDS = "the ring hobbit wizard shire mountain river elf dwarf road forest tower king sword song night star fire stone lake".split()
+
+def sentence(rng, markup_density): # A sentence where each word has a markup_density chance of being bold, italic, code, a link or an image
+    words = []
+    for _ in range(rng.randint(6, 14)):
+        word = rng.choice(WORDS)
+        if rng.random() < markup_density:
+            kind = rng.randrange(5)
+            if kind == 0:
+                word = f"**{word}**"
+            elif kind == 1:
+                word = f"_{word}_"
+            elif kind == 2:
+                word = f"`{word}`"
+            elif kind == 3:
+                word = f"[{word}](/{rng.choice(WORDS)}/{word})"
+            else:
+                word = f"![{word}](/images/{word}.png)"
+        words.append(word)
+    return " ".join(words).capitalize() + "."
+
+def generate_markdown(rng, blocks=40, sentences=4, markup_density=0.1, list_length=5, code_lines=8): # One page with a mix of every block type
+    parts = [f"# {sentence(rng, 0)[:-1]}"]
+    for i in range(blocks):
+        kind = i % 6
+        if kind == 0:
+            parts.append(f"## {sentence(rng, markup_density)[:-1]}")
+        elif kind == 1:
+            parts.append("\n".join(f"- {sentence(rng, markup_density)}" for _ in range(list_length)))
+        elif kind == 2:
+            parts.append("\n".join(f"{number}. {sentence(rng, markup_density)}" for number in range(1, list_length + 1)))
+        elif kind == 3:
+            code = "\n".join(f"    {rng.choice(WORDS)} = {rng.randint(0, 999)}" for _ in range(code_lines))
+            parts.append(f"```\n{code}\n```")
+        elif kind == 4:
+            parts.append(f"> {sentence(rng, markup_density)}")
+        else:
+            parts.append(" ".join(sentence(rng, markup_density) for _ in range(sentences)))
+    return "\n\n".join(parts) + "\n"
+
+def generate_corpus(dest_dir, pages=100, seed=0, pages_per_dir=50, **page_settings): # Writes pages into nested directories, returns their paths
+    rng = random.Random(seed)
+    paths = []
+    for number in range(pages):
+        directory = os.path.join(dest_dir, f"section{number // pages_per_dir}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"page{number}.md")
+        page_file = open(path, "w")
+        page_file.write(generate_markdown(rng, **page_settings))
+        page_file.close()
+        paths.append(path)
+    return paths
+
+def add_corpus_arguments(parser): # Shared with bench.py, so both describe a corpus the same way
+    parser.add_argument("--pages", type=int, default=200, help="number of pages")
+    parser.add_argument("--blocks", type=int, default=40, help="blocks per page")
+    parser.add_argument("--sentences", type=int, default=4, help="sentences per paragraph")
+    parser.add_argument("--markup-density", type=float, default=0.1, help="share of words with inline markup")
+    parser.add_argument("--list-length", type=int, default=5, help="items per list")
+    parser.add_argument("--code-lines", type=int, default=8, help="lines per code block")
+    parser.add_argument("--seed", type=int, default=0)
+
+def page_settings(args):
+    return {"blocks": args.blocks, "sentences": args.sentences, "markup_density": args.markup_density, "list_length": args.list_length, "code_lines": args.code_lines}
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes a synthetic markdown corpus")
+    parser.add_argument("dest_dir")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    paths = generate_corpus(args.dest_dir, args.pages, args.seed, **page_settings(args))
+    print(f"Wrote {len(paths)} pages to {args.dest_dir}")
+
+if __name__ == "__main__":
+    main()
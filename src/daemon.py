@@ -0,0 +1,120 @@
+# A build process that stays running, so repeated builds skip interpreter startup and imports, plus the client that talks to it
+
+import contextlib
+import io
+import json
+import logging
+import os
+import socket
+import traceback
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.path.join(".cache", "daemon.sock")
+
+def read_message(connection): # One JSON message per connection in each direction, ended by closing our side
+    data = b""
+    while True:
+        chunk = connection.recv(1 << 16)
+        if not chunk:
+            break
+        data += chunk
+    return json.loads(data.decode()) if data else None
+
+def send_message(connection, message):
+    connection.sendall(json.dumps(message).encode())
+    connection.shutdown(socket.SHUT_WR)
+
+def run_request(request): # Runs one command line the way main would, capturing its logs and prints. Returns (exit status, output)
+    from main import log_level, parse_args, run
+    output = io.StringIO()
+    handler = logging.StreamHandler(output)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    root = logging.getLogger()
+    old_level = root.level
+    old_cwd = os.getcwd()
+    status = 0
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            args = parse_args(request["argv"])
+            if args.command in ("watch", "daemon"):
+                raise ValueError(f"the daemon can't run '{args.command}'")
+            root.setLevel(log_level(args))
+            root.addHandler(handler)
+            os.chdir(request["cwd"]) # Paths on the command line are relative to wherever the client ran
+            run(args)
+    except SystemExit as error: # argparse errors and --help
+        status = error.code if isinstance(error.code, int) else 1
+    except Exception:
+        output.write(traceback.format_exc())
+        status = 1
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(old_level)
+        os.chdir(old_cwd)
+    return status, output.getvalue()
+
+def serve(path=DEFAULT_SOCKET, requests=None): # Answers build requests one at a time until killed, or until it has handled requests of them
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.remove(path) # Left behind by a daemon that didn't shut down cleanly
+        else:
+            raise RuntimeError(f"a build daemon is already listening on {path}")
+        finally:
+            probe.close()
+    # The heavy modules load once here instead of once per build
+    import build
+    import main
+    import assets, images, minify, publish, search, shard, siteindex # build imports these per stage, so load them up front too
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Only our user gets to start builds. The socket is made 0600 to begin with, so no one can connect before a chmod would land
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    log.info(f"Build daemon listening on {path}")
+    handled = 0
+    try:
+        while requests is None or handled < requests:
+            connection, address = server.accept()
+            try:
+                request = read_message(connection)
+                if request is None:
+                    continue # Someone checking whether we're alive
+                log.info(f"Building: {' '.join(request['argv'])}")
+                status, output = run_request(request)
+                send_message(connection, {"status": status, "output": output})
+            except (OSError, ValueError) as error:
+                log.warning(f"Dropped a request: {error}")
+            finally:
+                connection.close()
+            handled += 1
+    finally:
+        server.close()
+        os.remove(path)
+
+def send_request(argv, path=DEFAULT_SOCKET, cwd=None): # Has the daemon run a command line and prints what it said. Returns its exit status, or None if no daemon is listening
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return None
+    try:
+        send_message(client, {"argv": list(argv), "cwd": cwd or os.getcwd()})
+        response = read_message(client)
+    except (BrokenPipeError, ConnectionResetError): # It hung up before reading all of the request
+        response = None
+    finally:
+        client.close()
+    if response is None:
+        log.error(f"The build daemon on {path} hung up without answering, see its log")
+        return 1
+    print(response["output"], end="")
+    return response["status"]
@@ -1,44 +1,381 @@
 # Functions that can manipulate files and directories
 
+import hashlib
+import io
+import itertools
+import logging
 import os
 import shutil
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
+try:
+    import fcntl
+except ImportError: # Not on Windows
+    fcntl = None
+
+import conversions
+import htmlnode
+import includes
+import memory
 from conversions import *
+from blockcache import BlockCache
+import profiling
+from pipeline import run_pipeline
+from template import Template, load_template
 
-def copy_directory(source, destination):
-    items = os.listdir(source)
+log = logging.getLogger(__name__)
 
-    for item in items:
-        source_path = os.path.join(source, item)
-        dest_path = os.path.join(destination, item)
-        if os.path.isfile(source_path):
-            shutil.copy(source_path, dest_path)
-            print(f"Copied file: {source_path} to {dest_path}")
-        else:
-            if not os.path.exists(dest_path):
-                os.mkdir(dest_path)
-                print(f"Created directory: {dest_path}")
-            copy_directory(source_path, dest_path)
+# Linux's FICLONE ioctl asks copy-on-write filesystems (btrfs, xfs) for a reflink instead of a byte copy
+FICLONE = 0x40049409
 
-def generate_page(from_path, template_path, dest_path):
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
-    md_file = open(from_path)
-    md_file_contents = md_file.read()
-    md_file.close()
+def _clone_or_send(source_file, dest_file): # Tries the cheapest kernel-side copy first and falls back to a plain one
+    if fcntl is not None and sys.platform.startswith("linux"):
+        try:
+            fcntl.ioctl(dest_file.fileno(), FICLONE, source_file.fileno())
+            return "reflink"
+        except OSError:
+            pass
+    try:
+        size = os.fstat(source_file.fileno()).st_size
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(dest_file.fileno(), source_file.fileno(), offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+        return "sendfile"
+    except (OSError, AttributeError):
+        source_file.seek(0)
+        dest_file.seek(0)
+        dest_file.truncate()
+        shutil.copyfileobj(source_file, dest_file, 1 << 20)
+        return "copy"
+
+def copy_file(source, dest, hardlink=False): # Copies one file, keeping its mtime so later syncs can tell it's unchanged
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    # Unlinking first means we never write through a hardlink back into static/
+    if os.path.lexists(dest):
+        os.remove(dest)
+    if hardlink:
+        try:
+            os.link(source, dest)
+            return "hardlink"
+        except OSError:
+            pass
+    with open(source, "rb") as source_file, open(dest, "wb") as dest_file:
+        method = _clone_or_send(source_file, dest_file)
+    shutil.copystat(source, dest)
+    return method
+
+def copy_files(pairs, hardlink=False, workers=None): # Copies (source, destination) pairs on a thread pool, since the work is all I/O
+    if not pairs:
+        return
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pairs)))) as executor:
+        for _ in executor.map(lambda pair: copy_file(pair[0], pair[1], hardlink), pairs):
+            pass
+
+def page_context(front_matter, page_title, write_content): # Everything a template can use: the title, the content and the page's front matter
+    context = {"Title": page_title}
+    context.update(front_matter) # Front matter may set the title, but never replace the page's content
+    context["Content"] = write_content
+    return context
+
+def render_page(md_file_contents, template): # Fills a template with the title and HTML of a markdown document
+    if isinstance(template, str):
+        template = Template(template)
+    lines = md_file_contents.split("\n")
+    front_matter, front_matter_lines = parse_front_matter(lines)
+    body = "\n".join(lines[front_matter_lines:])
+    write_content = lambda write: write_markdown_html(markdown_to_blocks(body), write)
+    return template.render(page_context(front_matter, extract_title(body), write_content))
+
+def render_markdown_file(md_file, template, write, terms=None, links=None): # Fills the template from an open markdown file (anything seekable) through write. Counts its words into terms and gathers its link targets into links if given them. Returns the title and front matter
+    front_matter, front_matter_lines = parse_front_matter(md_file)
+    md_file.seek(0)
+    page_title = extract_title_from_lines(itertools.islice(md_file, front_matter_lines, None))
+    content_seconds = [0.0] # Profiling only: time spent on the content, which the template stage leaves out
 
-    template_file = open(template_path)
-    template_file_content = template_file.read()
-    template_file.close()
+    def write_content(write):
+        started = time.perf_counter()
+        written = getattr(write, "seconds", 0.0) # Writing has a stage of its own, so it comes off both
+        md_file.seek(0)
+        blocks = iter_markdown_blocks(itertools.islice(md_file, front_matter_lines, None))
+        if terms is not None:
+            from search import collect_terms
+            blocks = collect_terms(blocks, terms)
+        if links is not None:
+            from siteindex import collect_links
+            blocks = collect_links(blocks, links)
+        if profiling.profiler is not None: # Splitting includes counting words and links for search and the site index
+            blocks = profiling.timed_blocks(blocks, md_file)
+        write_markdown_html(blocks, write)
+        content_seconds[0] += time.perf_counter() - started - (getattr(write, "seconds", 0.0) - written)
 
-    main_node = markdown_to_html_node(md_file_contents)
-    main_node_html = main_node.to_html()
-    page_title = extract_title(md_file_contents)
-    template_file_content = template_file_content.replace("{{ Title }}", page_title)
-    template_file_content = template_file_content.replace("{{ Content }}", main_node_html)
+    started = time.perf_counter()
+    written = getattr(write, "seconds", 0.0)
+    template.write(page_context(front_matter, page_title, write_content), write)
+    if profiling.profiler is not None:
+        profiling.profiler.add("template", time.perf_counter() - started - content_seconds[0] - (getattr(write, "seconds", 0.0) - written))
+    return page_title, front_matter
 
+def write_page(from_path, template, dest_path, terms=None, links=None): # Renders one markdown file while reading it, so huge files never sit in memory whole. Returns the title and front matter
     os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    
-    index = open(dest_path, "w")
-    index.write(template_file_content)
+
+    md_file = open(from_path)
+    # Rendering goes to a temporary file first so a failure never leaves half a page behind
+    temp_path = f"{dest_path}.tmp"
+    index = open(temp_path, "w", buffering=1 << 16)
+    source, write = md_file, index.write
+    if profiling.profiler is not None:
+        source, write = profiling.TimedReader(md_file), profiling.TimedWriter(index.write)
+    try:
+        page_title, front_matter = render_markdown_file(source, template, write, terms, links)
+    except Exception:
+        index.close()
+        os.remove(temp_path)
+        raise
+    finally:
+        md_file.close()
+    started = time.perf_counter()
+    index.close()
+    os.replace(temp_path, dest_path)
+    if profiling.profiler is not None:
+        profiling.profiler.add("read", source.seconds, 1, source.bytes)
+        profiling.profiler.add("write", write.seconds + time.perf_counter() - started, 1, write.bytes)
+    return page_title, front_matter
+
+def write_output(dest_path, chunks): # Writes rendered HTML the same way write_page does: through a temporary file and a rename
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    temp_path = f"{dest_path}.tmp"
+    index = open(temp_path, "w")
+    try:
+        index.write("".join(chunks))
+    except Exception:
+        index.close()
+        os.remove(temp_path)
+        raise
     index.close()
+    os.replace(temp_path, dest_path)
+
+def generate_page(from_path, template_path, dest_path):
+    log.debug(f"Generating page from {from_path} to {dest_path} using {template_path}")
+    write_page(from_path, load_template(template_path), dest_path)
+
+def walk_files(source): # Every file under a directory, in a stable order
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for file in sorted(files):
+            yield os.path.join(root, file)
+
+def page_destination(from_path, dir_path_content, dest_dir_path): # content/blog/tom.md -> public/blog/tom.html
+    relative_path = os.path.relpath(from_path, dir_path_content)
+    return os.path.join(dest_dir_path, relative_path[:-len(".md")] + ".html")
+
+def is_partial(path, root): # Files and folders starting with _ hold fragments for includes, not pages
+    return any(part.startswith("_") for part in os.path.relpath(path, root).split(os.sep))
+
+def find_pages(dir_path_content, dest_dir_path): # Walks the content tree and pairs every markdown file with its output path
+    pages = []
+    for from_path in walk_files(dir_path_content):
+        if from_path.endswith(".md") and not is_partial(from_path, dir_path_content):
+            pages.append((from_path, page_destination(from_path, dir_path_content, dest_dir_path)))
+    return pages
+
+def asset_destination(source_path, source, destination):
+    return os.path.join(destination, os.path.relpath(source_path, source))
+
+def find_assets(source, destination): # Same as the above but for static files, which keep their names
+    return [(source_path, asset_destination(source_path, source, destination)) for source_path in walk_files(source)]
+
+# Each worker process parses the template once and keeps it, and its other per-build state, for every page it renders
+_worker_template = None
+_worker_search = False
+_worker_site_index = False
+_worker_memory = None # Bytes this worker may hold before it frees memory eagerly, in low-memory builds
+
+def _init_page_worker(template_path, options=None):
+    global _worker_template, _worker_search, _worker_site_index, _worker_memory
+    options = options or {}
+    _worker_template = load_template(template_path)
+    _worker_search = options.get("search", False)
+    _worker_site_index = options.get("site_index", False)
+    _worker_memory = options.get("worker_memory")
+    includes.clear()
+    asset_urls = options.get("asset_urls")
+    if asset_urls:
+        from assets import rewrite_asset_urls
+        conversions.asset_urls = asset_urls
+        _worker_template = _worker_template.rewritten(lambda text: rewrite_asset_urls(text, asset_urls))
+    conversions.image_info = options.get("image_info")
+    if options.get("minify"):
+        from minify import minify_html_text
+        htmlnode.minify = True
+        _worker_template = _worker_template.rewritten(minify_html_text)
+    if options.get("block_cache_size"):
+        site_data = options.get("site_data", "")
+        salt = hashlib.blake2b(site_data.encode(), digest_size=16).digest() if site_data else b""
+        conversions.block_cache = BlockCache(options["block_cache_size"], options.get("block_cache_path"), salt)
+    if options.get("profile"):
+        profiling.profiler = profiling.Profiler()
+
+def _finish_page_worker(): # Undoes the worker setup when pages were rendered in our own process
+    global _worker_search, _worker_site_index, _worker_memory
+    _worker_search = False
+    _worker_site_index = False
+    _worker_memory = None
+    if conversions.block_cache is not None:
+        conversions.block_cache.close()
+        conversions.block_cache = None
+    conversions.asset_urls = None
+    conversions.image_info = None
+    htmlnode.minify = False
+    profiling.profiler = None
+
+def _generate_page_worker(from_path, dest_path, text=None): # Renders one page and reports back what happened. Given the source's text already read, it leaves the HTML in result["chunks"] for a writer thread instead of writing it
+    started = time.perf_counter()
+    terms = Counter() if _worker_search else None
+    links = [] if _worker_site_index else None
+    result = {"source": from_path, "dest": dest_path}
+    if _worker_memory is not None:
+        memory.reset_peak()
+    includes.begin_page(from_path, terms, links)
+    try:
+        if text is None:
+            title, front_matter = write_page(from_path, _worker_template, dest_path, terms, links)
+        else:
+            result["chunks"] = []
+            title, front_matter = render_markdown_file(io.StringIO(text), _worker_template, result["chunks"].append, terms, links)
+    finally:
+        result["includes"] = sorted(includes.end_page())
+    if terms is not None or links is not None:
+        result["title"] = title
+    if terms is not None:
+        result["terms"] = terms
+    if links is not None:
+        result["front_matter"] = front_matter
+        result["links"] = links
+    if profiling.profiler is not None:
+        result["seconds"] = time.perf_counter() - started
+        result["bytes"] = os.path.getsize(dest_path) if text is None else sum(len(chunk) for chunk in result["chunks"])
+        # Prefetched pages are read and written on other threads, so only streamed ones have read and write stages
+        result["stages"] = profiling.profiler.take()
+    if conversions.block_cache is not None:
+        conversions.block_cache.flush()
+        result["block_cache"] = conversions.block_cache.take_stats()
+    if _worker_memory is not None:
+        result["peak_rss"] = memory.peak_rss()
+        # The page's nodes and strings are garbage by now. Over our share, make sure the OS gets that memory back before the next page
+        if (memory.rss() or 0) > _worker_memory:
+            memory.release()
+        result["rss"] = memory.rss()
+        result["pid"] = os.getpid()
+    return result
+
+PREFETCH_LIMIT = 1 << 20 # Sources bigger than this are streamed by the renderer instead of read ahead, so the queues never hold huge pages
+
+def _read_source(page): # Pipeline reader: the whole source, or None for the renderer to stream itself
+    if os.path.getsize(page[0]) > PREFETCH_LIMIT:
+        return None
+    md_file = open(page[0])
+    text = md_file.read()
+    md_file.close()
+    return text
+
+def _render_prefetched(page, text): # Pipeline renderer: hands the HTML on to a writer, unless the page was streamed and is already written
+    result = _generate_page_worker(page[0], page[1], text)
+    return result, result.pop("chunks", None)
+
+def _write_rendered(page, chunks):
+    write_output(page[1], chunks)
+
+def _generate_pipelined(pages, io_threads): # Renders pages on this thread while io_threads readers fetch sources ahead and as many writers save pages behind
+    return run_pipeline(pages, _read_source, _render_prefetched, _write_rendered, readers=io_threads, writers=io_threads, depth=io_threads * 4)
+
+def _generate_batch_worker(pages, io_threads): # One process's share of the pages, pipelined
+    return _generate_pipelined(pages, io_threads)
+
+def generate_pages(pages, template_path, workers=None, options=None): # Renders a list of (source, destination) pairs, in parallel when it's worth it. Returns one result per page
+    if not pages:
+        return []
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(pages)))
+    io_threads = (options or {}).get("io_threads", 0)
+    budget = (options or {}).get("memory_budget")
+    if budget:
+        return _generate_within_budget(pages, template_path, workers, options, budget)
+    results = []
+    if workers == 1:
+        _init_page_worker(template_path, options)
+        try:
+            if io_threads:
+                return _generate_pipelined(pages, io_threads)
+            for from_path, dest_path in pages:
+                log.debug(f"Generating page from {from_path} to {dest_path} using {template_path}")
+                results.append(_generate_page_worker(from_path, dest_path))
+        finally:
+            _finish_page_worker()
+        return results
+    from concurrent.futures import ProcessPoolExecutor # Imports all of multiprocessing, which single-page rebuilds never need
+    # Big chunks keep the inter-process chatter low, but leave a few per worker so slow pages balance out
+    chunksize = max(1, len(pages) // (workers * 4))
+    if io_threads:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(template_path, options)) as executor:
+            batches = [pages[start:start + chunksize] for start in range(0, len(pages), chunksize)]
+            for batch_results in executor.map(_generate_batch_worker, batches, itertools.repeat(io_threads)):
+                results.extend(batch_results)
+        return results
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(template_path, options)) as executor:
+        from_paths = [page[0] for page in pages]
+        dest_paths = [page[1] for page in pages]
+        for result in executor.map(_generate_page_worker, from_paths, dest_paths, chunksize=chunksize):
+            log.debug(f"Generated page: {result['dest']}")
+            results.append(result)
+    return results
+
+def _generate_within_budget(pages, template_path, workers, options, budget): # Low-memory builds: one page per task, and only as many in flight as the measured RSS allows
+    # Reading sources ahead would hold them in memory, so pages always stream
+    options = dict(options, io_threads=0)
+    workers = memory.workers_for_budget(budget, workers)
+    options["worker_memory"] = budget // (workers + 1)
+    results = []
+    if workers == 1:
+        _init_page_worker(template_path, options)
+        try:
+            for from_path, dest_path in pages:
+                results.append(_generate_page_worker(from_path, dest_path))
+        finally:
+            _finish_page_worker()
+        return results
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    throttle = memory.Throttle(budget, workers)
+    remaining = list(reversed(pages))
+    running = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(template_path, options)) as executor:
+        while remaining or running:
+            while remaining and len(running) < throttle.limit:
+                running.add(executor.submit(_generate_page_worker, *remaining.pop()))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                throttle.update(result["pid"], result["rss"])
+                results.append(result)
+    log.info(f"Memory: {throttle.peak / (1 << 20):.0f}MB at most across {workers} workers, budget {budget / (1 << 20):.0f}MB")
+    return results
+
+def sum_block_cache_stats(results): # Adds up the block cache counters every page reported
+    totals = {"hits": 0, "misses": 0, "evictions": 0}
+    for result in results:
+        for name, count in result.get("block_cache", {}).items():
+            totals[name] += count
+    return totals
 
+def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, workers=None): # Mirrors the whole content tree into the destination directory
+    pages = find_pages(dir_path_content, dest_dir_path)
+    generate_pages(pages, template_path, workers)
+    return pages
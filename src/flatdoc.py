@@ -0,0 +1,105 @@
+# An array-backed alternative to the HTMLNode tree: one entry per node in document order, stored in parallel lists
+
+import sys
+from array import array
+
+import htmlnode
+from htmlnode import HTMLNode, ImageNode, LinkNode, ParentNode, RawNode
+from conversions import cached_block_to_html_node, markdown_to_blocks
+
+# What kind of HTML each entry turns into
+LEAF = 0
+PARENT = 1
+VOID = 2 # Self-closing tags with props, like ImageNode and LinkNode
+RAW = 3 # Ready-made HTML, written out as it is
+
+class FlatDocument:
+    __slots__ = ("kinds", "parents", "tags", "values", "props")
+
+    def __init__(self):
+        self.kinds = array("b")
+        self.parents = array("i") # Index of each node's parent, -1 for the root
+        self.tags = []
+        self.values = []
+        self.props = [] # Almost always None, only images and links carry props
+
+    def __len__(self):
+        return len(self.tags)
+
+    def append(self, kind, tag, value=None, parent=-1, props=None): # Adds one node and returns its index
+        self.kinds.append(kind)
+        self.parents.append(parent)
+        self.tags.append(sys.intern(tag) if isinstance(tag, str) else tag)
+        self.values.append(value)
+        self.props.append(props)
+        return len(self.tags) - 1
+
+    def append_node(self, node, parent=-1): # Copies an HTMLNode tree in after the last entry, as a child of parent
+        if isinstance(node, ParentNode):
+            if node.children == None:
+                raise ValueError("node requires children")
+            index = self.append(PARENT, node.tag, None, parent, node.props)
+            for child in node.children:
+                self.append_node(child, index)
+            return index
+        if isinstance(node, ImageNode) and node.sources:
+            # A <picture> is rare enough that keeping it as ready-made HTML beats teaching the arrays about it
+            return self.append(RAW, None, node.to_html(), parent)
+        if isinstance(node, RawNode):
+            return self.append(RAW, None, node.value, parent)
+        if isinstance(node, (ImageNode, LinkNode)):
+            return self.append(VOID, node.tag, None, parent, node.props)
+        if node.value == None:
+            raise ValueError("node requires value")
+        return self.append(LEAF, node.tag, node.value, parent, node.props)
+
+    @classmethod
+    def from_node(cls, node):
+        document = cls()
+        document.append_node(node)
+        return document
+
+    def write_html(self, write): # Renders straight from the arrays: entries are in document order, so a stack of open tags is all we need
+        kinds = self.kinds
+        parents = self.parents
+        tags = self.tags
+        open_nodes = []
+        for index in range(len(tags)):
+            parent = parents[index]
+            while open_nodes and open_nodes[-1] != parent:
+                write(f"</{tags[open_nodes.pop()]}>")
+            kind = kinds[index]
+            tag = tags[index]
+            if kind == PARENT:
+                if tag == None:
+                    raise ValueError("node requires tag")
+                write(f"<{tag}>")
+                open_nodes.append(index)
+            elif kind == VOID:
+                # Same markup ImageNode and LinkNode write, minified or not
+                props_html = HTMLNode(props=self.props[index]).props_to_html()
+                write(f"<{tag}{props_html}>" if htmlnode.minify and tag == "img" else f"<{tag}{props_html} />")
+            elif kind == RAW:
+                write(self.values[index])
+            else:
+                value = self.values[index]
+                if htmlnode.minify and tag != "code":
+                    value = htmlnode.WHITESPACE_PATTERN.sub(" ", str(value))
+                write(str(value) if tag == None else f"<{tag}>{value}</{tag}>")
+        while open_nodes:
+            write(f"</{tags[open_nodes.pop()]}>")
+
+    def to_html(self):
+        parts = []
+        self.write_html(parts.append)
+        return "".join(parts)
+
+# Only bench.py uses this, to compare memory with the node tree. Builds stream pages through write_markdown_html instead,
+# which never holds more than one block's nodes, so there's nothing for the arrays to save there
+def markdown_to_flat_document(markdown): # Like markdown_to_html_node, but only one block's node tree is alive at a time
+    document = FlatDocument()
+    root = document.append(PARENT, "div")
+    for block in markdown_to_blocks(markdown):
+        # Same path as the tree, so includes and the block cache behave the same
+        document.append_node(cached_block_to_html_node(block), root)
+    return document
@@ -0,0 +1,119 @@
+# Build-time syntax highlighting for fenced code blocks, so pages don't need a highlighter in the browser
+
+import hashlib
+import re
+from collections import OrderedDict
+from html import escape
+
+# Token classes are the short ones Pygments uses, so any Pygments CSS theme styles our output
+COMMENT = "c"
+KEYWORD = "k"
+BUILTIN = "nb"
+STRING = "s"
+NUMBER = "m"
+DECORATOR = "nd"
+VARIABLE = "nv"
+TAG = "nt"
+ATTRIBUTE = "na"
+
+NUMBER_RULE = (NUMBER, r"\b(?:0[xXoObB][0-9a-fA-F_]+|\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?)\b")
+DOUBLE_QUOTED = r'"(?:\\.|[^"\\\n])*"'
+SINGLE_QUOTED = r"'(?:\\.|[^'\\\n])*'"
+
+def words(*names):
+    return r"\b(?:" + "|".join(names) + r")\b"
+
+# Per language, (token class, pattern) rules tried in order at each position. Earlier rules win, so comments and strings come first
+RULES = {
+    "python": [
+        (COMMENT, r"#[^\n]*"),
+        (STRING, r"[rRbBuUfF]{0,2}(?:\"\"\"[\s\S]*?\"\"\"|'''[\s\S]*?''')"),
+        (STRING, r"[rRbBuUfF]{0,2}(?:" + DOUBLE_QUOTED + "|" + SINGLE_QUOTED + ")"),
+        (DECORATOR, r"@[\w.]+"),
+        (KEYWORD, words("False", "None", "True", "and", "as", "assert", "async", "await", "break", "class", "continue", "def", "del", "elif", "else", "except", "finally", "for", "from", "global", "if", "import", "in", "is", "lambda", "match", "case", "nonlocal", "not", "or", "pass", "raise", "return", "try", "while", "with", "yield")),
+        (BUILTIN, words("print", "len", "range", "open", "str", "int", "float", "bool", "list", "dict", "set", "tuple", "isinstance", "super", "self", "enumerate", "zip", "sorted", "min", "max", "sum")),
+        NUMBER_RULE,
+    ],
+    "javascript": [
+        (COMMENT, r"//[^\n]*|/\*[\s\S]*?\*/"),
+        (STRING, DOUBLE_QUOTED + "|" + SINGLE_QUOTED + r"|`(?:\\.|[^`\\])*`"),
+        (KEYWORD, words("async", "await", "break", "case", "catch", "class", "const", "continue", "default", "delete", "do", "else", "export", "extends", "false", "finally", "for", "from", "function", "if", "import", "in", "instanceof", "let", "new", "null", "of", "return", "static", "super", "switch", "this", "throw", "true", "try", "typeof", "undefined", "var", "void", "while", "yield", "interface", "type")),
+        (BUILTIN, words("console", "document", "window", "Array", "Object", "String", "Number", "Promise", "Map", "Set", "JSON", "Math")),
+        NUMBER_RULE,
+    ],
+    "bash": [
+        (COMMENT, r"(?<![\w$])#[^\n]*"),
+        (STRING, DOUBLE_QUOTED + "|'[^']*'"),
+        (VARIABLE, r"\$(?:\{[^}\n]*\}|\w+|[@#?$!*])"),
+        (KEYWORD, words("if", "then", "else", "elif", "fi", "for", "while", "until", "do", "done", "case", "esac", "in", "function", "return", "export", "local", "readonly")),
+        (BUILTIN, words("cd", "echo", "exit", "printf", "read", "set", "shift", "source", "test", "unset")),
+    ],
+    "json": [
+        (TAG, DOUBLE_QUOTED + r"(?=\s*:)"),
+        (STRING, DOUBLE_QUOTED),
+        (KEYWORD, words("true", "false", "null")),
+        (NUMBER, r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?"),
+    ],
+    "css": [
+        (COMMENT, r"/\*[\s\S]*?\*/"),
+        (STRING, DOUBLE_QUOTED + "|" + SINGLE_QUOTED),
+        (KEYWORD, r"@[\w-]+|!important"),
+        (ATTRIBUTE, r"[\w-]+(?=\s*:[^:{;]*[;}])"),
+        (NUMBER, r"#[0-9a-fA-F]{3,8}\b|-?\d*\.?\d+(?:%|[a-zA-Z]+)?"),
+    ],
+    "html": [
+        (COMMENT, r"<!--[\s\S]*?-->"),
+        (TAG, r"</?[\w-]+|/?>"),
+        (ATTRIBUTE, r"[\w:-]+(?==)"),
+        (STRING, DOUBLE_QUOTED + "|" + SINGLE_QUOTED),
+    ],
+}
+
+ALIASES = {"py": "python", "python3": "python", "js": "javascript", "jsx": "javascript", "ts": "javascript", "typescript": "javascript",
+           "sh": "bash", "shell": "bash", "zsh": "bash", "console": "bash", "xml": "html", "svg": "html"}
+
+_lexers = {} # language -> (compiled pattern, token class of each group), built the first time a language shows up
+
+def lexer(language): # One alternation per language, compiled once per process. None if we can't highlight the language
+    language = ALIASES.get(language, language)
+    if language not in _lexers:
+        rules = RULES.get(language)
+        if rules is None:
+            _lexers[language] = None
+        else:
+            pattern = re.compile("|".join(f"(?P<g{i}>{rule})" for i, (token, rule) in enumerate(rules)))
+            _lexers[language] = (pattern, {f"g{i}": token for i, (token, rule) in enumerate(rules)})
+    return _lexers[language]
+
+def tokenize(code, language): # Yields (token class or None, text) pieces that join back into code
+    compiled = lexer(language)
+    if compiled is None:
+        yield None, code
+        return
+    pattern, tokens = compiled
+    position = 0
+    for match in pattern.finditer(code):
+        if match.start() > position:
+            yield None, code[position:match.start()]
+        yield tokens[match.lastgroup], match.group()
+        position = match.end()
+    if position < len(code):
+        yield None, code[position:]
+
+CACHE_SIZE = 1024
+_cache = OrderedDict() # (language, code hash) -> highlighted HTML
+cache_stats = {"hits": 0, "misses": 0}
+
+def highlight(code, language): # Escaped HTML for code with <span class="..."> around every token. Repeated snippets come from a cache
+    key = (language, hashlib.blake2b(code.encode(), digest_size=16).digest())
+    html = _cache.get(key)
+    if html is not None:
+        _cache.move_to_end(key)
+        cache_stats["hits"] += 1
+        return html
+    cache_stats["misses"] += 1
+    html = "".join(escape(text, quote=False) if token is None else f'<span class="{token}">{escape(text, quote=False)}</span>' for token, text in tokenize(code, language))
+    _cache[key] = html
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return html
@@ -1,22 +1,40 @@
+import re
+import sys
+
 from textnode import TextType, TextNode
 
+# Set for minified builds: serializers then collapse whitespace in text and leave off quotes that aren't needed
+minify = False
+WHITESPACE_PATTERN = re.compile(r"\s+")
+UNQUOTED_VALUE_PATTERN = re.compile(r"[^\s\"'=<>`]+")
+
 class HTMLNode:
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
-        self.tag = tag
+        # Interned so every <p> on every page shares a single tag string
+        self.tag = sys.intern(tag) if isinstance(tag, str) else tag
         self.value = value
         self.children = children
         self.props = props
     
     def to_html(self):
+        parts = []
+        self.write_html(parts.append)
+        return "".join(parts)
+
+    def write_html(self, write): # Hands the HTML to write() in chunks. write can be list.append or a file's write method
         raise NotImplementedError
+
+    def iter_html(self): # Same chunks as write_html, as a generator
+        yield self.to_html()
     
     def props_to_html(self):
         if not self.props:
             return ""
-        props_string = ""
-        for prop in self.props:
-            props_string = f"{props_string} {prop}=\"{self.props[prop]}\""
-        return props_string
+        if minify:
+            return "".join([f" {prop}={value}" if UNQUOTED_VALUE_PATTERN.fullmatch(str(value)) else f" {prop}=\"{value}\"" for prop, value in self.props.items()])
+        return "".join([f" {prop}=\"{value}\"" for prop, value in self.props.items()])
     
     def __eq__(self, other):
         if self.tag == other.tag and self.value == other.value and self.children == other.children and self.props == other.props:
@@ -26,6 +44,8 @@ class HTMLNode:
         return f"HTMLNode({self.tag}, {self.value}, {self.children}, {self.props})"
     
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag=None, value=None, props=None):
         super().__init__(tag=tag, value=value, children=None, props=props)
     
@@ -33,19 +53,44 @@ class LeafNode(HTMLNode):
         if self.value == None:
             print(f"Problem node: {self.tag}, props: {self.props}")
             raise ValueError("node requires value")
+        if minify and self.tag != "code": # Code spans and blocks keep every byte
+            value = WHITESPACE_PATTERN.sub(" ", str(self.value))
+        else:
+            value = self.value
         if self.tag == None:
-            return str(self.value)
-        return f"<{self.tag}>{self.value}</{self.tag}>"
+            return str(value)
+        return f"<{self.tag}>{value}</{self.tag}>"
+
+    def write_html(self, write):
+        write(self.to_html())
+
+class RawNode(LeafNode):
+    __slots__ = ()
+
+    # HTML that's already been serialized, like a cached block, written out exactly as it is
+    def to_html(self):
+        return self.value
 
 class ImageNode(LeafNode):
-    def __init__(self, src, alt=""):
+    __slots__ = ("sources",) # Alternative formats, rendered as <source> tags in a <picture>
+
+    def __init__(self, src, alt="", attributes=None, sources=None):
         super().__init__("img", None)
         self.props = {"src": src, "alt": alt}
+        if attributes:
+            self.props.update(attributes)
+        self.sources = sources
     
     def to_html(self):
-        return f"<{self.tag}{self.props_to_html()} />"
+        image = f"<{self.tag}{self.props_to_html()}>" if minify else f"<{self.tag}{self.props_to_html()} />"
+        if not self.sources:
+            return image
+        sources = "".join([f"<source{HTMLNode(props=source).props_to_html()} />" for source in self.sources])
+        return f"<picture>{sources}{image}</picture>"
 
 class LinkNode(LeafNode):
+    __slots__ = ()
+
     def __init__(self, href, text=""):
         super().__init__("a", None)
         self.props = {"href": href, "text": text}
@@ -54,16 +99,28 @@ class LinkNode(LeafNode):
         return f"<{self.tag}{self.props_to_html()} />"
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag=None, children=None, props=None):
         super().__init__(tag=tag, value=None, children=children, props=props)
     
-    def to_html(self):
+    def write_html(self, write): # Children write straight into the same buffer, so wide nodes don't get copied over and over
+        if self.tag == None:
+            raise ValueError("node requires tag")
+        if self.children == None:
+            raise ValueError("node requires children")
+        write(f"<{self.tag}>")
+        for node in self.children:
+            node.write_html(write)
+        write(f"</{self.tag}>")
+
+    def iter_html(self): # Walks the children as the chunks are asked for, so nothing is rendered ahead
         if self.tag == None:
             raise ValueError("node requires tag")
         if self.children == None:
             raise ValueError("node requires children")
-        children_data = ""
+        yield f"<{self.tag}>"
         for node in self.children:
-            children_data = f"{children_data}{node.to_html()}"
-        return f"<{self.tag}>{children_data}</{self.tag}>"
+            yield from node.iter_html()
+        yield f"</{self.tag}>"
 
@@ -0,0 +1,165 @@
+# Image stage: reads image dimensions, makes resized and WebP derivatives when Pillow is installed, and caches them by source hash
+
+import json
+import os
+import struct
+
+try:
+    from PIL import Image
+except ImportError: # Without Pillow we still know the sizes, we just can't make derivatives
+    Image = None
+
+from assets import asset_url
+from file_manip import copy_file
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+IMAGE_MANIFEST = "image-manifest.json"
+DEFAULT_WIDTHS = (480, 960, 1440)
+# Matches the 800px column in static/index.css
+IMAGE_SIZES = "(max-width: 800px) 100vw, 800px"
+
+def image_size(path): # (width, height) read straight from the file header, or None for formats we don't know
+    image_file = open(path, "rb")
+    header = image_file.read(32)
+    try:
+        if header.startswith(b"\x89PNG\r\n\x1a\n"):
+            return struct.unpack(">II", header[16:24])
+        if header[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", header[6:10])
+        if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+            return webp_size(header)
+        if header.startswith(b"\xff\xd8"):
+            image_file.seek(2)
+            return jpeg_size(image_file)
+        return None
+    finally:
+        image_file.close()
+
+def webp_size(header):
+    chunk = header[12:16]
+    if chunk == b"VP8X":
+        return (int.from_bytes(header[24:27], "little") + 1, int.from_bytes(header[27:30], "little") + 1)
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", header[26:30])
+        return (width & 0x3fff, height & 0x3fff)
+    if chunk == b"VP8L":
+        bits = int.from_bytes(header[21:25], "little")
+        return ((bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1)
+    return None
+
+def jpeg_size(image_file): # Walks the JPEG segments until a start-of-frame marker, which holds the size
+    while True:
+        marker = image_file.read(2)
+        if len(marker) < 2 or marker[0] != 0xff:
+            return None
+        if marker[1] in (0xd8, 0x01) or 0xd0 <= marker[1] <= 0xd7: # Markers without a length
+            continue
+        length = struct.unpack(">H", image_file.read(2))[0]
+        if 0xc0 <= marker[1] <= 0xcf and marker[1] not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack(">xHH", image_file.read(5))
+            return (width, height)
+        image_file.seek(length - 2, os.SEEK_CUR)
+
+def derivative_path(dest, width, content_hash, extension): # public/images/a.png -> public/images/a-480w.4b341bb764.webp
+    root = os.path.splitext(dest)[0]
+    return f"{root}-{width}w.{content_hash[:10]}{extension}"
+
+def render_derivative(source, cached_path, width, height, extension): # Resizes and saves one derivative into the cache
+    image = Image.open(source)
+    if image.mode == "P" and image.info.get("transparency") is not None:
+        image = image.convert("RGBA") # A palette keeps its transparency in info, not in a band, so "A" below wouldn't see it
+    if extension == ".webp" or image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    if image.size != (width, height):
+        image = image.resize((width, height), Image.LANCZOS)
+    os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+    temp_path = f"{cached_path}.tmp{extension}"
+    if extension == ".webp":
+        image.save(temp_path, "WEBP", quality=80)
+    else:
+        image.save(temp_path, optimize=True)
+    os.replace(temp_path, cached_path)
+
+def make_derivatives(source, dest, content_hash, size, cache_dir, widths): # Returns (path in dest, width, extension) for every derivative, making missing ones
+    original_width, original_height = size
+    extension = os.path.splitext(dest)[1].lower()
+    wanted = [(width, extension) for width in widths if width < original_width]
+    if extension != ".webp":
+        wanted += [(width, ".webp") for width in widths if width < original_width] + [(original_width, ".webp")]
+    derivatives = []
+    for width, derivative_extension in wanted:
+        height = max(1, round(original_height * width / original_width))
+        cached_path = os.path.join(cache_dir, f"{content_hash}-{width}{derivative_extension}")
+        # The cache is keyed by source hash, so an image that hasn't changed is never processed again
+        if not os.path.exists(cached_path):
+            render_derivative(source, cached_path, width, height, derivative_extension)
+        path = derivative_path(dest, width, content_hash, derivative_extension)
+        if not os.path.exists(path):
+            copy_file(cached_path, path, hardlink=True)
+        derivatives.append((path, width, derivative_extension))
+    return derivatives
+
+def srcset(entries):
+    return ", ".join(f"{url} {width}w" for url, width in entries)
+
+def process_images(assets, manifest, dest_dir, cache_dir, asset_urls=None, widths=DEFAULT_WIDTHS): # Returns {image url: what ImageNode needs to render it}
+    image_info = {}
+    derivative_urls = []
+    cached_names = set()
+    for source, dest in assets:
+        if os.path.splitext(dest)[1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        size = image_size(source)
+        if size is None:
+            continue
+        url = asset_url(dest, dest_dir)
+        attributes = {"width": str(size[0]), "height": str(size[1]), "loading": "lazy", "decoding": "async"}
+        sources = []
+        if Image is not None:
+            content_hash = manifest.entry("assets", source)["hash"]
+            derivatives = make_derivatives(source, dest, content_hash, size, cache_dir, widths)
+            cached_names.update(f"{content_hash}-{width}{extension}" for path, width, extension in derivatives)
+            derivative_urls.extend(asset_url(path, dest_dir) for path, width, extension in derivatives)
+            original_url = asset_urls.get(url, url) if asset_urls else url
+            same_format = [(asset_url(path, dest_dir), width) for path, width, extension in derivatives if extension != ".webp"]
+            if same_format:
+                attributes["srcset"] = srcset(same_format + [(original_url, size[0])])
+                attributes["sizes"] = IMAGE_SIZES
+            webp = [(asset_url(path, dest_dir), width) for path, width, extension in derivatives if extension == ".webp"]
+            if webp:
+                sources.append({"type": "image/webp", "srcset": srcset(webp), "sizes": IMAGE_SIZES})
+        image_info[url] = {"attributes": attributes, "sources": sources}
+    remove_stale_derivatives(dest_dir, derivative_urls)
+    if Image is not None:
+        prune_cache(cache_dir, cached_names)
+    return image_info
+
+def prune_cache(cache_dir, cached_names): # Deletes cached derivatives of images that were removed or changed, since nothing will ask for their old hash again
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name not in cached_names:
+            os.remove(os.path.join(cache_dir, name))
+
+def remove_stale_derivatives(dest_dir, derivative_urls): # Deletes derivatives the last run made that this one didn't, and remembers the new list
+    manifest_path = os.path.join(dest_dir, IMAGE_MANIFEST)
+    previous = []
+    if os.path.exists(manifest_path):
+        manifest_file = open(manifest_path)
+        try:
+            previous = json.load(manifest_file)
+        except ValueError:
+            pass
+        manifest_file.close()
+    for url in set(previous) - set(derivative_urls):
+        path = os.path.join(dest_dir, *url.lstrip("/").split("/"))
+        if os.path.exists(path):
+            os.remove(path)
+    if not derivative_urls:
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        return
+    manifest_file = open(f"{manifest_path}.tmp", "w")
+    json.dump(sorted(derivative_urls), manifest_file, indent=2)
+    manifest_file.close()
+    os.replace(f"{manifest_path}.tmp", manifest_path)
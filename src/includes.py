@@ -0,0 +1,79 @@
+# Shared fragments: {% include "path" %} on a line of its own pulls another file into a page, and we remember who included what
+
+import os
+import re
+from collections import Counter
+
+import conversions
+
+# A whole block that is just an include. Paths are relative to the file doing the including
+INCLUDE_PATTERN = re.compile(r"\{%\s*include\s+\"([^\"]+)\"\s*%\}")
+
+_fragments = {} # path -> (mtime, HTML, every fragment it includes in turn, its words, its links), so each fragment renders once per build and process
+# (file, fragments it pulled in, words, links) for the page being rendered and every fragment we're inside of, innermost last.
+# A fragment's words and links count towards whoever included it, so the page's search terms and links cover them too
+_frames = []
+
+def clear(): # Forgets rendered fragments, since what they render to depends on the build's settings
+    _fragments.clear()
+
+def begin_page(path, terms=None, links=None): # Starts recording the fragments a page pulls in, adding their words to terms and their links to links when given them
+    _frames.clear()
+    _frames.append((path, set(), terms, links))
+
+def end_page(): # The fragments the page included, directly or through other fragments
+    if not _frames:
+        return set()
+    included = _frames.pop(0)[1]
+    _frames.clear()
+    return included
+
+def is_include(block):
+    return block.startswith("{%") and INCLUDE_PATTERN.fullmatch(block.strip()) is not None
+
+def include_path(name):
+    base_dir = os.path.dirname(_frames[-1][0]) if _frames else ""
+    return os.path.normpath(os.path.join(base_dir, name))
+
+def render_fragment(path): # HTML for a fragment: markdown is rendered, anything else (like .html) goes in as it is
+    if any(frame[0] == path for frame in _frames):
+        raise ValueError(f"{path} includes itself")
+    mtime = os.stat(path).st_mtime_ns
+    cached = _fragments.get(path)
+    if cached is None or cached[0] != mtime:
+        _frames.append((path, set(), Counter(), []))
+        try:
+            fragment_file = open(path)
+            try:
+                if path.endswith(".md"):
+                    # Here rather than up top: both modules import conversions, which imports us
+                    from search import collect_terms
+                    from siteindex import collect_links
+                    parts = []
+                    blocks = collect_links(collect_terms(conversions.iter_markdown_blocks(fragment_file), _frames[-1][2]), _frames[-1][3])
+                    for block in blocks:
+                        conversions.cached_block_to_html_node(block).write_html(parts.append)
+                    html = "".join(parts)
+                else:
+                    html = fragment_file.read()
+            finally:
+                fragment_file.close()
+        finally:
+            frame = _frames.pop()
+        cached = (mtime, html, frame[1], frame[2], frame[3])
+        _fragments[path] = cached
+    if _frames:
+        parent = _frames[-1]
+        parent[1].add(path)
+        parent[1].update(cached[2])
+        if parent[2] is not None:
+            parent[2].update(cached[3])
+        if parent[3] is not None:
+            parent[3].extend(cached[4])
+    return cached[1]
+
+def include_block(block): # The HTML an include block stands for, or None if the block isn't an include
+    match = INCLUDE_PATTERN.fullmatch(block.strip())
+    if match is None:
+        return None
+    return render_fragment(include_path(match.group(1)))
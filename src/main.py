@@ -1,16 +1,95 @@
 # Static Site Generator: My third guided project from boot.dev
 
+# Only what every run needs is imported up here. The build's modules load in run(), or once for good in the daemon
+import argparse
+import logging
 import os
-import shutil
+import sys
 
-from file_manip import copy_directory, generate_page
+LOG_LEVELS = [logging.WARNING, logging.INFO, logging.DEBUG]
+REPORTING_COMMANDS = ("watch", "rollback", "merge") # What they say is the point of running them, so they start one level chattier
 
-def main():
-    if os.path.exists("public"):
-        shutil.rmtree("public")
-    os.mkdir("public")
+log = logging.getLogger(__name__)
 
-    copy_directory("static", "public")
-    generate_page("content/index.md", "template.html", "public/index.html")
+def log_level(args):
+    return LOG_LEVELS[min(args.verbose + (args.command in REPORTING_COMMANDS), 2)]
 
-main()
\ No newline at end of file
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Builds the site in content/ into public/")
+    parser.add_argument("command", nargs="?", default="build", choices=["build", "watch", "rollback", "daemon", "merge"], help="build once; build, serve public/ and rebuild on changes; point public/ back at the previous published build; keep a build process running for --daemon clients; or combine the --shard builds in public.shards/ into public/")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of page rendering processes (defaults to the CPU count)")
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB", help="low-memory mode: keep the build and its workers under this much RSS, pacing workers; logs the heaviest page, and every page's peak RSS with -vv")
+    parser.add_argument("--shard", metavar="I/N", help="build only the I-th of N slices of the pages, into public.shards/I, for 'main.py merge' to combine")
+    parser.add_argument("--io-threads", type=int, default=0, metavar="N", help="read sources ahead and write pages behind on N threads per worker, for slow or network disks")
+    parser.add_argument("--clean", action="store_true", help="wipe public/ and the build cache and rebuild everything")
+    parser.add_argument("--keep-builds", type=int, default=0, metavar="N", help="build into a staging copy and publish it by flipping the public symlink, keeping the last N builds for rollback. Costs a hardlink per output file on every build")
+    parser.add_argument("--hardlink-assets", action="store_true", help="hardlink static files into public/ instead of copying them")
+    parser.add_argument("--block-cache", type=int, default=0, metavar="ENTRIES", help="cache the HTML of up to this many repeated blocks per worker")
+    parser.add_argument("--persist-block-cache", action="store_true", help="keep the block cache in .cache/blocks.sqlite between builds")
+    parser.add_argument("--fingerprint", action="store_true", help="also publish static files under content-hashed names and point pages at them")
+    parser.add_argument("--images", action="store_true", help="give images sizes and lazy loading, plus resized and WebP versions when Pillow is installed")
+    parser.add_argument("--search", action="store_true", help="write a client-side search index to public/search/")
+    parser.add_argument("--site-index", action="store_true", help="write links.json and report broken links; with --site-url, also sitemap.xml and feed.xml")
+    parser.add_argument("--site-url", metavar="URL", help="the site's public address, e.g. https://example.com, used by the sitemap and feed")
+    parser.add_argument("--minify", action="store_true", help="minify pages and stylesheets, leaving <pre> and <code> content alone")
+    parser.add_argument("--precompress", action="store_true", help="write .gz (and .br, if brotli is installed) next to every text file in public/")
+    parser.add_argument("--profile", nargs="?", const=".cache/profile.json", default=None, metavar="PATH", help="time every build stage and page and write a JSON report (to .cache/profile.json by default)")
+    parser.add_argument("--stats", action="store_true", help="print time per stage and the slowest pages after the build")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="say what the build is doing, twice for every file")
+    parser.add_argument("--daemon", action="store_true", help="hand the build to a running 'main.py daemon' if there is one, and build here if not")
+    parser.add_argument("--socket", default=".cache/daemon.sock", help="the daemon's Unix socket")
+    parser.add_argument("--port", type=int, default=8888, help="port for the watch mode server")
+    args = parser.parse_args(argv)
+    if args.shard:
+        from shard import parse_shard
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as error:
+            parser.error(str(error))
+        if args.keep_builds:
+            parser.error("--keep-builds publishes a whole site, so it goes on 'main.py merge' rather than on a shard")
+    return args
+
+def run(args): # Does what the command line asked for. The daemon calls this once per request
+    if args.command == "rollback":
+        from publish import rollback
+        log.info(f"public/ now serves build {rollback('public')}")
+        return
+    if args.command == "merge":
+        from shard import merge_shards
+        merge_shards("public", site_url=args.site_url, keep_builds=args.keep_builds)
+        return
+    from build import build
+    paths = {}
+    if args.shard:
+        from shard import shard_dir
+        # Each shard keeps its own output and cache, so several can build side by side in one checkout
+        paths = {"dest_dir": shard_dir("public", args.shard[0]), "cache_dir": os.path.join(".cache", "shards", str(args.shard[0])), "shard": args.shard}
+    build(workers=args.workers, clean=args.clean, hardlink=args.hardlink_assets, block_cache_size=args.block_cache, persist_block_cache=args.persist_block_cache, profile_path=args.profile, show_stats=args.stats, fingerprint=args.fingerprint, precompress_output=args.precompress, process_images=args.images, minify=args.minify, search=args.search, site_index=args.site_index or bool(args.site_url), site_url=args.site_url, io_threads=args.io_threads, keep_builds=args.keep_builds, memory_budget=args.memory_budget << 20 if args.memory_budget else None, **paths)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = parse_args(argv)
+    logging.basicConfig(level=log_level(args), format="%(message)s")
+    if args.command == "watch":
+        from watch import SiteWatcher
+        SiteWatcher(workers=args.workers).run(port=args.port)
+        return
+    if args.command == "daemon":
+        import signal
+        from daemon import serve
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0)) # So a plain kill still removes the socket
+        serve(args.socket)
+        return
+    if args.daemon:
+        from daemon import send_request
+        status = send_request(argv, args.socket)
+        if status is not None:
+            sys.exit(status)
+        log.info("No build daemon running, building here")
+    run(args)
+
+# The guard matters now: worker processes may re-import this module and must not start their own build
+if __name__ == "__main__":
+    main()
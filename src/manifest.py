@@ -0,0 +1,132 @@
+# Remembers what the last build read and wrote, so unchanged pages and assets can be skipped
+
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 1
+
+def hash_file(path): # Content hash of a file, read in chunks so big images don't end up in memory
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class BuildManifest:
+    def __init__(self, path):
+        self.path = path
+        self.clear()
+        self.load()
+
+    def clear(self):
+        self.template = None
+        self.sections = {"pages": {}, "assets": {}, "fragments": {}}
+        self.fresh = {"pages": {}, "assets": {}, "fragments": {}}
+        self.fresh_template = None
+        self.settings = {}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            manifest_file = open(self.path)
+            data = json.load(manifest_file)
+            manifest_file.close()
+        except (OSError, ValueError):
+            return # A broken manifest just means a full rebuild
+        if data.get("version") != MANIFEST_VERSION:
+            return
+        self.template = data.get("template")
+        self.settings = data.get("settings", {})
+        for section in self.sections:
+            self.sections[section] = data.get(section, {})
+
+    def save(self): # Writes the manifest atomically so an interrupted build can't leave half a file behind
+        # What this build found out becomes what the next one compares against, also when the manifest stays in memory (watch mode)
+        if self.fresh_template:
+            self.template = self.fresh_template
+        data = {"version": MANIFEST_VERSION, "template": self.template, "settings": self.settings}
+        for section in self.sections:
+            self.sections[section].update(self.fresh[section])
+            self.fresh[section] = {}
+            data[section] = self.sections[section]
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        manifest_file = open(temp_path, "w")
+        json.dump(data, manifest_file, separators=(",", ":"))
+        manifest_file.close()
+        os.replace(temp_path, self.path)
+
+    def template_changed(self, template_paths, extra=""): # Takes the template, every layout it extends, and anything else every page depends on
+        self.fresh_template = "".join(hash_file(path) for path in template_paths)
+        if extra:
+            self.fresh_template += hashlib.blake2b(extra.encode(), digest_size=16).hexdigest()
+        return self.fresh_template != self.template
+
+    def setting_changed(self, name, value): # Records a build option and says whether it differs from the last build's
+        changed = self.settings.get(name) != value
+        self.settings[name] = value
+        return changed
+
+    def changed(self, section, pairs, force=False): # Returns the (source, destination) pairs whose source differs from the last build
+        entries = self.sections[section]
+        changed = []
+        for source, dest in pairs:
+            stat = os.stat(source)
+            entry = entries.get(source)
+            up_to_date = entry is not None and entry["dest"] == dest and os.path.exists(dest)
+            # Size and mtime match means we trust the old hash, which keeps no-op builds from reading every file
+            if up_to_date and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                if force:
+                    changed.append((source, dest))
+                continue
+            content_hash = hash_file(source)
+            self.fresh[section][source] = {"hash": content_hash, "size": stat.st_size, "mtime": stat.st_mtime_ns, "dest": dest}
+            if entry is not None and "includes" in entry: # Still right for a page we end up not rebuilding, and replaced when we do
+                self.fresh[section][source]["includes"] = entry["includes"]
+            if force or not up_to_date or entry["hash"] != content_hash:
+                changed.append((source, dest))
+        return changed
+
+    def set_includes(self, source, paths): # Records the fragments a page pulled in, and their hashes for next time
+        self.entry("pages", source)["includes"] = sorted(paths)
+        # A fragment shared by many pages only needs hashing for the first of them
+        self.changed("fragments", [(path, path) for path in paths if path not in self.fresh["fragments"]])
+
+    def prune_fragments(self): # Forgets fragments no page includes any more
+        used = set()
+        for section in (self.sections["pages"], self.fresh["pages"]):
+            for entry in section.values():
+                used.update(entry.get("includes", []))
+        for section in (self.sections["fragments"], self.fresh["fragments"]):
+            for path in [path for path in section if path not in used]:
+                del section[path]
+
+    def changed_includes(self, pages): # The pages that include a fragment that changed or went away since the last build
+        entries = self.sections["pages"]
+        paths = set()
+        for source, dest in pages:
+            paths.update(entries.get(source, {}).get("includes", []))
+        existing = [path for path in paths if os.path.exists(path)]
+        stale = set(paths) - set(existing)
+        stale.update(path for path, dest in self.changed("fragments", [(path, path) for path in existing]))
+        # Every page keeps its whole include tree, so a fragment included through another one still finds its pages
+        return [(source, dest) for source, dest in pages if stale.intersection(entries.get(source, {}).get("includes", []))]
+
+    def entry(self, section, source): # What we know about a source, preferring what this build found out
+        return self.fresh[section].get(source) or self.sections[section].get(source)
+
+    def forget(self, section, source): # Drops one source and returns the output it had, if any
+        self.fresh[section].pop(source, None)
+        entry = self.sections[section].pop(source, None)
+        return entry["dest"] if entry else None
+
+    def removed(self, section, pairs): # Forgets sources that disappeared and returns the outputs they left behind
+        current = set(source for source, dest in pairs)
+        entries = self.sections[section]
+        gone = [source for source in entries if source not in current]
+        outputs = []
+        for source in gone:
+            outputs.append(entries.pop(source)["dest"])
+        return outputs
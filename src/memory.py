@@ -0,0 +1,83 @@
+# Low-memory builds: measuring resident memory, handing it back to the OS, and pacing workers to stay under a budget
+
+import gc
+import os
+import sys
+
+try:
+    import resource
+except ImportError: # Not on Windows
+    resource = None
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_malloc_trim = None
+try:
+    import ctypes
+    _malloc_trim = ctypes.CDLL("libc.so.6").malloc_trim
+except (ImportError, OSError, AttributeError): # Not glibc
+    pass
+
+def rss(): # Resident memory of this process in bytes, or None where we can't tell
+    try:
+        statm_file = open("/proc/self/statm")
+        fields = statm_file.read().split()
+        statm_file.close()
+        return int(fields[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+def reset_peak(): # Starts a new peak from here on Linux, so peak_rss() measures one page instead of the whole process
+    try:
+        refs_file = open("/proc/self/clear_refs", "w")
+        refs_file.write("5")
+        refs_file.close()
+        return True
+    except OSError:
+        return False
+
+def peak_rss(): # Highest resident memory since reset_peak(), or since the process started where resetting isn't possible
+    try:
+        status_file = open("/proc/self/status")
+        lines = status_file.readlines()
+        status_file.close()
+        for line in lines:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024 # Bytes on macOS, kilobytes elsewhere
+    return None
+
+def release(): # Frees unreachable objects and asks malloc to give free pages back, so RSS actually drops
+    gc.collect()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+class Throttle:
+    def __init__(self, budget, workers): # budget in bytes for this process and all its workers together
+        self.budget = budget
+        self.workers = workers
+        self.limit = workers # Pages allowed in flight at once
+        self.usage = {} # worker pid -> its last reported RSS
+        self.peak = 0
+
+    def total(self):
+        return (rss() or 0) + sum(self.usage.values())
+
+    def update(self, pid, worker_rss): # Takes a worker's latest RSS and adjusts how many pages may run at once
+        if worker_rss is not None:
+            self.usage[pid] = worker_rss
+        total = self.total()
+        self.peak = max(self.peak, total)
+        if total > self.budget * 0.9:
+            self.limit = max(1, self.limit - 1)
+        elif total < self.budget * 0.7 and self.limit < self.workers:
+            self.limit += 1
+        return self.limit
+
+def workers_for_budget(budget, workers): # How many worker processes fit, guessing each costs about what this process does now
+    per_worker = max(rss() or 0, 32 << 20)
+    return max(1, min(workers, budget // per_worker - 1))
@@ -0,0 +1,62 @@
+# Minification for the parts of a page that don't go through the node serializers: template text and CSS
+
+import os
+import re
+
+# Whitespace-sensitive elements whose contents are copied as-is
+PRESERVED_PATTERN = re.compile(r"(<(pre|textarea|script|style)\b.*?</\2\s*>)", re.DOTALL | re.IGNORECASE)
+# Comments, except IE conditional ones which some templates still rely on
+COMMENT_PATTERN = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+INDENT_BETWEEN_TAGS_PATTERN = re.compile(r">\s*\n\s*<")
+# The same indentation where a chunk meets a preserved element
+INDENT_BEFORE_PRESERVED_PATTERN = re.compile(r">\s*\n\s*$")
+INDENT_AFTER_PRESERVED_PATTERN = re.compile(r"^\s*\n\s*<")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# An attribute whose quoted value would survive without the quotes
+QUOTED_ATTRIBUTE_PATTERN = re.compile(r"(\s[\w:-]+)=\"([^\s\"'=<>`]+)\"(?=[\s>])")
+
+def minify_html_text(text): # Drops comments and indentation between tags, and collapses other whitespace to one space
+    parts = PRESERVED_PATTERN.split(text)
+    minified = []
+    # split() hands back the text between preserved elements, then each element and its tag name
+    for i in range(0, len(parts), 3):
+        chunk = COMMENT_PATTERN.sub("", parts[i])
+        chunk = INDENT_BETWEEN_TAGS_PATTERN.sub("><", chunk)
+        if i > 0:
+            chunk = INDENT_AFTER_PRESERVED_PATTERN.sub("<", chunk)
+        if i + 1 < len(parts):
+            chunk = INDENT_BEFORE_PRESERVED_PATTERN.sub(">", chunk)
+        chunk = WHITESPACE_PATTERN.sub(" ", chunk)
+        minified.append(QUOTED_ATTRIBUTE_PATTERN.sub(r"\1=\2", chunk))
+        if i + 1 < len(parts):
+            minified.append(parts[i + 1])
+    return "".join(minified)
+
+CSS_TOKEN_PATTERN = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|/\*.*?\*/", re.DOTALL)
+CSS_PUNCTUATION_PATTERN = re.compile(r"\s*([{};,>])\s*")
+CSS_PLACEHOLDER_PATTERN = re.compile(r"\x00(\d+)\x00")
+
+def minify_css(css):
+    strings = []
+    def hide_string(match): # Strings stay exactly as written while everything around them is squeezed, comments just go
+        if match.group(1) is None:
+            return " "
+        strings.append(match.group(1))
+        return f"\x00{len(strings) - 1}\x00"
+    code = CSS_TOKEN_PATTERN.sub(hide_string, css)
+    code = WHITESPACE_PATTERN.sub(" ", code)
+    code = CSS_PUNCTUATION_PATTERN.sub(r"\1", code)
+    # Only after a colon: "a :hover" and "a:hover" are different selectors
+    code = re.sub(r":\s+", ":", code)
+    code = code.replace(";}", "}").strip()
+    return CSS_PLACEHOLDER_PATTERN.sub(lambda match: strings[int(match.group(1))], code)
+
+def minify_css_file(path): # Rewrites a stylesheet in place through a rename, so a hardlinked copy in static/ is never touched
+    css_file = open(path)
+    css = css_file.read()
+    css_file.close()
+    temp_path = f"{path}.tmp"
+    css_file = open(temp_path, "w")
+    css_file.write(minify_css(css))
+    css_file.close()
+    os.replace(temp_path, path)
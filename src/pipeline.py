@@ -0,0 +1,88 @@
+# A read -> process -> write pipeline: reader and writer threads wait on the disk while the calling thread does the CPU work
+
+import queue
+import threading
+
+DONE = object() # Tells a thread there's nothing more coming
+
+def run_pipeline(items, read, process, write, readers=2, writers=2, depth=8): # Returns process's results. read(item) and write(item, output) run on threads, process(item, data) -> (result, output) runs here
+    items = list(items)
+    # Bounded queues are the backpressure: readers stall once depth items wait to be processed, and so does processing once depth outputs wait to be written
+    todo = queue.Queue()
+    read_queue = queue.Queue(maxsize=depth)
+    write_queue = queue.Queue(maxsize=depth)
+    errors = []
+    stop = threading.Event()
+
+    for item in items:
+        todo.put(item)
+    for _ in range(readers):
+        todo.put(DONE)
+
+    def put(target, value): # Queue.put that gives up once something has failed, so no thread waits forever on a full queue
+        while not stop.is_set():
+            try:
+                target.put(value, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def reader():
+        while not stop.is_set():
+            item = todo.get()
+            if item is DONE:
+                break
+            try:
+                put(read_queue, (item, read(item), None))
+            except Exception as error:
+                put(read_queue, (item, None, error))
+
+    def writer():
+        while True:
+            entry = write_queue.get()
+            if entry is DONE:
+                break
+            item, output = entry
+            if stop.is_set():
+                continue # Keep draining so nobody blocks on a full queue, but stop writing once something failed
+            try:
+                write(item, output)
+            except Exception as error:
+                errors.append(error)
+                stop.set()
+
+    reader_threads = [threading.Thread(target=reader, daemon=True) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, daemon=True) for _ in range(writers)]
+    for thread in reader_threads + writer_threads:
+        thread.start()
+
+    results = []
+    try:
+        for _ in range(len(items)):
+            entry = None
+            while entry is None and not stop.is_set():
+                try:
+                    entry = read_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            if entry is None:
+                break # A writer failed, and its error is raised below
+            item, data, error = entry
+            if error is not None:
+                raise error
+            result, output = process(item, data)
+            results.append(result)
+            if output is not None:
+                put(write_queue, (item, output))
+    except Exception:
+        stop.set()
+        raise
+    finally:
+        for _ in writer_threads:
+            write_queue.put(DONE)
+        for thread in writer_threads:
+            thread.join()
+        stop.set()
+    if errors:
+        raise errors[0]
+    return results
@@ -0,0 +1,130 @@
+# Optional build instrumentation: wall time, call counts and bytes for each pipeline stage and each page
+
+import contextlib
+import json
+import os
+import time
+
+class Profiler:
+    def __init__(self):
+        self.stages = {} # stage name -> {"seconds", "calls", "bytes"}
+
+    def add(self, stage, seconds, calls=1, size=0):
+        totals = self.stages.get(stage)
+        if totals is None:
+            totals = self.stages[stage] = {"seconds": 0.0, "calls": 0, "bytes": 0}
+        totals["seconds"] += seconds
+        totals["calls"] += calls
+        totals["bytes"] += size
+
+    @contextlib.contextmanager
+    def stage(self, name, size=0):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started, 1, size)
+
+    def merge(self, stages):
+        for name, totals in stages.items():
+            self.add(name, totals["seconds"], totals["calls"], totals["bytes"])
+
+    def take(self): # Hands over what's been recorded so far and starts again from nothing
+        stages = self.stages
+        self.stages = {}
+        return stages
+
+# The per-page profiler for whichever process is rendering. None unless a profiled build is running
+profiler = None
+
+class TimedReader: # Wraps a source file to count the time and bytes spent reading it, however the parser pulls lines
+    def __init__(self, file):
+        self.file = file
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            line = next(self.file)
+        finally:
+            self.seconds += time.perf_counter() - started
+        self.bytes += len(line)
+        return line
+
+    def seek(self, offset):
+        return self.file.seek(offset)
+
+def timed_blocks(blocks, source): # Passes blocks through, timing how long the next one takes to arrive under "split", minus reading that source counted itself
+    iterator = iter(blocks)
+    while True:
+        started = time.perf_counter()
+        read = getattr(source, "seconds", 0.0)
+        block = next(iterator, None)
+        if profiler is not None:
+            profiler.add("split", time.perf_counter() - started - (getattr(source, "seconds", 0.0) - read), 1 if block is None else 0) # One call per page
+        if block is None:
+            return
+        yield block
+
+class TimedWriter: # Wraps write() the same way, for the output
+    def __init__(self, write):
+        self.write = write
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def __call__(self, text):
+        started = time.perf_counter()
+        self.write(text)
+        self.seconds += time.perf_counter() - started
+        self.bytes += len(text)
+
+def stage(build_profiler, name, size=0): # build_profiler.stage(), or a context that does nothing when we aren't profiling
+    if build_profiler is None:
+        return contextlib.nullcontext()
+    return build_profiler.stage(name, size)
+
+def build_report(build_profiler, results, wall_seconds): # Everything we measured, in a shape that can go straight to JSON
+    page_stages = Profiler()
+    pages = []
+    for result in results:
+        if "stages" not in result:
+            continue
+        page_stages.merge(result["stages"])
+        page = {"source": result["source"], "dest": result["dest"], "seconds": result["seconds"], "bytes": result["bytes"], "stages": result["stages"]}
+        if "peak_rss" in result:
+            page["peak_rss"] = result["peak_rss"]
+        pages.append(page)
+    pages.sort(key=lambda page: page["seconds"], reverse=True)
+    return {
+        "wall_seconds": wall_seconds,
+        "build_stages": build_profiler.stages,
+        "page_stages": page_stages.stages,
+        "pages": pages,
+    }
+
+def write_report(report, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    report_file = open(path, "w")
+    json.dump(report, report_file, indent=2)
+    report_file.close()
+
+def format_report(report, top=10): # A readable summary: time per stage, then the slowest pages
+    lines = [f"Build took {report['wall_seconds'] * 1000:.1f}ms", "", f"{'stage':<24} {'ms':>10} {'calls':>8} {'KB':>10}"]
+    for group in ("build_stages", "page_stages"):
+        for name, totals in report[group].items():
+            label = name if group == "build_stages" else f"page: {name}"
+            lines.append(f"{label:<24} {totals['seconds'] * 1000:>10.1f} {totals['calls']:>8} {totals['bytes'] / 1024:>10.1f}")
+    if report["pages"]:
+        lines += ["", f"Slowest {min(top, len(report['pages']))} pages:", f"{'ms':>10} {'KB':>8}  source"]
+        for page in report["pages"][:top]:
+            lines.append(f"{page['seconds'] * 1000:>10.1f} {page['bytes'] / 1024:>8.1f}  {page['source']}")
+        heavy = sorted([page for page in report["pages"] if page.get("peak_rss")], key=lambda page: page["peak_rss"], reverse=True)
+        if heavy:
+            lines += ["", f"Most memory, {min(top, len(heavy))} pages:", f"{'peak MB':>10}  source"]
+            for page in heavy[:top]:
+                lines.append(f"{page['peak_rss'] / (1 << 20):>10.1f}  {page['source']}")
+    return "\n".join(lines)
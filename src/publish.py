@@ -0,0 +1,89 @@
+# Atomic publishing: build into a staging copy of the live site, then flip a symlink so readers only ever see whole builds
+
+import logging
+import os
+import shutil
+import time
+
+log = logging.getLogger(__name__)
+
+# public -> public.builds/<build id>, with public.staging/ as the one being built
+def builds_dir(dest_dir):
+    return os.path.normpath(dest_dir) + ".builds"
+
+def staging_dir(dest_dir):
+    return os.path.normpath(dest_dir) + ".staging"
+
+def list_builds(dest_dir): # Build ids, oldest first
+    if not os.path.isdir(builds_dir(dest_dir)):
+        return []
+    return sorted(os.listdir(builds_dir(dest_dir)))
+
+def live_build(dest_dir): # The build id dest_dir points at, or None if it isn't one of ours
+    if not os.path.islink(dest_dir):
+        return None
+    target = os.path.realpath(dest_dir)
+    if os.path.dirname(target) != os.path.realpath(builds_dir(dest_dir)):
+        return None
+    return os.path.basename(target)
+
+# Mirrors a directory with hardlinks: no file contents are copied, but it's a link per file on every build, changed or not
+# (about 0.2s per 10,000 files on a local disk). Linking only what the manifest calls unchanged wouldn't save much: the search shards,
+# site files, compressed siblings and image derivatives aren't in the manifest, and the stages only rewrite the ones that changed
+def link_tree(source, dest):
+    for root, dirs, files in os.walk(source):
+        target_root = os.path.join(dest, os.path.relpath(root, source))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            os.link(os.path.join(root, name), os.path.join(target_root, name))
+
+def prepare_staging(dest_dir, clean=False): # Starts the next build from hardlinks of the live one. Every build step replaces files instead of writing into them, so the live copies are never touched
+    staging = staging_dir(dest_dir)
+    if os.path.exists(staging):
+        shutil.rmtree(staging) # Left over from a build that failed
+    if os.path.isdir(dest_dir) and not clean:
+        link_tree(os.path.realpath(dest_dir), staging)
+    else:
+        os.makedirs(staging)
+    return staging
+
+def new_build_id(dest_dir): # A sequence number keeps ids in build order even within one second, then the time for people to read
+    builds = list_builds(dest_dir)
+    number = int(builds[-1].split("-")[0]) + 1 if builds else 1
+    return f"{number:06d}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+def point_at(dest_dir, build_id): # Swaps the symlink in one rename, so there's never a moment without a site
+    temp_link = os.path.normpath(dest_dir) + ".link"
+    if os.path.lexists(temp_link):
+        os.remove(temp_link)
+    os.symlink(os.path.join(os.path.basename(builds_dir(dest_dir)), build_id), temp_link)
+    os.replace(temp_link, dest_dir)
+
+def publish(dest_dir, keep=3): # Moves the staging directory into place as the live site and keeps the last keep builds. Returns the new build id
+    os.makedirs(builds_dir(dest_dir), exist_ok=True)
+    if os.path.isdir(dest_dir) and not os.path.islink(dest_dir):
+        # A plain directory from before publishing was turned on. It can't be swapped for a symlink atomically,
+        # so it becomes the first build and the link replaces it right away
+        os.rename(dest_dir, os.path.join(builds_dir(dest_dir), new_build_id(dest_dir)))
+    build_id = new_build_id(dest_dir)
+    os.rename(staging_dir(dest_dir), os.path.join(builds_dir(dest_dir), build_id))
+    point_at(dest_dir, build_id)
+    log.info(f"Published build {build_id}")
+    prune_builds(dest_dir, keep)
+    return build_id
+
+def prune_builds(dest_dir, keep): # Deletes the oldest builds beyond keep, never the live one
+    live = live_build(dest_dir)
+    old = [build_id for build_id in list_builds(dest_dir) if build_id != live]
+    for build_id in old[:max(0, len(old) - max(0, keep - 1))]:
+        shutil.rmtree(os.path.join(builds_dir(dest_dir), build_id))
+        log.debug(f"Removed old build {build_id}")
+
+def rollback(dest_dir): # Points dest_dir back at the build before the live one. Returns its id
+    builds = list_builds(dest_dir)
+    live = live_build(dest_dir)
+    if live not in builds or builds.index(live) == 0:
+        raise ValueError(f"no earlier build of {dest_dir} to roll back to")
+    previous = builds[builds.index(live) - 1]
+    point_at(dest_dir, previous)
+    return previous
@@ -0,0 +1,199 @@
+# Client-side search: an inverted index collected while pages render, written as small prefix-compressed shards
+
+import json
+import os
+import re
+import shutil
+
+import includes
+
+SEARCH_DIR = "search"
+
+# Link and image targets aren't words anyone searches for
+LINK_TARGET_PATTERN = re.compile(r"\]\([^)]*\)")
+TERM_PATTERN = re.compile(r"[^\W_]{2,}")
+
+# Loads docs.json and the shard for each query word, and ranks pages by how often the words appear in them
+SEARCH_SCRIPT = """async function search(query, root = "/search/") {
+  const load = async (name) => { const response = await fetch(root + name); return response.ok ? response.json() : {terms: []}; };
+  const docs = await load("docs.json");
+  const words = query.toLowerCase().match(/[\\p{L}\\p{N}]{2,}/gu) || [];
+  let scores = null;
+  for (const word of words) {
+    const shard = await load(`terms-${/[a-z0-9]/.test(word[0]) ? word[0] : "_"}.json`);
+    const found = new Map();
+    let term = "";
+    for (const [shared, suffix, postings] of shard.terms) {
+      term = term.slice(0, shared) + suffix;
+      if (!term.startsWith(word)) continue;
+      for (let i = 0, id = 0; i < postings.length; i += 2) {
+        id += postings[i];
+        found.set(id, (found.get(id) || 0) + postings[i + 1]);
+      }
+    }
+    if (scores === null) scores = found;
+    else for (const id of scores.keys()) found.has(id) ? scores.set(id, scores.get(id) + found.get(id)) : scores.delete(id);
+  }
+  return [...(scores || [])].sort((a, b) => b[1] - a[1]).map(([id]) => ({url: docs[id][0], title: docs[id][1]}));
+}
+"""
+
+def block_terms(block): # Lowercased words in one markdown block
+    return TERM_PATTERN.findall(LINK_TARGET_PATTERN.sub("]", block).lower())
+
+def collect_terms(blocks, terms): # Passes blocks through unchanged, counting their words into terms on the way
+    for block in blocks:
+        # An include's words are the fragment's, which includes counts when it renders it. The directive itself isn't content
+        if not includes.is_include(block):
+            terms.update(block_terms(block))
+        yield block
+
+def shard_key(term):
+    return term[0] if "a" <= term[0] <= "z" or "0" <= term[0] <= "9" else "_"
+
+def page_url(dest_path, dest_dir): # public/blog/tom/index.html -> /blog/tom/
+    url = "/" + os.path.relpath(dest_path, dest_dir).replace(os.sep, "/")
+    return url[:-len("index.html")] if url.endswith("/index.html") else url
+
+def compress_terms(postings): # Sorted terms stored as (characters shared with the previous term, the rest, postings)
+    entries = []
+    previous = ""
+    for term in sorted(postings):
+        shared = 0
+        while shared < min(len(term), len(previous)) and term[shared] == previous[shared]:
+            shared += 1
+        # Postings are flat (doc id gap, count) pairs, so long lists of small numbers stay short
+        flat = []
+        last_id = 0
+        for doc_id, count in sorted(postings[term].items()):
+            flat.extend((doc_id - last_id, count))
+            last_id = doc_id
+        entries.append([shared, term[shared:], flat])
+        previous = term
+    return entries
+
+def expand_terms(entries): # The other way round, mostly for tests: {term: {doc id: count}}
+    postings = {}
+    term = ""
+    for shared, suffix, flat in entries:
+        term = term[:shared] + suffix
+        doc_id = 0
+        postings[term] = {}
+        for i in range(0, len(flat), 2):
+            doc_id += flat[i]
+            postings[term][doc_id] = flat[i + 1]
+    return postings
+
+class SearchIndex:
+    def __init__(self, path, dest_dir): # path keeps every page's word counts between builds, dest_dir is where the shards go
+        self.path = path
+        self.output_dir = os.path.join(dest_dir, SEARCH_DIR)
+        self.docs = [] # [url, title] by doc id, None where a page was removed
+        self.terms = {} # url -> {term: count}
+        self.ids = {} # url -> doc id
+        self.free_ids = []
+        self.dirty_shards = set()
+        self.docs_changed = False
+        self.loaded = self.load()
+
+    def load(self):
+        if not os.path.exists(self.path) or not os.path.isdir(self.output_dir):
+            return False
+        index_file = open(self.path, encoding="utf-8")
+        try:
+            data = json.load(index_file)
+        except ValueError:
+            return False
+        finally:
+            index_file.close()
+        self.docs = data["docs"]
+        self.terms = data["terms"]
+        self.ids = {doc[0]: doc_id for doc_id, doc in enumerate(self.docs) if doc is not None}
+        self.free_ids = [doc_id for doc_id, doc in enumerate(self.docs) if doc is None]
+        return True
+
+    def remove(self, url):
+        doc_id = self.ids.pop(url, None)
+        if doc_id is None:
+            return
+        self.docs[doc_id] = None
+        self.free_ids.append(doc_id)
+        self.dirty_shards.update(shard_key(term) for term in self.terms.pop(url, {}))
+        self.docs_changed = True
+
+    def update(self, url, title, terms): # Replaces what we know about one page
+        doc_id = self.ids.get(url)
+        if doc_id is None:
+            # Ids stay put once given out, so shards nobody touched keep pointing at the right pages
+            if self.free_ids:
+                doc_id = self.free_ids.pop()
+            else:
+                doc_id = len(self.docs)
+                self.docs.append(None)
+            self.ids[url] = doc_id
+        if self.docs[doc_id] != [url, title]:
+            self.docs[doc_id] = [url, title]
+            self.docs_changed = True
+        old_terms = self.terms.get(url, {})
+        terms = dict(terms)
+        for term in set(old_terms) | set(terms):
+            if old_terms.get(term) != terms.get(term):
+                self.dirty_shards.add(shard_key(term))
+        self.terms[url] = terms
+
+    def shard_postings(self, keys): # {shard key: {term: {doc id: count}}} for just the shards asked for
+        shards = {key: {} for key in keys}
+        for url, terms in self.terms.items():
+            doc_id = self.ids[url]
+            for term, count in terms.items():
+                postings = shards.get(shard_key(term))
+                if postings is not None:
+                    postings.setdefault(term, {})[doc_id] = count
+        return shards
+
+    def save(self): # Rewrites only the shards whose words changed, and returns how many that was
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.docs_changed or not self.loaded:
+            write_json(os.path.join(self.output_dir, "docs.json"), self.docs)
+        script_path = os.path.join(self.output_dir, "search.js")
+        if read_text(script_path) != SEARCH_SCRIPT: # Also catches a script left by an older version of this file
+            script_file = open(f"{script_path}.tmp", "w")
+            script_file.write(SEARCH_SCRIPT)
+            script_file.close()
+            os.replace(f"{script_path}.tmp", script_path)
+        if self.loaded and not self.dirty_shards and not self.docs_changed:
+            return 0 # No page's words or title changed, so neither did the shards or what we keep of them
+        for key, postings in sorted(self.shard_postings(self.dirty_shards).items()):
+            path = os.path.join(self.output_dir, f"terms-{key}.json")
+            if postings:
+                write_json(path, {"terms": compress_terms(postings)})
+            elif os.path.exists(path):
+                os.remove(path)
+        written = len(self.dirty_shards)
+        self.dirty_shards = set()
+        self.docs_changed = False
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        write_json(self.path, {"docs": self.docs, "terms": self.terms})
+        self.loaded = True
+        return written
+
+def read_text(path): # The file's contents, or None if there isn't one
+    if not os.path.exists(path):
+        return None
+    text_file = open(path)
+    text = text_file.read()
+    text_file.close()
+    return text
+
+def write_json(path, data): # Compact JSON written through a rename, so a reader never sees half a file
+    temp_path = f"{path}.tmp"
+    json_file = open(temp_path, "w", encoding="utf-8")
+    json.dump(data, json_file, separators=(",", ":"), ensure_ascii=False)
+    json_file.close()
+    os.replace(temp_path, path)
+
+def remove_search_index(dest_dir, index_path): # Cleans up after a build with search once search is turned off
+    if os.path.isdir(os.path.join(dest_dir, SEARCH_DIR)):
+        shutil.rmtree(os.path.join(dest_dir, SEARCH_DIR))
+    if os.path.exists(index_path):
+        os.remove(index_path)
@@ -0,0 +1,152 @@
+# Sharded builds: split the pages between N separate builds (or machines), then merge their outputs into one site
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+from file_manip import copy_files, walk_files
+from search import SEARCH_DIR, SearchIndex
+from siteindex import SITE_FILES, SiteIndex
+import publish
+
+log = logging.getLogger(__name__)
+
+SHARD_FILE = ".shard.json" # What a shard knows about its pages, left in its output for the merge
+SLACK = 1.1 # A shard may take this much more than its even share of source bytes before its pages spill over to the next shard
+
+def parse_shard(text): # "2/4" -> (2, 4). Shards count from 1
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"a shard looks like i/N, not {text!r}")
+    if not 1 <= index <= count:
+        raise ValueError(f"shard {index} of {count} doesn't exist")
+    return index, count
+
+# public -> public.shards/<i>, one directory per shard, which is also where the merge looks for them
+def shards_dir(dest_dir):
+    return os.path.normpath(dest_dir) + ".shards"
+
+def shard_dir(dest_dir, index):
+    return os.path.join(shards_dir(dest_dir), str(index))
+
+def page_key(source, content_dir): # The same on every machine, wherever the checkout lives
+    return os.path.relpath(source, content_dir).replace(os.sep, "/")
+
+def preferred_shard(key, count): # Not hash(): that changes between processes
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big") % count
+
+def assign_shards(pages, content_dir, count): # {source: shard} for every page. Only depends on the content tree, so every shard works out the same split
+    sizes = {source: os.path.getsize(source) for source, dest in pages}
+    capacity = sum(sizes.values()) / count * SLACK
+    loads = [0] * count
+    shards = {}
+    # Biggest pages first, so the small ones fill in the gaps. Each goes to the shard its path hashes to unless that one is full,
+    # so most pages keep their shard when others are added or removed
+    for source in sorted(sizes, key=lambda source: (-sizes[source], page_key(source, content_dir))):
+        first = preferred_shard(page_key(source, content_dir), count)
+        candidates = [(first + offset) % count for offset in range(count)]
+        shard = next((shard for shard in candidates if loads[shard] + sizes[source] <= capacity), None)
+        if shard is None:
+            shard = min(candidates, key=lambda shard: loads[shard])
+        loads[shard] += sizes[source]
+        shards[source] = shard + 1
+    return shards
+
+def content_key(pages, content_dir): # Fingerprint of what the split was made from. Shards built from different trees can't be merged
+    digest = hashlib.blake2b(digest_size=16)
+    for source, dest in sorted(pages):
+        digest.update(f"{page_key(source, content_dir)}\0{os.path.getsize(source)}\n".encode())
+    return digest.hexdigest()
+
+def shard_pages(pages, content_dir, index, count): # This shard's share of the (source, destination) pairs
+    shards = assign_shards(pages, content_dir, count)
+    return [page for page in pages if shards[page[0]] == index]
+
+def write_shard_file(dest_dir, shard, key, site, search_index): # Titles, links and search words of this shard's pages, for the merge
+    data = {"shard": shard[0], "count": shard[1], "content": key, "pages": site.pages, "terms": search_index.terms if search_index is not None else None}
+    temp_path = os.path.join(dest_dir, f"{SHARD_FILE}.tmp")
+    shard_file = open(temp_path, "w", encoding="utf-8")
+    json.dump(data, shard_file, separators=(",", ":"), ensure_ascii=False)
+    shard_file.close()
+    os.replace(temp_path, os.path.join(dest_dir, SHARD_FILE))
+
+def read_shards(root): # {shard: (its directory, what it wrote to SHARD_FILE)}, checked to be one whole set of shards
+    shards = {}
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        path = os.path.join(root, name, SHARD_FILE)
+        if not os.path.exists(path):
+            continue
+        shard_file = open(path, encoding="utf-8")
+        data = json.load(shard_file)
+        shard_file.close()
+        if data["shard"] in shards:
+            raise ValueError(f"shard {data['shard']} shows up twice in {root}")
+        shards[data["shard"]] = (os.path.join(root, name), data)
+    if not shards:
+        raise ValueError(f"no shard builds in {root}")
+    first = next(iter(shards.values()))[1]
+    missing = [index for index in range(1, first["count"] + 1) if index not in shards]
+    if missing or any(data["count"] != first["count"] for directory, data in shards.values()):
+        raise ValueError(f"{root} doesn't hold shards 1 to {first['count']} (missing {missing or 'none'}, found {sorted(shards)})")
+    if any(data["content"] != first["content"] for directory, data in shards.values()):
+        raise ValueError("the shards were built from different content trees")
+    return shards
+
+def is_site_file(path): # Outputs a shard only has its own share of. The merge writes them again for the whole site
+    for suffix in (".gz", ".br"):
+        if path.endswith(suffix):
+            path = path[:-len(suffix)]
+    return path in SITE_FILES or path == SHARD_FILE or path.startswith(SEARCH_DIR + "/")
+
+def merge_files(shards, target): # Hardlinks every shard's pages and assets into target. Returns how many files that was
+    pairs = {}
+    for index, (directory, data) in sorted(shards.items()):
+        for path in walk_files(directory):
+            relative = os.path.relpath(path, directory).replace(os.sep, "/")
+            if is_site_file(relative):
+                continue
+            if relative in pairs:
+                # Every shard copies the static files. Pages never collide, since each one belongs to a single shard
+                if os.path.getsize(pairs[relative][0]) != os.path.getsize(path):
+                    log.warning(f"Shards disagree about {relative}, keeping the first one")
+                continue
+            pairs[relative] = (path, os.path.join(target, *relative.split("/")))
+    copy_files(list(pairs.values()), hardlink=True)
+    return len(pairs)
+
+def merge_shards(dest_dir="public", cache_dir=".cache", site_url=None, keep_builds=0): # Combines the builds in public.shards/ into one public/. Returns the broken links
+    shards = read_shards(shards_dir(dest_dir))
+    searchable = [data["terms"] is not None for directory, data in shards.values()]
+    if any(searchable) and not all(searchable):
+        raise ValueError("some shards were built with --search and some without")
+    pages = {}
+    terms = {}
+    for directory, data in shards.values():
+        pages.update(data["pages"])
+        terms.update(data["terms"] or {})
+    target = publish.prepare_staging(dest_dir, clean=True)
+    files = merge_files(shards, target)
+    site = SiteIndex(os.path.join(cache_dir, "merge-site.json")) # Never saved, so it always starts empty
+    search_index = SearchIndex(os.path.join(cache_dir, "merge-search.json"), target) if all(searchable) else None
+    for url, page in sorted(pages.items()):
+        site.update(url, page["title"], page["front_matter"], page["links"], page["modified"])
+        if search_index is not None:
+            search_index.update(url, page["title"], terms.get(url, {}))
+    if search_index is not None:
+        search_index.save()
+    broken = site.write_outputs(target, site_url)
+    if keep_builds:
+        publish.publish(dest_dir, keep_builds)
+    else:
+        if os.path.islink(dest_dir):
+            os.remove(dest_dir)
+        elif os.path.exists(dest_dir):
+            shutil.rmtree(dest_dir)
+        os.rename(target, dest_dir)
+    for url, link in broken:
+        log.warning(f"Broken link on {url}: {link}")
+    log.info(f"Merged {len(shards)} shards: {len(site.pages)} pages, {files} files, {len(broken)} broken links")
+    return broken
@@ -0,0 +1,153 @@
+# What the build knows about every page at once: titles, front matter and links, for the sitemap, feed and link graph
+
+import json
+import os
+import posixpath
+from datetime import datetime, timezone
+from html import escape
+
+from conversions import extract_markdown_links
+
+SITE_FILES = ("sitemap.xml", "feed.xml", "links.json")
+FEED_ITEMS = 20
+
+def escape_xml(text):
+    return escape(text, quote=False)
+
+def collect_links(blocks, links): # Passes blocks through unchanged, adding the link targets they contain to links
+    for block in blocks:
+        if not block.startswith("```"):
+            links.extend(url for text, url in extract_markdown_links(block))
+        yield block
+
+def internal_url(target, page): # Where a link points on this site, or None for other sites, mail links and plain anchors
+    target = target.strip().split("#", 1)[0].split("?", 1)[0]
+    if not target or ":" in target or target.startswith("//"):
+        return None
+    if not target.startswith("/"):
+        target = posixpath.join(page if page.endswith("/") else posixpath.dirname(page), target)
+    url = posixpath.normpath(target)
+    if target.endswith("/") and url != "/":
+        url += "/"
+    return url
+
+def page_date(front_matter, modified): # A page's date from its front matter (YYYY-MM-DD), falling back to when its source changed
+    value = front_matter.get("date", "")
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return datetime.fromtimestamp(modified, timezone.utc)
+
+class SiteIndex:
+    def __init__(self, path):
+        self.path = path
+        self.pages = {} # url -> {"title", "front_matter", "links", "modified"}
+        self.changed = False
+        self.loaded = self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        index_file = open(self.path, encoding="utf-8")
+        try:
+            self.pages = json.load(index_file)
+        except ValueError:
+            return False
+        finally:
+            index_file.close()
+        return True
+
+    def update(self, url, title, front_matter, links, modified):
+        self.pages[url] = {"title": title, "front_matter": front_matter, "links": links, "modified": modified}
+        self.changed = True
+
+    def remove(self, url):
+        if self.pages.pop(url, None) is not None:
+            self.changed = True
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        write_text(self.path, json.dumps(self.pages, separators=(",", ":"), ensure_ascii=False))
+        self.changed = False
+        self.loaded = True
+
+    def resolve(self, url): # The page a url means, allowing for a missing trailing slash or index.html. None if it's not a page
+        for candidate in (url, url + "/", url[:-len("index.html")] if url.endswith("/index.html") else None):
+            if candidate in self.pages:
+                return candidate
+        return None
+
+    def link_graph(self, dest_dir): # {url: {"title", "links", "backlinks", "broken"}}, from links alone without opening a page
+        graph = {url: {"title": page["title"], "links": [], "backlinks": [], "broken": []} for url, page in self.pages.items()}
+        for url, page in sorted(self.pages.items()):
+            for target in page["links"]:
+                link = internal_url(target, url)
+                if link is None:
+                    continue
+                linked_page = self.resolve(link)
+                if linked_page is not None:
+                    if linked_page not in graph[url]["links"]:
+                        graph[url]["links"].append(linked_page)
+                        graph[linked_page]["backlinks"].append(url)
+                elif not os.path.exists(os.path.join(dest_dir, *link.strip("/").split("/"))):
+                    graph[url]["broken"].append(target)
+        return graph
+
+    def sitemap(self, site_url):
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for url, page in sorted(self.pages.items()):
+            lastmod = page_date(page["front_matter"], page["modified"]).strftime("%Y-%m-%d")
+            lines.append(f"  <url><loc>{escape_xml(site_url + url)}</loc><lastmod>{lastmod}</lastmod></url>")
+        lines.append("</urlset>")
+        return "\n".join(lines) + "\n"
+
+    def feed(self, site_url): # RSS 2.0 with the newest pages first
+        from email.utils import format_datetime # Pulls in socket and friends, so only when a feed is wanted
+        pages = sorted(self.pages.items(), key=lambda item: (page_date(item[1]["front_matter"], item[1]["modified"]), item[0]), reverse=True)
+        home = self.pages.get("/", {})
+        site_title = home.get("title") or site_url
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<rss version="2.0">', "<channel>",
+                 f"  <title>{escape_xml(site_title)}</title>", f"  <link>{escape_xml(site_url)}/</link>",
+                 f"  <description>{escape_xml(home.get('front_matter', {}).get('description', site_title))}</description>"]
+        for url, page in pages[:FEED_ITEMS]:
+            lines.append("  <item>")
+            lines.append(f"    <title>{escape_xml(page['title'] or url)}</title>")
+            lines.append(f"    <link>{escape_xml(site_url + url)}</link>")
+            lines.append(f"    <guid>{escape_xml(site_url + url)}</guid>")
+            lines.append(f"    <pubDate>{format_datetime(page_date(page['front_matter'], page['modified']))}</pubDate>")
+            if "description" in page["front_matter"]:
+                lines.append(f"    <description>{escape_xml(page['front_matter']['description'])}</description>")
+            lines.append("  </item>")
+        lines += ["</channel>", "</rss>"]
+        return "\n".join(lines) + "\n"
+
+    def write_outputs(self, dest_dir, site_url=None): # Writes links.json, plus the sitemap and feed when we know the site's address. Returns the broken links
+        graph = self.link_graph(dest_dir)
+        write_text(os.path.join(dest_dir, "links.json"), json.dumps(graph, indent=2, sort_keys=True, ensure_ascii=False))
+        for name, render in (("sitemap.xml", self.sitemap), ("feed.xml", self.feed)):
+            path = os.path.join(dest_dir, name)
+            if site_url:
+                write_text(path, render(site_url.rstrip("/")))
+            elif os.path.exists(path):
+                os.remove(path)
+        return [(url, target) for url, node in sorted(graph.items()) for target in node["broken"]]
+
+def write_text(path, text): # Writes through a rename, and leaves the file alone when nothing in it changed
+    if os.path.exists(path):
+        existing = open(path, encoding="utf-8")
+        same = existing.read() == text
+        existing.close()
+        if same:
+            return
+    temp_path = f"{path}.tmp"
+    text_file = open(temp_path, "w", encoding="utf-8")
+    text_file.write(text)
+    text_file.close()
+    os.replace(temp_path, path)
+
+def remove_site_files(dest_dir, index_path): # Cleans up after a build with a site index once it's turned off
+    for name in SITE_FILES:
+        if os.path.exists(os.path.join(dest_dir, name)):
+            os.remove(os.path.join(dest_dir, name))
+    if os.path.exists(index_path):
+        os.remove(index_path)
@@ -0,0 +1,147 @@
+# Templates are parsed once into literal text and named slots, then cached until the file changes
+
+import copy
+import os
+import re
+
+# {{ name }} is a slot, {% extends "file" %} / {% block name %} / {% endblock %} handle layouts
+TOKEN_PATTERN = re.compile(r"\{\{\s*([A-Za-z_][\w-]*)\s*\}\}|\{%\s*(extends|block|endblock|include)\s*(?:\"([^\"]*)\"|([A-Za-z_][\w-]*))?\s*%\}")
+
+class TemplateError(ValueError):
+    pass
+
+class Slot:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Slot) and self.name == other.name
+
+    def __repr__(self):
+        return f"Slot({self.name})"
+
+def join_literals(segments): # Glues neighbouring literal strings together so rendering has fewer pieces to write
+    joined = []
+    for segment in segments:
+        if isinstance(segment, str) and joined and isinstance(joined[-1], str):
+            joined[-1] += segment
+        elif segment != "":
+            joined.append(segment)
+    return joined
+
+class Template:
+    def __init__(self, source, path=None):
+        self.path = path
+        self.dependencies = [path] if path else [] # Every file this template was built from, its layouts included
+        self.parent_path = None
+        self.layout = [] # Segments before blocks are filled in
+        self.blocks = {}
+        self.parse(source)
+        if self.parent_path is not None:
+            parent = load_template(self.parent_path)
+            self.dependencies.extend(parent.dependencies)
+            self.layout = parent.layout
+            self.blocks = {**parent.blocks, **self.blocks}
+        self.segments = self.compile()
+
+    def parse(self, source):
+        current = self.layout
+        block_name = None
+        position = 0
+        for match in TOKEN_PATTERN.finditer(source):
+            current.append(source[position:match.start()])
+            position = match.end()
+            slot_name, tag, quoted, name = match.groups()
+            if slot_name is not None:
+                current.append(Slot(slot_name))
+            elif tag == "extends":
+                if self.parent_path is not None or block_name is not None or quoted is None:
+                    raise TemplateError(f"bad extends in {self.path}")
+                base_dir = os.path.dirname(self.path) if self.path else ""
+                self.parent_path = os.path.normpath(os.path.join(base_dir, quoted))
+            elif tag == "include":
+                if quoted is None:
+                    raise TemplateError(f"include needs a quoted path in {self.path}")
+                base_dir = os.path.dirname(self.path) if self.path else ""
+                include_path = os.path.normpath(os.path.join(base_dir, quoted))
+                if include_path in _loading:
+                    raise TemplateError(f"{include_path} includes itself")
+                # Partials are parsed once through the template cache and spliced in, so rendering never looks them up
+                included = load_template(include_path)
+                current.extend(included.segments)
+                self.dependencies.extend(included.dependencies)
+            elif tag == "block":
+                if block_name is not None or name is None:
+                    raise TemplateError(f"blocks can't be nested or unnamed in {self.path}")
+                block_name = name
+                self.layout.append(Slot(name))
+                current = self.blocks[name] = []
+            else:
+                if block_name is None:
+                    raise TemplateError(f"endblock without a block in {self.path}")
+                block_name = None
+                current = self.layout
+        if block_name is not None:
+            raise TemplateError(f"block {block_name} is never closed in {self.path}")
+        current.append(source[position:])
+
+    def compile(self): # Fills the layout's block slots with block contents, leaving only variable slots behind
+        segments = []
+        for segment in self.layout:
+            if isinstance(segment, Slot) and segment.name in self.blocks:
+                segments.extend(self.blocks[segment.name])
+            else:
+                segments.append(segment)
+        return join_literals(segments)
+
+    def rewritten(self, rewrite): # A copy of this template with rewrite() applied to all of its literal text
+        template = copy.copy(self)
+        template.segments = [rewrite(segment) if isinstance(segment, str) else segment for segment in self.segments]
+        return template
+
+    def write(self, context, write): # Streams the page to write(). Callable values get write() and can stream their own content
+        for segment in self.segments:
+            if isinstance(segment, str):
+                write(segment)
+                continue
+            value = context.get(segment.name)
+            if value is None:
+                continue
+            if callable(value):
+                value(write)
+            else:
+                write(str(value))
+
+    def render(self, context):
+        parts = []
+        self.write(context, parts.append)
+        return "".join(parts)
+
+# path -> (modification times of the template and its layouts, Template)
+_template_cache = {}
+
+def _mtimes(paths): # None if one of them is gone, which never matches what we cached
+    try:
+        return tuple(os.stat(path).st_mtime_ns for path in paths)
+    except OSError:
+        return None
+
+_loading = set() # Templates being parsed right now, to catch includes that loop back
+
+def load_template(path): # Parses a template file, or hands back the cached one if none of its files changed
+    path = os.path.normpath(path)
+    cached = _template_cache.get(path)
+    if cached is not None and _mtimes(cached[1].dependencies) == cached[0]:
+        return cached[1]
+    template_file = open(path)
+    source = template_file.read()
+    template_file.close()
+    _loading.add(path)
+    try:
+        template = Template(source, path)
+    finally:
+        _loading.discard(path)
+    _template_cache[path] = (_mtimes(template.dependencies), template)
+    return template
@@ -0,0 +1,71 @@
+# My own unit test file for asset fingerprinting
+
+import os
+import tempfile
+import unittest
+
+from assets import fingerprinted_path, rewrite_asset_urls
+from build import build
+from test_file_manip import write_file, read_file
+
+class TestAssets(unittest.TestCase):
+    def test_fingerprinted_path(self):
+        self.assertEqual(fingerprinted_path(os.path.join("public", "index.css"), "3f9a1c2b7d0000"), os.path.join("public", "index.3f9a1c2b7d.css"))
+
+    def test_rewrite(self):
+        mapping = {"/index.css": "/index.abc.css", "/a.png": "/a.def.png"}
+        html = "<link href=\"/index.css\" /><img src='/a.png'><div style=\"background: url(/a.png)\"><a href=\"/other\">"
+        self.assertEqual(rewrite_asset_urls(html, mapping), "<link href=\"/index.abc.css\" /><img src='/a.def.png'><div style=\"background: url(/a.def.png)\"><a href=\"/other\">")
+
+class TestFingerprintBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.paths = [os.path.join(root, name) for name in ("content", "static", "template.html", "public")]
+        self.cache = os.path.join(root, ".cache")
+        write_file(self.paths[2], "<link href=\"/index.css\" />{{ Content }}")
+        write_file(os.path.join(self.paths[0], "index.md"), "![pic](/pic.png)")
+        write_file(os.path.join(self.paths[1], "index.css"), "body {}")
+        write_file(os.path.join(self.paths[1], "pic.png"), "png")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_build(self, fingerprint=True, minify=False):
+        return build(*self.paths, workers=1, cache_dir=self.cache, fingerprint=fingerprint, minify=minify)
+
+    def fingerprinted_files(self):
+        return sorted(name for name in os.listdir(self.paths[3]) if name.count(".") == 2)
+
+    def test_pages_point_at_fingerprints(self):
+        self.run_build()
+        css, png = self.fingerprinted_files()
+        self.assertEqual(read_file(os.path.join(self.paths[3], "index.html")), f"<link href=\"/{css}\" /><div><p><img src=\"/{png}\" alt=\"pic\" /></p></div>")
+        self.assertEqual(read_file(os.path.join(self.paths[3], css)), "body {}")
+
+    def test_changed_asset(self):
+        self.run_build()
+        old_css = self.fingerprinted_files()[0]
+        write_file(os.path.join(self.paths[1], "index.css"), "body { color: red }")
+        self.assertEqual(len(self.run_build()), 1) # The page is rebuilt to pick up the new name
+        new_css = self.fingerprinted_files()[0]
+        self.assertNotEqual(old_css, new_css)
+        self.assertFalse(os.path.exists(os.path.join(self.paths[3], old_css)))
+
+    def test_minify_toggle(self):
+        # The fingerprinted copy has to follow the stylesheet as minifying rewrites it, both ways
+        self.run_build()
+        for minify, css in ((True, "body{}"), (False, "body {}")):
+            self.run_build(minify=minify)
+            name = self.fingerprinted_files()[0]
+            self.assertEqual(read_file(os.path.join(self.paths[3], name)), css)
+            self.assertIn(f"/{name}", read_file(os.path.join(self.paths[3], "index.html")))
+
+    def test_turned_off(self):
+        self.run_build()
+        self.run_build(fingerprint=False)
+        self.assertEqual(self.fingerprinted_files(), [])
+        self.assertIn("href=\"/index.css\"", read_file(os.path.join(self.paths[3], "index.html")))
+
+if __name__ == "__main__":
+    unittest.main()
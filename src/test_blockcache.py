@@ -0,0 +1,45 @@
+# My own unit test file for the block cache
+
+import os
+import tempfile
+import unittest
+
+import conversions
+from blockcache import BlockCache, block_key
+from conversions import markdown_to_html_node
+
+class TestBlockCache(unittest.TestCase):
+    def tearDown(self):
+        conversions.block_cache = None
+
+    def test_lru_eviction(self):
+        cache = BlockCache(max_entries=2)
+        cache.put("a", "<p>a</p>")
+        cache.put("b", "<p>b</p>")
+        cache.get("a")
+        cache.put("c", "<p>c</p>")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "<p>a</p>")
+        self.assertEqual(cache.take_stats(), {"hits": 2, "misses": 1, "evictions": 1})
+        self.assertEqual(cache.take_stats(), {"hits": 0, "misses": 0, "evictions": 0})
+
+    def test_same_html_with_cache(self):
+        md = "Shared **notice**\n\n- a\n- b\n\nShared **notice**"
+        expected = markdown_to_html_node(md).to_html()
+        conversions.block_cache = BlockCache()
+        self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+        self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+        self.assertEqual(conversions.block_cache.take_stats(), {"hits": 4, "misses": 2, "evictions": 0})
+
+    def test_persisted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "blocks.sqlite")
+            cache = BlockCache(path=path)
+            cache.put(block_key("text"), "<p>text</p>")
+            cache.close()
+            reopened = BlockCache(path=path)
+            self.assertEqual(reopened.get(block_key("text")), "<p>text</p>")
+            reopened.close()
+
+if __name__ == "__main__":
+    unittest.main()
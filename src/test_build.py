@@ -0,0 +1,98 @@
+# My own unit test file for incremental builds
+
+import json
+import os
+import tempfile
+import unittest
+
+from build import build
+from test_file_manip import write_file, read_file
+
+class TestBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.static = os.path.join(self.root, "static")
+        self.public = os.path.join(self.root, "public")
+        self.template = os.path.join(self.root, "template.html")
+        self.cache = os.path.join(self.root, ".cache")
+        write_file(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        write_file(os.path.join(self.content, "index.md"), "# Home")
+        write_file(os.path.join(self.content, "blog", "index.md"), "# Blog")
+        write_file(os.path.join(self.static, "index.css"), "body {}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_build(self, **kwargs):
+        return build(self.content, self.static, self.template, self.public, workers=1, cache_dir=self.cache, **kwargs)
+
+    def touch(self, path, content):
+        write_file(path, content)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000)) # Coarse filesystem clocks could hide the edit otherwise
+
+    def test_noop_rebuild(self):
+        self.assertEqual(len(self.run_build()), 2)
+        self.assertEqual(self.run_build(), [])
+
+    def test_only_changed_page(self):
+        self.run_build()
+        self.touch(os.path.join(self.content, "blog", "index.md"), "# Blog 2")
+        self.assertEqual(self.run_build(), [(os.path.join(self.content, "blog", "index.md"), os.path.join(self.public, "blog", "index.html"))])
+        self.assertEqual(read_file(os.path.join(self.public, "blog", "index.html")), "<title>Blog 2</title><div><h1>Blog 2</h1></div>")
+
+    def test_same_content_new_mtime(self):
+        self.run_build()
+        self.touch(os.path.join(self.content, "index.md"), "# Home")
+        self.assertEqual(self.run_build(), [])
+
+    def test_template_invalidates_everything(self):
+        self.run_build()
+        self.touch(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(len(self.run_build()), 2)
+
+    def test_deleted_sources(self):
+        self.run_build()
+        os.remove(os.path.join(self.content, "blog", "index.md"))
+        os.remove(os.path.join(self.static, "index.css"))
+        self.run_build()
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog")))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.css")))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.html")))
+
+    def test_missing_output_is_rebuilt(self):
+        self.run_build()
+        os.remove(os.path.join(self.public, "index.html"))
+        self.assertEqual(len(self.run_build()), 1)
+
+    def test_precompress_turned_off(self):
+        self.touch(os.path.join(self.content, "index.md"), "# Home\n\n" + "Long enough to compress. " * 20)
+        self.run_build(precompress_output=True)
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.html.gz")))
+        self.touch(os.path.join(self.content, "index.md"), "# Home\n\n" + "Edited since. " * 20)
+        self.run_build()
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.html.gz")))
+
+    def test_clean_drops_block_cache(self):
+        self.run_build(block_cache_size=10, persist_block_cache=True)
+        self.assertTrue(os.path.exists(os.path.join(self.cache, "blocks.sqlite")))
+        self.run_build(clean=True)
+        self.assertFalse(os.path.exists(os.path.join(self.cache, "blocks.sqlite")))
+
+    def test_profile_report(self):
+        report_path = os.path.join(self.cache, "profile.json")
+        self.run_build(profile_path=report_path)
+        report_file = open(report_path)
+        report = json.load(report_file)
+        report_file.close()
+        self.assertEqual(set(report["build_stages"]), {"scan", "assets", "pages", "manifest"})
+        self.assertEqual(report["page_stages"]["parse"]["calls"], 2)
+        self.assertEqual(set(report["page_stages"]), {"read", "split", "parse", "serialize", "template", "write"})
+        self.assertGreater(report["page_stages"]["read"]["bytes"], 0)
+        self.assertEqual(report["page_stages"]["write"]["bytes"], sum(page["bytes"] for page in report["pages"]))
+        self.assertEqual(sorted(page["source"] for page in report["pages"]), [os.path.join(self.content, "blog", "index.md"), os.path.join(self.content, "index.md")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+# My own unit test file for precompression
+
+import gzip
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import compress
+from compress import MIN_SIZE, precompress
+from test_file_manip import write_file
+
+class TestCompress(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.public = self.tmp.name
+        self.page = os.path.join(self.public, "index.html")
+        write_file(self.page, "<p>hobbit</p>" * 100)
+        write_file(os.path.join(self.public, "tiny.css"), "p{}")
+        write_file(os.path.join(self.public, "image.png"), "x" * MIN_SIZE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_text_files(self):
+        self.assertEqual(precompress(self.public, workers=1), [self.page])
+        gz_file = open(f"{self.page}.gz", "rb")
+        self.assertEqual(gzip.decompress(gz_file.read()).decode(), "<p>hobbit</p>" * 100)
+        gz_file.close()
+
+    def test_unchanged_skipped(self):
+        precompress(self.public, workers=1)
+        self.assertEqual(precompress(self.public, workers=1), [])
+        write_file(self.page, "<p>dwarf</p>" * 100)
+        os.utime(self.page, ns=(0, os.stat(self.page).st_mtime_ns + 1_000_000_000))
+        self.assertEqual(precompress(self.public, workers=2), [self.page])
+
+    def test_orphans_removed(self):
+        precompress(self.public, workers=1)
+        os.remove(self.page)
+        precompress(self.public, workers=1)
+        self.assertFalse(os.path.exists(f"{self.page}.gz"))
+
+    def test_stale_brotli_removed(self): # A .br from a build that had brotli would otherwise keep serving the old page
+        write_file(f"{self.page}.br", "old")
+        with mock.patch.object(compress, "brotli", None):
+            self.assertEqual(precompress(self.public, workers=1), [self.page])
+        self.assertFalse(os.path.exists(f"{self.page}.br"))
+        self.assertTrue(os.path.exists(f"{self.page}.gz"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
 # My own unit test file for conversion functions
 
+import io
+import random
 import unittest
 
 from textnode import TextType, TextNode
@@ -90,6 +92,30 @@ class TestConversions(unittest.TestCase):
         nodes,
         )
     
+    def chained_text_to_textnode(self, text): # The original five-pass version, kept around to check the single pass against
+        node_list = [TextNode(text, TextType.NORMAL_TEXT)]
+        node_list = split_nodes_image(node_list)
+        node_list = split_nodes_link(node_list)
+        node_list = split_nodes_delimiter(node_list, "**", TextType.BOLD_TEXT)
+        node_list = split_nodes_delimiter(node_list, "_", TextType.ITALIC_TEXT)
+        node_list = split_nodes_delimiter(node_list, "`", TextType.CODE_TEXT)
+        return node_list
+
+    def test_single_pass_matches_chain(self):
+        texts = [
+            "",
+            "**bold** at the start and `code` at the end`",
+            "![img](a.png)[link](b)![img2](c.png)",
+            "trailing bang![alt](x) and !not an image [ok](y_z) and **un_closed",
+            "[a](b) snake_case_words and ** stray",
+        ]
+        pieces = ["word ", "**", "_", "`", "![alt](/img.png)", "[text](/url_with_underscore)", "!", "[", "](", ")", " "]
+        rng = random.Random(7)
+        for _ in range(500):
+            texts.append("".join(rng.choice(pieces) for _ in range(rng.randint(0, 12))))
+        for text in texts:
+            self.assertEqual(text_to_textnode(text), self.chained_text_to_textnode(text), text)
+
     def test_markdown_to_blocks(self):
         md = "This is **bolded** paragraph\n\nThis is another paragraph with _italic_ text and `code` here\nThis is the same paragraph on a new line\n\n- This is a list\n- with items"
         blocks = markdown_to_blocks(md)
@@ -105,6 +131,28 @@ class TestConversions(unittest.TestCase):
         blocks = markdown_to_blocks(md)
         self.assertEqual(blocks, ["Paragraph", "with too many newlines"])
     
+    def test_streamed_blocks_match(self):
+        pieces = ["text", " ", "\n", "\n\n", "- item", "> quote", "  "]
+        rng = random.Random(11)
+        for _ in range(500):
+            md = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 15)))
+            lines = io.StringIO(md)
+            self.assertEqual(list(iter_markdown_blocks(lines)), markdown_to_blocks(md), repr(md))
+
+    def test_write_markdown_html(self):
+        md = "# Heading\n\nSome **text**\n\n- a\n- b"
+        parts = []
+        write_markdown_html(iter_markdown_blocks(io.StringIO(md)), parts.append)
+        self.assertEqual("".join(parts), markdown_to_html_node(md).to_html())
+
+    def test_block_type_mixed_lines(self):
+        self.assertEqual(block_to_block_type("1. one\n2. two\n- three"), BlockType.PARAGRAPH)
+        self.assertEqual(block_to_block_type("1. one\n3. three"), BlockType.PARAGRAPH)
+        self.assertEqual(block_to_block_type(">- both?\n>- quote wins"), BlockType.QUOTE)
+
+    def test_title_from_file_lines(self):
+        self.assertEqual(extract_title_from_lines(io.StringIO("intro\n# Title #\nmore")), "Title")
+
     def test_block_to_block_type(self):
         md = "This is **bolded** paragraph\n\nThis is another paragraph with _italic_ text and `code` here\nThis is the same paragraph on a new line\n\n- This is a list\n- with items"
         blocks = markdown_to_blocks(md)
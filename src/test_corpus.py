@@ -0,0 +1,35 @@
+# My own unit test file for the benchmark corpus generator
+
+import os
+import random
+import tempfile
+import unittest
+
+from conversions import BlockType, block_to_block_type, markdown_to_blocks
+from corpus import generate_corpus, generate_markdown
+
+class TestCorpus(unittest.TestCase):
+    def test_same_seed_same_page(self):
+        self.assertEqual(generate_markdown(random.Random(3)), generate_markdown(random.Random(3)))
+        self.assertNotEqual(generate_markdown(random.Random(3)), generate_markdown(random.Random(4)))
+
+    def test_every_block_type(self):
+        page = generate_markdown(random.Random(0), blocks=12)
+        types = set(block_to_block_type(block) for block in markdown_to_blocks(page))
+        self.assertEqual(types, set(BlockType))
+
+    def test_settings_shape_page(self):
+        page = generate_markdown(random.Random(0), blocks=3, list_length=7, markup_density=0)
+        blocks = markdown_to_blocks(page)
+        self.assertEqual(len(blocks), 4)
+        self.assertEqual(blocks[2].count("\n- "), 6)
+        self.assertNotIn("**", page)
+
+    def test_corpus_layout(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = generate_corpus(tmp, pages=5, pages_per_dir=2, blocks=2)
+            self.assertEqual(len(paths), 5)
+            self.assertEqual(sorted(os.listdir(tmp)), ["section0", "section1", "section2"])
+
+if __name__ == "__main__":
+    unittest.main()
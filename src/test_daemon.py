@@ -0,0 +1,86 @@
+# My own unit test file for the build daemon and the lazy entry point
+
+import contextlib
+import io
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from daemon import read_message, send_request, serve
+from test_file_manip import write_file, read_file
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.socket = os.path.join(self.root, "daemon.sock")
+        write_file(os.path.join(self.root, "template.html"), "{{ Content }}")
+        write_file(os.path.join(self.root, "content", "index.md"), "# Home")
+        os.makedirs(os.path.join(self.root, "static"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def start(self, requests):
+        thread = threading.Thread(target=serve, args=(self.socket, requests), daemon=True)
+        thread.start()
+        while not os.path.exists(self.socket):
+            time.sleep(0.01)
+        return thread
+
+    def test_no_daemon(self):
+        self.assertIsNone(send_request(["build"], self.socket, self.root))
+
+    def test_build(self):
+        thread = self.start(2)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(send_request(["build", "-v", "-j", "1"], self.socket, self.root), 0)
+            self.assertEqual(send_request(["--no-such-option"], self.socket, self.root), 2)
+        thread.join()
+        self.assertEqual(read_file(os.path.join(self.root, "public", "index.html")), "<div><h1>Home</h1></div>")
+        self.assertIn("Built 1 of 1 pages", output.getvalue())
+        self.assertIn("unrecognized arguments", output.getvalue())
+        self.assertFalse(os.path.exists(self.socket))
+
+    def test_socket_private(self):
+        thread = self.start(1)
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket).st_mode), 0o600)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(send_request(["build", "-j", "1"], self.socket, self.root), 0)
+        thread.join()
+
+    def test_no_answer(self): # A daemon that drops the request closes without a reply
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket)
+        server.listen()
+        def drop():
+            connection = server.accept()[0]
+            read_message(connection)
+            connection.close()
+        thread = threading.Thread(target=drop, daemon=True)
+        thread.start()
+        with self.assertLogs("daemon", "ERROR"):
+            self.assertEqual(send_request(["build"], self.socket, self.root), 1)
+        thread.join()
+        server.close()
+
+    def test_lazy_imports(self):
+        # Parsing the command line shouldn't load the build
+        source = os.path.dirname(os.path.abspath(__file__))
+        code = "import sys, main; main.parse_args(['build']); print('build' in sys.modules, 'conversions' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], cwd=source, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), "False False")
+        # And a plain build doesn't load the stages it isn't running
+        code = "import sys, build; print(sorted(name for name in ('images', 'minify', 'search', 'siteindex', 'shard', 'publish', 'assets') if name in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], cwd=source, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), "[]")
+
+if __name__ == "__main__":
+    unittest.main()
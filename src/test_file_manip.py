@@ -0,0 +1,68 @@
+# My own unit test file for file and directory functions
+
+import os
+import tempfile
+import unittest
+
+from file_manip import copy_file, find_pages, generate_pages_recursive
+
+TEMPLATE = "<title>{{ Title }}</title><main>{{ Content }}</main>"
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file = open(path, "w")
+    file.write(content)
+    file.close()
+
+def read_file(path):
+    file = open(path)
+    content = file.read()
+    file.close()
+    return content
+
+class TestFileManip(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.public = os.path.join(self.root, "public")
+        self.template = os.path.join(self.root, "template.html")
+        write_file(self.template, TEMPLATE)
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\nWelcome **home**")
+        write_file(os.path.join(self.content, "blog", "tom", "index.md"), "# Tom\n\nA _mistake_")
+        write_file(os.path.join(self.content, "blog", "notes.txt"), "not markdown")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_find_pages_mirrors_tree(self):
+        pages = find_pages(self.content, self.public)
+        self.assertEqual(pages, [
+            (os.path.join(self.content, "index.md"), os.path.join(self.public, "index.html")),
+            (os.path.join(self.content, "blog", "tom", "index.md"), os.path.join(self.public, "blog", "tom", "index.html")),
+        ])
+
+    def test_generate_serial(self):
+        generate_pages_recursive(self.content, self.template, self.public, workers=1)
+        self.assertEqual(read_file(os.path.join(self.public, "blog", "tom", "index.html")), "<title>Tom</title><main><div><h1>Tom</h1><p>A <i>mistake</i></p></div></main>")
+
+    def test_generate_parallel(self):
+        generate_pages_recursive(self.content, self.template, self.public, workers=2)
+        self.assertEqual(read_file(os.path.join(self.public, "index.html")), "<title>Home</title><main><div><h1>Home</h1><p>Welcome <b>home</b></p></div></main>")
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog", "notes.txt")))
+
+    def test_copy_file_keeps_mtime(self):
+        source = os.path.join(self.content, "index.md")
+        dest = os.path.join(self.public, "copy", "index.md")
+        copy_file(source, dest)
+        self.assertEqual(read_file(dest), read_file(source))
+        self.assertEqual(os.stat(dest).st_mtime_ns, os.stat(source).st_mtime_ns)
+
+    def test_hardlink_does_not_leak(self):
+        dest = os.path.join(self.public, "index.md")
+        copy_file(os.path.join(self.content, "index.md"), dest, hardlink=True)
+        copy_file(os.path.join(self.content, "blog", "notes.txt"), dest)
+        self.assertEqual(read_file(os.path.join(self.content, "index.md")), "# Home\n\nWelcome **home**")
+
+if __name__ == "__main__":
+    unittest.main()
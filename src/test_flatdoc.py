@@ -0,0 +1,41 @@
+# My own unit test file for the array-backed document
+
+import os
+import tempfile
+import unittest
+
+import includes
+
+from htmlnode import LeafNode, ParentNode
+from conversions import markdown_to_html_node
+from flatdoc import FlatDocument, markdown_to_flat_document
+from test_file_manip import write_file
+
+class TestFlatDocument(unittest.TestCase):
+    def test_matches_tree(self):
+        md = "# Title\n\nA **bold** move with a [link](/there) and ![pic](/pic.png)\n\n- one\n- _two_\n\n1. first\n2. second\n\n> quoted\n\n```\ncode\n```"
+        self.assertEqual(markdown_to_flat_document(md).to_html(), markdown_to_html_node(md).to_html())
+
+    def test_include_matches_tree(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            write_file(os.path.join(tmp, "note.md"), "A **note**")
+            md = "# Page\n\n{% include \"note.md\" %}\n\n```python\nx = 1\n```"
+            includes.begin_page(os.path.join(tmp, "page.md"))
+            try:
+                self.assertEqual(markdown_to_flat_document(md).to_html(), markdown_to_html_node(md).to_html())
+                self.assertIn("<b>note</b>", markdown_to_flat_document(md).to_html())
+            finally:
+                includes.end_page()
+
+    def test_nested_closing(self):
+        node = ParentNode("div", [ParentNode("p", [ParentNode("b", [LeafNode(None, "deep")])]), LeafNode("i", "after")])
+        document = FlatDocument.from_node(node)
+        self.assertEqual(len(document), 5)
+        self.assertEqual(document.to_html(), "<div><p><b>deep</b></p><i>after</i></div>")
+
+    def test_leaf_without_value(self):
+        with self.assertRaises(ValueError):
+            FlatDocument.from_node(ParentNode("div", [LeafNode("p")]))
+
+if __name__ == "__main__":
+    unittest.main()
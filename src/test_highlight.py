@@ -0,0 +1,48 @@
+# My own unit test file for syntax highlighting
+
+import random
+import unittest
+
+import highlight
+from conversions import markdown_to_html_node
+from flatdoc import markdown_to_flat_document
+from highlight import RULES, highlight as highlight_code, lexer, tokenize
+
+class TestHighlight(unittest.TestCase):
+    def test_python(self):
+        self.assertEqual(highlight_code("def f(x): # <b>\n    return 'a' + 1", "py"),
+                         '<span class="k">def</span> f(x): <span class="c"># &lt;b&gt;</span>\n    <span class="k">return</span> <span class="s">\'a\'</span> + <span class="m">1</span>')
+
+    def test_strings_hide_keywords(self):
+        self.assertEqual(list(tokenize('x = "if // not a comment"', "js")), [(None, "x = "), ("s", '"if // not a comment"')])
+
+    def test_unknown_language(self):
+        self.assertIsNone(lexer("brainfuck"))
+        self.assertEqual(highlight_code("a < b", "brainfuck"), "a &lt; b")
+
+    def test_tokens_join_back(self):
+        generator = random.Random(22)
+        alphabet = "abc def if for return #//*/\"'`$@{}:;<>=0x1.5\n \\"
+        for language in RULES:
+            for _ in range(200):
+                code = "".join(generator.choice(alphabet) for _ in range(generator.randrange(40)))
+                self.assertEqual("".join(text for token, text in tokenize(code, language)), code)
+
+    def test_lexer_compiled_once(self):
+        self.assertIs(lexer("python"), lexer("py"))
+
+    def test_cache(self):
+        highlight.cache_stats.update(hits=0, misses=0)
+        code = "echo $HOME # a cached snippet"
+        first = highlight_code(code, "bash")
+        self.assertIs(highlight_code(code, "bash"), first)
+        self.assertEqual(highlight.cache_stats, {"hits": 1, "misses": 1})
+
+    def test_code_block(self):
+        md = "```python\nprint(None)\n```\n\n```\nplain <b>\n```"
+        html = '<div><pre><code class="language-python"><span class="nb">print</span>(<span class="k">None</span>)</code></pre><pre><code>plain <b></code></pre></div>'
+        self.assertEqual(markdown_to_html_node(md).to_html(), html)
+        self.assertEqual(markdown_to_flat_document(md).to_html(), html)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 # My own unit test file for HTML nodes
 
+import io
 import unittest
 
 from textnode import TextType, TextNode
@@ -55,6 +56,28 @@ class TestHTMLNode(unittest.TestCase):
         parent = ParentNode("div", [child])
         self.assertEqual(parent.to_html(), "<div><span><b>grandchild</b></span></div>")
     
+    def test_wide_parent(self):
+        parent = ParentNode("ul", [ParentNode("li", [LeafNode(None, str(i))]) for i in range(1000)])
+        self.assertEqual(parent.to_html(), "<ul>" + "".join(f"<li>{i}</li>" for i in range(1000)) + "</ul>")
+
+    def test_iter_html_chunks(self):
+        parent = ParentNode("div", [LeafNode("b", "bold"), LeafNode(None, " text")])
+        self.assertEqual(list(parent.iter_html()), ["<div>", "<b>bold</b>", " text", "</div>"])
+        # Lazy: a child that can't render only fails once its turn comes
+        chunks = ParentNode("div", [LeafNode("b", "bold"), LeafNode("i", None)]).iter_html()
+        self.assertEqual([next(chunks), next(chunks)], ["<div>", "<b>bold</b>"])
+        with self.assertRaises(ValueError):
+            next(chunks)
+
+    def test_write_html_to_file(self):
+        buffer = io.StringIO()
+        ParentNode("p", [LeafNode("i", "streamed")]).write_html(buffer.write)
+        self.assertEqual(buffer.getvalue(), "<p><i>streamed</i></p>")
+
+    def test_props_to_html(self):
+        node = HTMLNode("a", "link", None, {"href": "https://boot.dev", "target": "_blank"})
+        self.assertEqual(node.props_to_html(), " href=\"https://boot.dev\" target=\"_blank\"")
+
     def test_parent_no_children(self):
         node = ParentNode("p")
         self.assertRaises(ValueError)
@@ -63,6 +86,14 @@ class TestHTMLNode(unittest.TestCase):
         node = ParentNode(children=[LeafNode("p", "My parent has no tag...")])
         self.assertRaises(ValueError)
     
+    def test_no_instance_dict(self):
+        node = ParentNode("div", [LeafNode("p", "slotted")])
+        self.assertFalse(hasattr(node, "__dict__"))
+        self.assertFalse(hasattr(node.children[0], "__dict__"))
+
+    def test_tags_interned(self):
+        self.assertIs(LeafNode("".join(["sp", "an"]), "a").tag, LeafNode("span", "b").tag)
+
     def test_basic_conversion(self):
         node = TextNode("I'm a text node", TextType.NORMAL_TEXT)
         html_node = text_node_to_html_node(node)
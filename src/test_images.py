@@ -0,0 +1,115 @@
+# My own unit test file for the image stage
+
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+
+import images
+from build import build
+from htmlnode import ImageNode
+from test_file_manip import write_file, read_file
+
+def png_bytes(width, height): # The smallest valid PNG we can make without Pillow: one grey pixel row per line
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + b"\x80" * width for _ in range(height))
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+def write_bytes(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    image_file = open(path, "wb")
+    image_file.write(data)
+    image_file.close()
+
+class TestImageSize(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def size_of(self, data):
+        path = os.path.join(self.tmp.name, "image")
+        write_bytes(path, data)
+        return images.image_size(path)
+
+    def test_png(self):
+        self.assertEqual(self.size_of(png_bytes(30, 20)), (30, 20))
+
+    def test_gif(self):
+        self.assertEqual(self.size_of(b"GIF89a" + struct.pack("<HH", 640, 480) + b"\x00" * 20), (640, 480))
+
+    def test_jpeg(self):
+        app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+        sof = b"\xff\xc0" + struct.pack(">HBHH", 17, 8, 300, 400) + b"\x00" * 10
+        self.assertEqual(self.size_of(b"\xff\xd8" + app0 + sof), (400, 300))
+
+    def test_unknown(self):
+        self.assertIsNone(self.size_of(b"not an image at all"))
+
+class TestImageNode(unittest.TestCase):
+    def test_picture(self):
+        node = ImageNode("/a.png", "a", {"width": "10"}, [{"type": "image/webp", "srcset": "/a.webp 10w"}])
+        self.assertEqual(node.to_html(), "<picture><source type=\"image/webp\" srcset=\"/a.webp 10w\" /><img src=\"/a.png\" alt=\"a\" width=\"10\" /></picture>")
+
+class TestImageBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.paths = [os.path.join(root, name) for name in ("content", "static", "template.html", "public")]
+        self.cache = os.path.join(root, ".cache")
+        write_file(self.paths[2], "{{ Content }}")
+        write_file(os.path.join(self.paths[0], "index.md"), "![wide](/wide.png)")
+        write_bytes(os.path.join(self.paths[1], "wide.png"), png_bytes(1000, 10))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_build(self, process_images=True):
+        build(*self.paths, workers=1, cache_dir=self.cache, process_images=process_images)
+        return read_file(os.path.join(self.paths[3], "index.html"))
+
+    def test_dimensions_and_lazy(self):
+        html = self.run_build()
+        self.assertIn("width=\"1000\" height=\"10\" loading=\"lazy\"", html)
+
+    @unittest.skipIf(images.Image is None, "needs Pillow")
+    def test_derivatives_cached_and_cleaned(self):
+        html = self.run_build()
+        self.assertIn("/wide-480w.", html)
+        self.assertIn("<source type=\"image/webp\"", html)
+        cached = sorted(os.listdir(os.path.join(self.cache, "images")))
+        self.run_build()
+        self.assertEqual(sorted(os.listdir(os.path.join(self.cache, "images"))), cached)
+        self.run_build(process_images=False)
+        self.assertEqual(sorted(os.listdir(self.paths[3])), ["index.html", "wide.png"])
+
+    @unittest.skipIf(images.Image is None, "needs Pillow")
+    def test_changed_image_pruned_from_cache(self):
+        self.run_build()
+        old = set(os.listdir(os.path.join(self.cache, "images")))
+        write_bytes(os.path.join(self.paths[1], "wide.png"), png_bytes(1200, 10))
+        os.utime(os.path.join(self.paths[1], "wide.png"), ns=(0, os.stat(os.path.join(self.paths[1], "wide.png")).st_mtime_ns + 1_000_000_000))
+        self.run_build()
+        cached = set(os.listdir(os.path.join(self.cache, "images")))
+        self.assertEqual(len(cached), len(old))
+        self.assertFalse(cached & old)
+
+    @unittest.skipIf(images.Image is None, "needs Pillow")
+    def test_palette_transparency_kept(self):
+        source = os.path.join(self.tmp.name, "dot.png")
+        image = images.Image.new("P", (20, 10))
+        image.putpalette([0, 0, 0, 255, 0, 0])
+        image.info["transparency"] = 0
+        image.save(source, transparency=0)
+        for extension in (".png", ".webp"):
+            cached = os.path.join(self.cache, f"dot{extension}")
+            images.render_derivative(source, cached, 10, 5, extension)
+            resized = images.Image.open(cached)
+            self.assertEqual(resized.mode, "RGBA")
+            self.assertEqual(resized.convert("RGBA").getpixel((0, 0))[3], 0)
+
+if __name__ == "__main__":
+    unittest.main()
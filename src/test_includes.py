@@ -0,0 +1,115 @@
+# My own unit test file for includes
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import includes
+from build import build
+from conversions import markdown_to_html_node
+from search import expand_terms
+from template import TemplateError, load_template
+from test_file_manip import write_file, read_file
+
+class TestIncludes(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        includes.clear()
+
+    def tearDown(self):
+        includes.end_page()
+        self.tmp.cleanup()
+
+    def test_markdown_include(self):
+        write_file(os.path.join(self.root, "_partials", "callout.md"), "**Note:** hobbits\n\n{% include \"sign.html\" %}")
+        write_file(os.path.join(self.root, "_partials", "sign.html"), "<em>Bilbo</em>")
+        includes.begin_page(os.path.join(self.root, "page.md"))
+        html = markdown_to_html_node("# Page\n\n{% include \"_partials/callout.md\" %}\n\n```\n{% include \"nope.md\" %}\n```").to_html()
+        self.assertEqual(html, "<div><h1>Page</h1><p><b>Note:</b> hobbits</p><em>Bilbo</em><pre><code>{% include \"nope.md\" %}</code></pre></div>")
+        self.assertEqual(includes.end_page(), {os.path.join(self.root, "_partials", "callout.md"), os.path.join(self.root, "_partials", "sign.html")})
+
+    def test_include_loop(self):
+        write_file(os.path.join(self.root, "a.md"), "{% include \"b.md\" %}")
+        write_file(os.path.join(self.root, "b.md"), "{% include \"a.md\" %}")
+        includes.begin_page(os.path.join(self.root, "page.md"))
+        with self.assertRaises(ValueError):
+            markdown_to_html_node("{% include \"a.md\" %}")
+
+    def test_template_include(self):
+        write_file(os.path.join(self.root, "partials", "nav.html"), "<nav>{{ Title }}</nav>")
+        write_file(os.path.join(self.root, "template.html"), "{% include \"partials/nav.html\" %}{{ Content }}")
+        template = load_template(os.path.join(self.root, "template.html"))
+        self.assertEqual(template.render({"Title": "Home", "Content": "<p>hi</p>"}), "<nav>Home</nav><p>hi</p>")
+        self.assertIn(os.path.join(self.root, "partials", "nav.html"), template.dependencies)
+        write_file(os.path.join(self.root, "loop.html"), "{% include \"loop.html\" %}")
+        with self.assertRaises(TemplateError):
+            load_template(os.path.join(self.root, "loop.html"))
+
+class TestIncludesBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.public = os.path.join(self.root, "public")
+        write_file(os.path.join(self.root, "template.html"), "{{ Content }}")
+        write_file(os.path.join(self.content, "_partials", "nav.md"), "[Home](/)")
+        write_file(os.path.join(self.content, "_partials", "footer.md"), "{% include \"nav.md\" %}\n\nThe end")
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\n{% include \"_partials/nav.md\" %}")
+        write_file(os.path.join(self.content, "blog", "index.md"), "# Blog\n\n{% include \"../_partials/footer.md\" %}")
+        write_file(os.path.join(self.content, "about.md"), "# About")
+        os.makedirs(os.path.join(self.root, "static"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_build(self, **kwargs):
+        return build(self.content, os.path.join(self.root, "static"), os.path.join(self.root, "template.html"), self.public, workers=1, cache_dir=os.path.join(self.root, ".cache"), **kwargs)
+
+    def edit(self, path, content):
+        write_file(path, content)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_partials_arent_pages(self):
+        self.assertEqual(len(self.run_build()), 3)
+        self.assertFalse(os.path.exists(os.path.join(self.public, "_partials")))
+        self.assertEqual(read_file(os.path.join(self.public, "blog", "index.html")), "<div><h1>Blog</h1><p><a href=\"/\" text=\"Home\" /></p><p>The end</p></div>")
+
+    def test_rendered_once(self):
+        with mock.patch("includes.conversions.iter_markdown_blocks", wraps=includes.conversions.iter_markdown_blocks) as blocks:
+            self.run_build()
+        # nav and footer once each, even though two pages use nav
+        self.assertEqual([call.args[0].name for call in blocks.call_args_list], [os.path.join(self.content, "_partials", "nav.md"), os.path.join(self.content, "_partials", "footer.md")])
+
+    def test_only_including_pages_rebuilt(self):
+        self.run_build()
+        self.assertEqual(self.run_build(), [])
+        # nav is in the home page directly and in the blog through footer, but not in about
+        self.edit(os.path.join(self.content, "_partials", "nav.md"), "[Start](/)")
+        rebuilt = sorted(os.path.relpath(dest, self.public) for source, dest in self.run_build())
+        self.assertEqual(rebuilt, [os.path.join("blog", "index.html"), "index.html"])
+        self.assertIn("Start", read_file(os.path.join(self.public, "blog", "index.html")))
+        self.edit(os.path.join(self.content, "_partials", "footer.md"), "Fin")
+        self.assertEqual([os.path.relpath(dest, self.public) for source, dest in self.run_build()], [os.path.join("blog", "index.html")])
+        # nav is now only used by the home page
+        self.edit(os.path.join(self.content, "_partials", "nav.md"), "[Again](/)")
+        self.assertEqual([os.path.relpath(dest, self.public) for source, dest in self.run_build()], ["index.html"])
+
+    def test_fragment_words_and_links(self):
+        self.edit(os.path.join(self.content, "_partials", "nav.md"), "Mithril [Missing](/nowhere)")
+        with self.assertLogs("build", "WARNING") as logs:
+            self.run_build(search=True, site_index=True)
+        # Through footer as well, so the blog gets them too
+        self.assertEqual(logs.output, ["WARNING:build:Broken link on /: /nowhere", "WARNING:build:Broken link on /blog/: /nowhere"])
+        links = json.loads(read_file(os.path.join(self.public, "links.json")))
+        self.assertEqual(links["/"]["broken"], ["/nowhere"])
+        docs = json.loads(read_file(os.path.join(self.public, "search", "docs.json")))
+        terms = expand_terms(json.loads(read_file(os.path.join(self.public, "search", "terms-m.json")))["terms"])
+        self.assertEqual(sorted(docs[doc_id][0] for doc_id in terms["mithril"]), ["/", "/blog/"])
+        self.assertFalse(os.path.exists(os.path.join(self.public, "search", "terms-i.json"))) # No "include" from the directive
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# My own unit test file for low-memory builds
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import memory
+from build import build
+from file_manip import find_pages, generate_pages
+from memory import Throttle
+from test_file_manip import write_file
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "reads /proc")
+class TestMeasure(unittest.TestCase):
+    def test_peak(self):
+        self.assertGreater(memory.rss(), 0)
+        memory.reset_peak()
+        before = memory.peak_rss()
+        block = bytearray(64 << 20)
+        for i in range(0, len(block), 4096):
+            block[i] = 1 # Touch every page so it's really resident
+        self.assertGreaterEqual(memory.peak_rss() - before, 60 << 20)
+        del block
+        memory.release()
+
+@unittest.skipIf(memory.resource is None, "no resource module")
+class TestPeakFallback(unittest.TestCase):
+    def test_units(self): # Without /proc, ru_maxrss is kilobytes on Linux but already bytes on macOS
+        usage = mock.Mock(ru_maxrss=2048)
+        with mock.patch("builtins.open", side_effect=OSError), mock.patch.object(memory.resource, "getrusage", return_value=usage):
+            for platform, expected in (("linux", 2048 * 1024), ("darwin", 2048)):
+                with mock.patch.object(memory.sys, "platform", platform):
+                    self.assertEqual(memory.peak_rss(), expected)
+
+class TestThrottle(unittest.TestCase):
+    def test_limit(self):
+        throttle = Throttle(budget=1 << 40, workers=4)
+        throttle.usage = {1: 0}
+        throttle.update(1, 1 << 41) # One worker alone is over budget
+        throttle.update(1, 1 << 41)
+        self.assertEqual(throttle.limit, 2)
+        for _ in range(5):
+            throttle.update(1, 1 << 20)
+        self.assertEqual(throttle.limit, 4)
+        for _ in range(10):
+            throttle.update(1, 1 << 41)
+        self.assertEqual(throttle.limit, 1)
+
+class TestBudgetBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.template = os.path.join(self.root, "template.html")
+        write_file(self.template, "{{ Content }}")
+        for i in range(6):
+            write_file(os.path.join(self.root, "content", f"page{i}.md"), f"# Page {i}\n\n" + "Some **bold** text. " * 50)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pages_report_peak(self):
+        pages = find_pages(os.path.join(self.root, "content"), os.path.join(self.root, "public"))
+        for workers in (1, 2):
+            results = generate_pages(pages, self.template, workers=workers, options={"memory_budget": 1 << 30, "io_threads": 2})
+            self.assertEqual(sorted(result["source"] for result in results), sorted(page[0] for page in pages))
+            for result in results:
+                self.assertGreater(result["peak_rss"], 0)
+                self.assertIn("rss", result)
+            for source, dest in pages:
+                self.assertTrue(os.path.exists(dest))
+
+    def test_every_peak_logged(self):
+        os.makedirs(os.path.join(self.root, "static"))
+        with self.assertLogs("build", "DEBUG") as logs:
+            build(os.path.join(self.root, "content"), os.path.join(self.root, "static"), self.template, os.path.join(self.root, "public"), workers=1, cache_dir=os.path.join(self.root, ".cache"), memory_budget=1 << 30)
+        self.assertEqual(sum("Peak memory" in line for line in logs.output), 6)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+# My own unit test file for minification
+
+import os
+import tempfile
+import unittest
+
+import htmlnode
+from build import build
+from conversions import markdown_to_html_node
+from flatdoc import markdown_to_flat_document
+from minify import minify_css, minify_html_text
+from test_file_manip import read_file, write_file
+
+class TestMinify(unittest.TestCase):
+    def test_html_text(self):
+        text = "<head>\n    <!-- a comment -->\n    <link href=\"/index.css\" rel=\"stylesheet\" />\n</head>"
+        self.assertEqual(minify_html_text(text), "<head><link href=/index.css rel=stylesheet /></head>")
+
+    def test_html_text_keeps_pre(self):
+        text = "<div>\n  <pre>a\n    b</pre>\n</div>"
+        self.assertEqual(minify_html_text(text), "<div><pre>a\n    b</pre></div>")
+
+    def test_css(self):
+        css = "/* colours */\nbody {\n    color: #fff;\n    font-family: \"Luminari  Pro\", serif;\n}\n"
+        self.assertEqual(minify_css(css), "body{color:#fff;font-family:\"Luminari  Pro\",serif}")
+
+    def test_serializer(self):
+        md = "Some   _spaced_\ntext with ![an image](/a.png)\n\n```\ncode   stays\n  put\n```"
+        htmlnode.minify = True
+        try:
+            tree = markdown_to_html_node(md).to_html()
+            flat = markdown_to_flat_document(md).to_html()
+        finally:
+            htmlnode.minify = False
+        self.assertEqual(tree, "<div><p>Some <i>spaced</i> text with <img src=/a.png alt=\"an image\"></p><pre><code>code   stays\n  put</code></pre></div>")
+        self.assertEqual(flat, tree)
+
+class TestMinifyBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        write_file(os.path.join(self.root, "content", "index.md"), "# Hobbits\n\nSecond   breakfast\n\n```\n  elevenses\n```")
+        write_file(os.path.join(self.root, "static", "index.css"), "body {\n    color: red;\n}\n")
+        write_file(os.path.join(self.root, "template.html"), "<html>\n  <title>{{ Title }}</title>\n  <body>{{ Content }}</body>\n</html>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_build(self, minify):
+        return build(*[os.path.join(self.root, name) for name in ("content", "static", "template.html", "public")], workers=1, cache_dir=os.path.join(self.root, ".cache"), minify=minify)
+
+    def test_toggle(self):
+        self.run_build(True)
+        page = read_file(os.path.join(self.root, "public", "index.html"))
+        self.assertEqual(page, "<html><title>Hobbits</title><body><div><h1>Hobbits</h1><p>Second breakfast</p><pre><code>  elevenses</code></pre></div></body></html>")
+        self.assertEqual(read_file(os.path.join(self.root, "public", "index.css")), "body{color:red}")
+        # Turning minify off rebuilds everything, even though no source changed
+        self.assertEqual(len(self.run_build(False)), 1)
+        self.assertIn("\n  <title>", read_file(os.path.join(self.root, "public", "index.html")))
+        self.assertEqual(read_file(os.path.join(self.root, "public", "index.css")), "body {\n    color: red;\n}\n")
+        self.assertEqual(read_file(os.path.join(self.root, "static", "index.css")), "body {\n    color: red;\n}\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# My own unit test file for the read/render/write pipeline
+
+import os
+import tempfile
+import threading
+import unittest
+
+import file_manip
+from file_manip import find_pages, generate_pages
+from pipeline import run_pipeline
+from test_file_manip import write_file, read_file
+
+class TestPipeline(unittest.TestCase):
+    def test_results(self):
+        written = {}
+        results = run_pipeline(range(20), lambda item: item * 2, lambda item, data: (data + 1, str(data)), written.__setitem__, readers=3, writers=2)
+        self.assertEqual(sorted(results), [item * 2 + 1 for item in range(20)])
+        self.assertEqual(written, {item: str(item * 2) for item in range(20)})
+
+    def test_backpressure(self):
+        lock = threading.Lock()
+        counts = {"read": 0, "processed": 0, "most_ahead": 0}
+        def read(item):
+            with lock:
+                counts["read"] += 1
+                counts["most_ahead"] = max(counts["most_ahead"], counts["read"] - counts["processed"])
+            return item
+        def process(item, data):
+            with lock:
+                counts["processed"] += 1
+            return item, None
+        run_pipeline(range(200), read, process, None, readers=2, writers=1, depth=4)
+        # depth items queued, one being processed and one more waiting in each reader
+        self.assertLessEqual(counts["most_ahead"], 4 + 1 + 2)
+
+    def test_errors(self):
+        def fail(*args):
+            raise ValueError("bad page")
+        with self.assertRaises(ValueError):
+            run_pipeline(range(50), fail, lambda item, data: (item, data), lambda item, output: None)
+        with self.assertRaises(ValueError):
+            run_pipeline(range(50), lambda item: item, fail, lambda item, output: None)
+        with self.assertRaises(ValueError):
+            run_pipeline(range(50), lambda item: item, lambda item, data: (item, data), fail)
+
+class TestPipelinedPages(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.template = os.path.join(self.root, "template.html")
+        write_file(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        for i in range(12):
+            write_file(os.path.join(self.root, "content", f"page{i}", "index.md"), f"# Page {i}\n\nSome **bold** text\n\n- one\n- two")
+        self.limit = file_manip.PREFETCH_LIMIT
+
+    def tearDown(self):
+        file_manip.PREFETCH_LIMIT = self.limit
+        self.tmp.cleanup()
+
+    def test_same_output(self):
+        file_manip.PREFETCH_LIMIT = 30 # Half the pages get streamed instead of read ahead
+        write_file(os.path.join(self.root, "content", "page0", "index.md"), "# Page 0\n\n" + "A much longer paragraph. " * 10)
+        plain = find_pages(os.path.join(self.root, "content"), os.path.join(self.root, "plain"))
+        piped = find_pages(os.path.join(self.root, "content"), os.path.join(self.root, "piped"))
+        generate_pages(plain, self.template, workers=1)
+        results = generate_pages(piped, self.template, workers=1, options={"io_threads": 2, "search": True})
+        self.assertEqual(sorted(result["title"] for result in results), sorted(f"Page {i}" for i in range(12)))
+        self.assertNotIn("chunks", results[0])
+        for (source, plain_dest), (source, piped_dest) in zip(plain, piped):
+            self.assertEqual(read_file(piped_dest), read_file(plain_dest))
+
+if __name__ == "__main__":
+    unittest.main()
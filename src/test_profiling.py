@@ -0,0 +1,37 @@
+# My own unit test file for build profiling
+
+import unittest
+
+from profiling import Profiler, format_report, stage
+
+class TestProfiling(unittest.TestCase):
+    def test_add_and_take(self):
+        profiler = Profiler()
+        profiler.add("parse", 0.5, 2, 100)
+        profiler.merge({"parse": {"seconds": 0.25, "calls": 1, "bytes": 10}})
+        self.assertEqual(profiler.take(), {"parse": {"seconds": 0.75, "calls": 3, "bytes": 110}})
+        self.assertEqual(profiler.stages, {})
+
+    def test_stage_without_profiler(self):
+        with stage(None, "nothing"):
+            pass
+
+    def test_stage_counts_calls(self):
+        profiler = Profiler()
+        for _ in range(3):
+            with stage(profiler, "write", 5):
+                pass
+        self.assertEqual(profiler.stages["write"]["calls"], 3)
+        self.assertEqual(profiler.stages["write"]["bytes"], 15)
+
+    def test_format_report(self):
+        report = {"wall_seconds": 1.0, "build_stages": {}, "page_stages": {}, "pages": [
+            {"source": "slow.md", "seconds": 0.5, "bytes": 2048},
+            {"source": "fast.md", "seconds": 0.1, "bytes": 1024},
+        ]}
+        lines = format_report(report, top=1).split("\n")
+        self.assertIn("Slowest 1 pages:", lines)
+        self.assertTrue(lines[-1].endswith("slow.md"))
+
+if __name__ == "__main__":
+    unittest.main()
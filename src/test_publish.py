@@ -0,0 +1,77 @@
+# My own unit test file for atomic publishing
+
+import os
+import tempfile
+import unittest
+
+from build import build
+from publish import builds_dir, list_builds, live_build, rollback
+from test_file_manip import write_file, read_file
+
+class TestPublish(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.public = os.path.join(self.root, "public")
+        write_file(os.path.join(self.root, "template.html"), "{{ Content }}")
+        write_file(os.path.join(self.content, "index.md"), "# Home")
+        write_file(os.path.join(self.content, "blog", "index.md"), "# Blog")
+        write_file(os.path.join(self.root, "static", "index.css"), "body {}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_build(self, keep_builds=3):
+        return build(self.content, os.path.join(self.root, "static"), os.path.join(self.root, "template.html"), self.public, workers=1, cache_dir=os.path.join(self.root, ".cache"), keep_builds=keep_builds)
+
+    def edit(self, content):
+        path = os.path.join(self.content, "index.md")
+        write_file(path, content)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_publish(self):
+        self.run_build(keep_builds=0) # A plain public/ from before publishing was turned on
+        self.run_build()
+        self.assertTrue(os.path.islink(self.public))
+        first = live_build(self.public)
+        first_dir = os.path.join(builds_dir(self.public), first)
+        self.edit("# Home again")
+        self.assertEqual(len(self.run_build()), 1)
+        second = live_build(self.public)
+        self.assertNotEqual(second, first)
+        self.assertEqual(read_file(os.path.join(self.public, "index.html")), "<div><h1>Home again</h1></div>")
+        # The old build is untouched, and files that didn't change are shared with it
+        self.assertEqual(read_file(os.path.join(first_dir, "index.html")), "<div><h1>Home</h1></div>")
+        self.assertTrue(os.path.samefile(os.path.join(first_dir, "blog", "index.html"), os.path.join(self.public, "blog", "index.html")))
+        self.assertFalse(os.path.exists(self.public + ".staging"))
+
+    def test_keep_builds(self):
+        for i in range(4):
+            self.edit(f"# Home {i}")
+            self.run_build(keep_builds=2)
+        self.assertEqual(len(list_builds(self.public)), 2)
+        self.assertEqual(live_build(self.public), list_builds(self.public)[-1])
+
+    def test_rollback(self):
+        self.run_build()
+        self.edit("# Home again")
+        self.run_build()
+        rollback(self.public)
+        self.assertEqual(read_file(os.path.join(self.public, "index.html")), "<div><h1>Home</h1></div>")
+        # The manifest described the build we rolled away from, so the next build redoes everything
+        self.assertEqual(len(self.run_build()), 2)
+        self.assertEqual(read_file(os.path.join(self.public, "index.html")), "<div><h1>Home again</h1></div>")
+
+    def test_failed_build_keeps_live_site(self):
+        self.run_build()
+        live = live_build(self.public)
+        write_file(os.path.join(self.root, "template.html"), "{% block %}")
+        with self.assertRaises(ValueError):
+            self.run_build()
+        self.assertEqual(live_build(self.public), live)
+        self.assertEqual(read_file(os.path.join(self.public, "index.html")), "<div><h1>Home</h1></div>")
+
+if __name__ == "__main__":
+    unittest.main()
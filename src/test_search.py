@@ -0,0 +1,95 @@
+# My own unit test file for the search index
+
+import json
+import os
+import tempfile
+import unittest
+
+from build import build
+from search import SEARCH_SCRIPT, block_terms, compress_terms, expand_terms, page_url
+from test_file_manip import write_file, read_file
+
+class TestSearchTerms(unittest.TestCase):
+    def test_block_terms(self):
+        self.assertEqual(block_terms("A **Hobbit** [hole](/the/shire) in _the_ ground"), ["hobbit", "hole", "in", "the", "ground"])
+
+    def test_compress_roundtrip(self):
+        postings = {"tolkien": {0: 5, 3: 1}, "tom": {2: 1}, "to": {0: 1, 1: 2, 7: 1}}
+        entries = compress_terms(postings)
+        self.assertEqual(entries, [[0, "to", [0, 1, 1, 2, 6, 1]], [2, "lkien", [0, 5, 3, 1]], [2, "m", [2, 1]]])
+        self.assertEqual(expand_terms(entries), postings)
+
+    def test_page_url(self):
+        self.assertEqual(page_url(os.path.join("public", "blog", "tom", "index.html"), "public"), "/blog/tom/")
+        self.assertEqual(page_url(os.path.join("public", "index.html"), "public"), "/")
+
+class TestSearchBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.public = os.path.join(self.root, "public")
+        write_file(os.path.join(self.root, "template.html"), "{{ Content }}")
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\nWelcome hobbits")
+        write_file(os.path.join(self.content, "blog", "index.md"), "# Blog\n\nWizards [arrive](/zebra)")
+        os.makedirs(os.path.join(self.root, "static"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_build(self, search=True):
+        return build(self.content, os.path.join(self.root, "static"), os.path.join(self.root, "template.html"), self.public, workers=1, cache_dir=os.path.join(self.root, ".cache"), search=search)
+
+    def shard(self, key):
+        return expand_terms(json.loads(read_file(os.path.join(self.public, "search", f"terms-{key}.json")))["terms"])
+
+    def test_index(self):
+        self.run_build()
+        docs = json.loads(read_file(os.path.join(self.public, "search", "docs.json")))
+        self.assertEqual(sorted(docs), [["/", "Home"], ["/blog/", "Blog"]])
+        home = docs.index(["/", "Home"])
+        self.assertEqual(self.shard("h"), {"home": {home: 1}, "hobbits": {home: 1}})
+        self.assertFalse(os.path.exists(os.path.join(self.public, "search", "terms-z.json")))
+
+    def test_incremental(self):
+        self.run_build()
+        path = os.path.join(self.content, "index.md")
+        write_file(path, "# Home\n\nHello hobbits")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.run_build()
+        home = json.loads(read_file(os.path.join(self.public, "search", "docs.json"))).index(["/", "Home"])
+        self.assertEqual(self.shard("h")["hello"], {home: 1})
+        # "welcome" left the w shard, so it was rewritten, but the b shard wasn't touched
+        self.assertEqual(list(self.shard("w")), ["wizards"])
+        b_shard = os.path.join(self.public, "search", "terms-b.json")
+        os.utime(b_shard, (0, 0))
+        os.remove(path)
+        self.run_build()
+        self.assertEqual(os.path.getmtime(b_shard), 0)
+        # Every h word was on the removed page
+        self.assertFalse(os.path.exists(os.path.join(self.public, "search", "terms-h.json")))
+
+    def test_noop_leaves_files_alone(self):
+        self.run_build()
+        state = os.path.join(self.root, ".cache", "search.json")
+        os.utime(state, (0, 0))
+        self.assertEqual(self.run_build(), [])
+        self.assertEqual(os.path.getmtime(state), 0)
+
+    def test_old_script_replaced(self):
+        self.run_build()
+        script = os.path.join(self.public, "search", "search.js")
+        write_file(script, "// search.js from an older build")
+        self.run_build()
+        self.assertEqual(read_file(script), SEARCH_SCRIPT)
+
+    def test_turned_off(self):
+        self.run_build()
+        self.assertEqual(self.run_build(search=False), [])
+        self.assertFalse(os.path.exists(os.path.join(self.public, "search")))
+        # Turning it back on has to read every page again
+        self.assertEqual(len(self.run_build()), 2)
+
+if __name__ == "__main__":
+    unittest.main()
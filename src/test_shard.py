@@ -0,0 +1,102 @@
+# My own unit test file for sharded builds and merging them
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from file_manip import find_pages, walk_files
+from shard import assign_shards, merge_shards, parse_shard, shard_dir
+from test_file_manip import write_file, read_file
+
+SOURCE = os.path.dirname(os.path.abspath(__file__))
+
+class TestAssignShards(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.path.join(self.tmp.name, "content")
+        for i in range(40):
+            write_file(os.path.join(self.content, f"page{i}.md"), "# Page\n\n" + "word " * (i * 37 % 500))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for text in ("0/4", "5/4", "two/4", "1"):
+            with self.assertRaises(ValueError):
+                parse_shard(text)
+
+    def test_balanced(self):
+        pages = find_pages(self.content, "public")
+        shards = assign_shards(pages, self.content, 4)
+        self.assertEqual(set(shards.values()), {1, 2, 3, 4})
+        loads = [sum(os.path.getsize(source) for source in shards if shards[source] == index) for index in (1, 2, 3, 4)]
+        self.assertLess(max(loads), sum(loads) / 4 * 1.2)
+
+    def test_stable(self):
+        pages = find_pages(self.content, "public")
+        before = assign_shards(pages, self.content, 4)
+        # Same split from another checkout, and mostly the same split after a page is added
+        moved_tree = os.path.join(self.tmp.name, "elsewhere")
+        shutil.copytree(self.content, moved_tree)
+        elsewhere = assign_shards(find_pages(moved_tree, "public"), moved_tree, 4)
+        self.assertEqual([before[source] for source in sorted(before)], [elsewhere[os.path.join(moved_tree, os.path.relpath(source, self.content))] for source in sorted(before)])
+        write_file(os.path.join(self.content, "new.md"), "# New")
+        after = assign_shards(find_pages(self.content, "public"), self.content, 4)
+        self.assertLess(sum(before[source] != after[source] for source in before), 10)
+
+class TestShardedBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        write_file(os.path.join(self.root, "template.html"), "<title>{{ Title }}</title>{{ Content }}")
+        write_file(os.path.join(self.root, "static", "index.css"), "body {}")
+        for i in range(8):
+            write_file(os.path.join(self.root, "content", f"page{i}", "index.md"), f"# Page {i}\n\nSee [the next page](/page{(i + 1) % 8}/) and [nowhere](/gone/).")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def main(self, *argv):
+        return subprocess.run([sys.executable, os.path.join(SOURCE, "main.py"), *argv], cwd=self.root, capture_output=True, text=True)
+
+    def test_shards_merge_into_the_whole_site(self):
+        for index in (1, 2, 3):
+            result = self.main("--shard", f"{index}/3", "--search", "-j", "1")
+            self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Built 0 of", self.main("--shard", "2/3", "--search", "-j", "1", "-v").stderr)
+        result = self.main("merge", "-v")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        # A link into another shard isn't broken. Only the missing page is
+        self.assertEqual(result.stderr.count("Broken link"), 8)
+        self.assertIn("Merged 3 shards: 8 pages", result.stderr)
+
+        whole = os.path.join(self.root, "whole")
+        self.assertEqual(self.main("-j", "1", "--search", "--site-index").returncode, 0)
+        os.rename(os.path.join(self.root, "public"), whole)
+        self.assertEqual(self.main("merge").returncode, 0)
+        merged = os.path.join(self.root, "public")
+        self.assertEqual(sorted(os.path.relpath(path, merged) for path in walk_files(merged)), sorted(os.path.relpath(path, whole) for path in walk_files(whole)))
+        for name in ("page3/index.html", "index.css", "links.json"):
+            self.assertEqual(read_file(os.path.join(merged, name)), read_file(os.path.join(whole, name)))
+        docs = json.loads(read_file(os.path.join(merged, "search", "docs.json")))
+        self.assertEqual(sorted(doc[1] for doc in docs), [f"Page {i}" for i in range(8)])
+
+    def test_missing_shard(self):
+        self.assertEqual(self.main("--shard", "1/2", "-j", "1").returncode, 0)
+        with self.assertRaises(ValueError):
+            merge_shards(os.path.join(self.root, "public"), os.path.join(self.root, ".cache"))
+        self.assertTrue(os.path.exists(os.path.join(shard_dir(os.path.join(self.root, "public"), 1), ".shard.json")))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "public")))
+
+    def test_shard_rejects_keep_builds(self):
+        result = self.main("--shard", "1/2", "--keep-builds", "3")
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("merge", result.stderr)
+
+if __name__ == "__main__":
+    unittest.main()
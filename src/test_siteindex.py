@@ -0,0 +1,82 @@
+# My own unit test file for the site index
+
+import json
+import os
+import tempfile
+import unittest
+
+from build import build
+from siteindex import SiteIndex, collect_links, internal_url
+from test_file_manip import write_file, read_file
+
+class TestSiteIndex(unittest.TestCase):
+    def test_internal_url(self):
+        self.assertEqual(internal_url("/blog/tom", "/"), "/blog/tom")
+        self.assertEqual(internal_url("../majesty/#top", "/blog/tom/"), "/blog/majesty/")
+        self.assertEqual(internal_url("notes.html", "/blog/tom.html"), "/blog/notes.html")
+        self.assertIsNone(internal_url("https://boot.dev", "/"))
+        self.assertIsNone(internal_url("mailto:bilbo@shire.me", "/"))
+        self.assertIsNone(internal_url("#section", "/"))
+
+    def test_collect_links(self):
+        links = []
+        blocks = ["a [link](/x) and ![image](/y.png)", "```\n[not a link](/z)\n```"]
+        self.assertEqual(list(collect_links(blocks, links)), blocks)
+        self.assertEqual(links, ["/x"])
+
+    def test_link_graph(self):
+        tmp = tempfile.TemporaryDirectory()
+        site = SiteIndex(os.path.join(tmp.name, "site.json"))
+        write_file(os.path.join(tmp.name, "public", "style.css"), "")
+        site.update("/", "Home", {}, ["/blog", "/style.css", "/missing", "https://boot.dev"], 0)
+        site.update("/blog/", "Blog", {}, ["../"], 0)
+        graph = site.link_graph(os.path.join(tmp.name, "public"))
+        self.assertEqual(graph["/"], {"title": "Home", "links": ["/blog/"], "backlinks": ["/blog/"], "broken": ["/missing"]})
+        self.assertEqual(graph["/blog/"]["backlinks"], ["/"])
+        tmp.cleanup()
+
+class TestSiteIndexBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.public = os.path.join(self.root, "public")
+        write_file(os.path.join(self.root, "template.html"), "{{ Content }}")
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\n[Tom](/blog/tom) and [Gandalf](/blog/gandalf)")
+        write_file(os.path.join(self.content, "blog", "tom", "index.md"), "---\ndate: 2024-03-01\ndescription: Old Tom & his songs\n---\n# Tom\n\n[Home](/)")
+        os.makedirs(os.path.join(self.root, "static"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_build(self, **kwargs):
+        return build(self.content, os.path.join(self.root, "static"), os.path.join(self.root, "template.html"), self.public, workers=1, cache_dir=os.path.join(self.root, ".cache"), site_index=True, **kwargs)
+
+    def test_outputs(self):
+        with self.assertLogs("build", "WARNING") as logs:
+            self.run_build(site_url="https://example.com/")
+        self.assertEqual(logs.output, ["WARNING:build:Broken link on /: /blog/gandalf"])
+        self.assertIn("<loc>https://example.com/blog/tom/</loc><lastmod>2024-03-01</lastmod>", read_file(os.path.join(self.public, "sitemap.xml")))
+        feed = read_file(os.path.join(self.public, "feed.xml"))
+        self.assertIn("<title>Home</title>", feed)
+        self.assertIn("<description>Old Tom &amp; his songs</description>", feed)
+        self.assertIn("<pubDate>Fri, 01 Mar 2024 00:00:00 +0000</pubDate>", feed)
+
+    def test_unchanged_pages_kept(self):
+        self.run_build()
+        self.assertFalse(os.path.exists(os.path.join(self.public, "sitemap.xml")))
+        # A new page fixes the broken link, and the index still knows about the pages that weren't rebuilt
+        write_file(os.path.join(self.content, "blog", "gandalf", "index.md"), "# Gandalf")
+        self.assertEqual(len(self.run_build()), 1)
+        graph = json.loads(read_file(os.path.join(self.public, "links.json")))
+        self.assertEqual(graph["/"]["links"], ["/blog/tom/", "/blog/gandalf/"])
+        self.assertEqual(graph["/blog/gandalf/"]["backlinks"], ["/"])
+        self.assertEqual(graph["/"]["broken"], [])
+
+    def test_turned_off(self):
+        self.run_build(site_url="https://example.com")
+        build(self.content, os.path.join(self.root, "static"), os.path.join(self.root, "template.html"), self.public, workers=1, cache_dir=os.path.join(self.root, ".cache"))
+        self.assertEqual([name for name in ("sitemap.xml", "feed.xml", "links.json") if os.path.exists(os.path.join(self.public, name))], [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# My own unit test file for templates
+
+import os
+import tempfile
+import unittest
+
+from template import Slot, Template, TemplateError, load_template
+from file_manip import render_page
+from test_file_manip import write_file
+
+class TestTemplate(unittest.TestCase):
+    def test_segments(self):
+        template = Template("<title>{{ Title }}</title>{{Content}}!")
+        self.assertEqual(template.segments, ["<title>", Slot("Title"), "</title>", Slot("Content"), "!"])
+
+    def test_render_variables(self):
+        template = Template("{{ greeting }}, {{ name }}{{ missing }}.")
+        self.assertEqual(template.render({"greeting": "Hello", "name": "Frodo"}), "Hello, Frodo.")
+
+    def test_streamed_value(self):
+        template = Template("<main>{{ Content }}</main>")
+        self.assertEqual(template.render({"Content": lambda write: write("streamed")}), "<main>streamed</main>")
+
+    def test_unclosed_block(self):
+        with self.assertRaises(TemplateError):
+            Template("{% block head %}oops")
+
+    def test_front_matter_variables(self):
+        md = "---\nauthor: Tolkien\nTitle: Custom\n---\n# Heading\n\ntext"
+        html = render_page(md, "{{ Title }} by {{ author }}: {{ Content }}")
+        self.assertEqual(html, "Custom by Tolkien: <div><h1>Heading</h1><p>text</p></div>")
+
+    def test_front_matter_cannot_replace_content(self):
+        self.assertEqual(render_page("---\nContent: gone\n---\n# Kept", "{{ Content }}"), "<div><h1>Kept</h1></div>")
+
+    def test_unclosed_front_matter_is_content(self):
+        self.assertEqual(render_page("---\n# Title", "{{ Title }}"), "Title")
+
+class TestTemplateFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, "base.html")
+        self.page = os.path.join(self.tmp.name, "page.html")
+        write_file(self.base, "<head>{% block head %}<title>{{ Title }}</title>{% endblock %}</head><body>{{ body }}</body>")
+        write_file(self.page, "{% extends \"base.html\" %}{% block body %}<main>{{ Content }}</main>{% endblock %}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_inheritance(self):
+        template = load_template(self.page)
+        self.assertEqual(template.render({"Title": "T", "Content": "C"}), "<head><title>T</title></head><body><main>C</main></body>")
+        self.assertEqual(template.dependencies, [os.path.normpath(self.page), os.path.normpath(self.base)])
+
+    def test_cache_and_reload(self):
+        first = load_template(self.page)
+        self.assertIs(load_template(self.page), first)
+        write_file(self.base, "{{ body }}")
+        stat = os.stat(self.base)
+        os.utime(self.base, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        reloaded = load_template(self.page)
+        self.assertIsNot(reloaded, first)
+        self.assertEqual(reloaded.render({"Content": "C"}), "<main>C</main>")
+
+    def test_deleted_layout(self):
+        load_template(self.page)
+        write_file(self.page, "<main>{{ Content }}</main>")
+        os.remove(self.base)
+        self.assertEqual(load_template(self.page).render({"Content": "C"}), "<main>C</main>")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -25,5 +25,9 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("I definitely have a link trust me", TextType.LINK_TEXT, "https://docs.python.org/3/reference/datamodel.html#object.__eq__")
         self.assertNotEqual(node, node2)
 
+    def test_no_instance_dict(self):
+        node = TextNode("I'm slim", TextType.NORMAL_TEXT)
+        self.assertFalse(hasattr(node, "__dict__"))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
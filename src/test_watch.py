@@ -0,0 +1,78 @@
+# My own unit test file for watch mode
+
+import os
+import tempfile
+import unittest
+
+from build import build
+from watch import SiteWatcher
+from test_file_manip import write_file, read_file
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.static = os.path.join(root, "static")
+        self.public = os.path.join(root, "public")
+        self.template = os.path.join(root, "template.html")
+        write_file(self.template, "{{ Title }}|{{ Content }}")
+        write_file(os.path.join(self.content, "index.md"), "# Home")
+        write_file(os.path.join(self.content, "about.md"), "# About")
+        write_file(os.path.join(self.static, "index.css"), "body {}")
+        self.watcher = SiteWatcher(self.content, self.static, self.template, self.public, os.path.join(root, ".cache"), workers=1)
+        self.watcher.full_build()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def edit(self, path, content):
+        write_file(path, content)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_nothing_changed(self):
+        self.assertEqual(self.watcher.poll(), ([], []))
+
+    def test_edited_page(self):
+        about = os.path.join(self.content, "about.md")
+        self.edit(about, "# About us")
+        changed, removed = self.watcher.poll()
+        self.assertEqual((changed, removed), ([about], []))
+        index_mtime = os.stat(os.path.join(self.public, "index.html")).st_mtime_ns
+        self.watcher.rebuild(changed, removed)
+        self.assertEqual(read_file(os.path.join(self.public, "about.html")), "About us|<div><h1>About us</h1></div>")
+        self.assertEqual(os.stat(os.path.join(self.public, "index.html")).st_mtime_ns, index_mtime)
+
+    def test_removed_and_added(self):
+        os.remove(os.path.join(self.content, "about.md"))
+        write_file(os.path.join(self.static, "new.css"), "p {}")
+        self.watcher.rebuild(*self.watcher.poll())
+        self.assertFalse(os.path.exists(os.path.join(self.public, "about.html")))
+        self.assertEqual(read_file(os.path.join(self.public, "new.css")), "p {}")
+
+    def test_template_change_rebuilds_everything(self):
+        self.edit(self.template, "[{{ Title }}]")
+        self.watcher.rebuild(*self.watcher.poll())
+        self.assertEqual(read_file(os.path.join(self.public, "index.html")), "[Home]")
+        self.assertEqual(read_file(os.path.join(self.public, "about.html")), "[About]")
+
+    def test_edited_fragment(self):
+        note = os.path.join(self.content, "_partials", "note.md")
+        write_file(note, "Old note")
+        self.edit(os.path.join(self.content, "about.md"), "# About\n\n{% include \"_partials/note.md\" %}")
+        self.watcher.rebuild(*self.watcher.poll())
+        self.edit(note, "New note")
+        self.watcher.rebuild(*self.watcher.poll())
+        self.assertEqual(read_file(os.path.join(self.public, "about.html")), "About|<div><h1>About</h1><p>New note</p></div>")
+        self.assertFalse(os.path.exists(os.path.join(self.public, "_partials")))
+        # What watch mode recorded still lets a plain build find the page behind the fragment
+        self.edit(note, "Newer note")
+        self.assertEqual(build(self.content, self.static, self.template, self.public, workers=1, cache_dir=self.watcher.cache_dir), [(os.path.join(self.content, "about.md"), os.path.join(self.public, "about.html"))])
+        self.watcher.full_build()
+        os.remove(note)
+        with self.assertRaises(FileNotFoundError): # The page can't render without its fragment, so it has to have been tried
+            self.watcher.rebuild(*self.watcher.poll())
+
+if __name__ == "__main__":
+    unittest.main()
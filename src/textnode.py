@@ -9,6 +9,8 @@ class TextType(Enum):
     IMAGE_TEXT = "image"
 
 class TextNode:
+    __slots__ = ("text", "text_type", "url") # No per-object dict: long pages make hundreds of thousands of these
+
     def __init__(self, text, text_type, url=None):
         self.text = text
         self.text_type = text_type
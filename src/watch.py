@@ -0,0 +1,129 @@
+# Watch mode: serves public/ and rebuilds only what changed, from one long-lived process
+
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from build import build, remove_outputs
+from file_manip import asset_destination, copy_files, generate_pages, is_partial, page_destination, walk_files
+from manifest import BuildManifest
+from template import TemplateError, load_template
+
+log = logging.getLogger(__name__)
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args): # Every request printing a line would drown out the rebuild messages
+        pass
+
+def start_server(directory, port): # Serves directory on a background thread and returns the server
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def stat_files(paths): # path -> (size, mtime) for every file under the given files and directories
+    stats = {}
+    for root in paths:
+        files = [root] if os.path.isfile(root) else walk_files(root)
+        for path in files:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError: # Deleted between listing and stat
+                continue
+            stats[path] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+class SiteWatcher:
+    def __init__(self, content_dir="content", static_dir="static", template_path="template.html", dest_dir="public", cache_dir=".cache", workers=None):
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.dest_dir = dest_dir
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.manifest = None
+        self.stats = {}
+
+    def watched_paths(self):
+        try:
+            templates = load_template(self.template_path).dependencies
+        except (OSError, TemplateError): # Mid-edit templates can be broken, keep watching the main one until it's fixed
+            templates = [self.template_path]
+        return [self.content_dir, self.static_dir] + templates
+
+    def full_build(self):
+        build(self.content_dir, self.static_dir, self.template_path, self.dest_dir, self.workers, cache_dir=self.cache_dir)
+        # Keep the manifest in memory from here on, so small rebuilds don't reload it
+        self.manifest = BuildManifest(os.path.join(self.cache_dir, "manifest.json"))
+        self.stats = stat_files(self.watched_paths())
+
+    def poll(self): # Returns the files that changed or appeared, and the ones that disappeared, since the last poll
+        stats = stat_files(self.watched_paths())
+        changed = [path for path, stat in stats.items() if self.stats.get(path) != stat]
+        removed = [path for path in self.stats if path not in stats]
+        self.stats = stats
+        return changed, removed
+
+    def is_under(self, path, directory):
+        return os.path.commonpath([os.path.abspath(path), os.path.abspath(directory)]) == os.path.abspath(directory)
+
+    def rebuild(self, changed, removed): # Rebuilds just the pages and assets behind the changed files
+        templates = set(self.watched_paths()[2:])
+        if any(path in templates for path in changed + removed):
+            self.full_build()
+            return
+        pages = []
+        assets = []
+        for path in changed:
+            if self.is_page(path):
+                pages.append((path, page_destination(path, self.content_dir, self.dest_dir)))
+            elif self.is_under(path, self.static_dir):
+                assets.append((path, asset_destination(path, self.static_dir, self.dest_dir)))
+        stale_outputs = []
+        for path in removed:
+            # Anything else under content/ is a fragment at most, which changed_includes below takes care of
+            section = "pages" if self.is_page(path) else "assets" if self.is_under(path, self.static_dir) else None
+            output = self.manifest.forget(section, path) if section else None
+            if output:
+                stale_outputs.append(output)
+        remove_outputs(stale_outputs, self.dest_dir)
+        # The manifest still compares content hashes, so saving a file without editing it costs nothing
+        copy_files(self.manifest.changed("assets", assets))
+        changed_pages = self.manifest.changed("pages", pages)
+        # Pages that include a fragment that changed or went away need redoing too
+        known_pages = [(source, entry["dest"]) for source, entry in self.manifest.sections["pages"].items()]
+        already = set(changed_pages)
+        changed_pages += [page for page in self.manifest.changed_includes(known_pages) if page not in already]
+        for result in generate_pages(changed_pages, self.template_path, workers=1):
+            self.manifest.set_includes(result["source"], result["includes"])
+        self.manifest.prune_fragments()
+        self.manifest.save()
+
+    def is_page(self, path): # Markdown under content/, except the _fragments that only exist to be included
+        return self.is_under(path, self.content_dir) and path.endswith(".md") and not is_partial(path, self.content_dir)
+
+    def run(self, port=8888, interval=0.05):
+        self.full_build()
+        server = start_server(self.dest_dir, port)
+        log.info(f"Serving {self.dest_dir} at http://localhost:{port}, watching for changes")
+        try:
+            while True:
+                time.sleep(interval)
+                changed, removed = self.poll()
+                if not changed and not removed:
+                    continue
+                started = time.perf_counter()
+                try:
+                    self.rebuild(changed, removed)
+                except Exception as error: # A typo in one file shouldn't take the server down with it
+                    log.error(f"Rebuild failed: {error!r}")
+                    continue
+                log.info(f"Rebuilt {len(changed) + len(removed)} changed files in {(time.perf_counter() - started) * 1000:.0f}ms")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()